@@ -0,0 +1,253 @@
+"""
+bench/bench_agent.py — Replay a conversation corpus through the agent loop.
+
+Starts the fake OpenAI endpoint (bench/fake_openai.py) on a free port, points
+the bot at it via OPENAI_BASE_URL, swaps Sheets for the in-memory fake
+(bench/fake_sheets.py) and replays every conversation in the corpus through
+ask_ai() and/or tg_handle_message(). Per message it reports:
+
+    iters    LLM round trips (agent-loop iterations)
+    tools    tool calls the model made
+    prompt   prompt tokens summed over all iterations (estimated, chars / 4)
+    max      largest single prompt
+    sheets   Sheets API calls
+    first    ms until the first visible output (on_text / first reply)
+    total    end-to-end ms
+
+Run from the project root:
+
+    python -m bench.bench_agent                       # both paths, defaults
+    python -m bench.bench_agent --mode ask_ai --latency 0.8 --sheets-latency 0.2
+    python -m bench.bench_agent --no-streaming --json results.json
+
+Nothing leaves the machine: no OpenAI key, Telegram token or spreadsheet is
+needed, and history/subscriber files go to a temporary directory.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+from bench.fake_openai import FakeOpenAI, load_scripts, start_in_thread
+
+
+# ---------------------------------------------------------------------------
+# Telegram stand-ins — just what tg_handle_message touches
+# ---------------------------------------------------------------------------
+
+class _FakeMessage:
+    def __init__(self, text: str = "", on_first_output=None):
+        self.text = text
+        self.replies: list["_FakeMessage"] = []
+        self._on_first_output = on_first_output
+
+    def _output(self) -> None:
+        if self._on_first_output:
+            self._on_first_output()
+
+    async def reply_text(self, text: str, **_) -> "_FakeMessage":
+        self._output()
+        reply = _FakeMessage(text, self._on_first_output)
+        self.replies.append(reply)
+        return reply
+
+    async def edit_text(self, text: str, **_) -> "_FakeMessage":
+        self._output()
+        self.text = text
+        return self
+
+
+_update_ids = itertools.count(1)
+
+
+def _fake_update(text: str, user_id: int, on_first_output):
+    return SimpleNamespace(
+        update_id=next(_update_ids),
+        message=_FakeMessage(text, on_first_output),
+        effective_user=SimpleNamespace(id=user_id),
+        effective_chat=SimpleNamespace(id=user_id),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+async def _replay(mode: str, corpus: list[dict], fake: FakeOpenAI, service, base_user_id: int) -> list[dict]:
+    from deadline import Deadline, UPDATE_DEADLINE_SECONDS
+    from handlers import ai_history
+    from handlers.ai_handler import ask_ai, invalidate_tool_cache
+    from handlers.message import tg_handle_message
+
+    results = []
+    for conv_index, conversation in enumerate(corpus):
+        user_id = base_user_id + conv_index
+        user_data: dict = {}
+        invalidate_tool_cache()
+
+        for message in conversation["messages"]:
+            text = message["text"]
+            log_start = len(fake.log)
+            sheets_start = service.calls
+            first_output: list[float] = []
+            started = time.monotonic()
+
+            def _mark_first() -> None:
+                if not first_output:
+                    first_output.append(time.monotonic())
+
+            if mode == "ask_ai":
+                async def _on_text(_text: str) -> None:
+                    _mark_first()
+
+                streaming = os.environ.get("AI_STREAMING", "1") != "0"
+                result = await ask_ai(
+                    text,
+                    ai_history.build_history(user_data),
+                    on_text=_on_text if streaming else None,
+                    user_id=user_id,
+                    deadline=Deadline(UPDATE_DEADLINE_SECONDS, name="bench"),
+                )
+                _mark_first()
+                outcome = result.get("action", "?")
+                ai_history.add_turn(user_data, "user", text)
+                if result.get("text"):
+                    ai_history.add_turn(user_data, "assistant", result["text"])
+            else:
+                update = _fake_update(text, user_id, _mark_first)
+                context = SimpleNamespace(user_data=user_data, bot=None, application=None)
+                await tg_handle_message(update, context)
+                outcome = f"{len(update.message.replies)} repl{'y' if len(update.message.replies) == 1 else 'ies'}"
+
+            ended = time.monotonic()
+            entries = fake.log[log_start:]
+            prompts = [e["prompt_tokens"] for e in entries]
+            results.append({
+                "mode": mode,
+                "conversation": conversation["name"],
+                "text": text,
+                "outcome": outcome,
+                "iterations": len(entries),
+                "tool_calls": sum(len(e["tool_calls"]) for e in entries),
+                "prompt_tokens": sum(prompts),
+                "max_prompt_tokens": max(prompts, default=0),
+                "sheets_calls": service.calls - sheets_start,
+                "first_output_ms": ((first_output[0] if first_output else ended) - started) * 1000,
+                "total_ms": (ended - started) * 1000,
+            })
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _print_report(results: list[dict]) -> None:
+    header = f"{'mode':<8} {'message':<44} {'iters':>5} {'tools':>5} {'prompt':>7} {'max':>6} {'sheets':>6} {'first':>7} {'total':>7}  outcome"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        text = r["text"] if len(r["text"]) <= 44 else r["text"][:43] + "…"
+        print(
+            f"{r['mode']:<8} {text:<44} {r['iterations']:>5} {r['tool_calls']:>5} "
+            f"{r['prompt_tokens']:>7} {r['max_prompt_tokens']:>6} {r['sheets_calls']:>6} "
+            f"{r['first_output_ms']:>7.0f} {r['total_ms']:>7.0f}  {r['outcome']}"
+        )
+
+    print()
+    for mode in dict.fromkeys(r["mode"] for r in results):
+        rows = [r for r in results if r["mode"] == mode]
+        llm_rows = [r for r in rows if r["iterations"]] or rows
+        totals = [r["total_ms"] for r in rows]
+        firsts = [r["first_output_ms"] for r in rows]
+        print(
+            f"{mode}: {len(rows)} messages | "
+            f"iters/msg {statistics.mean(r['iterations'] for r in rows):.2f} | "
+            f"tools/msg {statistics.mean(r['tool_calls'] for r in rows):.2f} | "
+            f"prompt tokens/LLM msg {statistics.mean(r['prompt_tokens'] for r in llm_rows):.0f} | "
+            f"first p50/p95 {_percentile(firsts, 50):.0f}/{_percentile(firsts, 95):.0f}ms | "
+            f"total p50/p95 {_percentile(totals, 50):.0f}/{_percentile(totals, 95):.0f}ms"
+        )
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a corpus through ask_ai / tg_handle_message.")
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(__file__), "corpus.json"))
+    parser.add_argument("--mode", choices=("ask_ai", "message", "both"), default="both")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the corpus N times per mode")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM seconds to first byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="fake LLM seconds between SSE chunks")
+    parser.add_argument("--sheets-latency", type=float, default=0.15, help="fake Sheets seconds per API call")
+    parser.add_argument("--months", type=int, default=13, help="month tabs in the fake spreadsheet")
+    parser.add_argument("--no-streaming", action="store_true", help="run with AI_STREAMING=0")
+    parser.add_argument("--json", metavar="PATH", help="also write raw per-message results here")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = json.load(f)
+    fake = FakeOpenAI(load_scripts(args.corpus), args.latency, args.chunk_delay)
+    server = start_in_thread(fake)
+
+    # Must be in place before config.py is imported.
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": server.base_url,
+        "SPREADSHEET_ID": "bench",
+        "AI_STREAMING": "0" if args.no_streaming else "1",
+    })
+
+    import dedup
+    import history_store
+    import handlers.subscribers
+    import spend_cube
+    from bench.fake_sheets import FakeSheetsService, install
+
+    history_store.HISTORY_DB = os.path.join(tmp, "expense_history.sqlite3")
+    handlers.subscribers.SUBSCRIBERS_FILE = os.path.join(tmp, "subscribers.json")
+    dedup.DEDUP_FILE = os.path.join(tmp, "dedup_journal.log")
+    spend_cube.SPEND_CUBE_FILE = os.path.join(tmp, "spend_cube.npz")
+    service = FakeSheetsService.with_months(args.months, latency=args.sheets_latency)
+    install(service)
+
+    modes = ("ask_ai", "message") if args.mode == "both" else (args.mode,)
+
+    # One event loop for everything — the LLM gateway's semaphore and HTTP
+    # client bind to the loop they are first used on.
+    async def _run_all() -> list[dict]:
+        results = []
+        for repeat in range(args.repeat):
+            for m, mode in enumerate(modes):
+                base_user_id = 10_000 * (1 + repeat * len(modes) + m)
+                results.extend(await _replay(mode, corpus, fake, service, base_user_id))
+        return results
+
+    results = asyncio.run(_run_all())
+
+    server.shutdown()
+    _print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nRaw results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
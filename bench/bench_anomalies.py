@@ -0,0 +1,100 @@
+"""
+bench/bench_anomalies.py — Time monthly-report anomaly detection on a large history.
+
+Builds a synthetic spend cube — every cube row (the four section totals plus
+each CATEGORY_MAP category, 60 rows) × `--months` months of seasonal, noisy
+spending — injects a few spikes into the reported month, then times
+detect_anomalies() over `--repeat` runs:
+
+    python -m bench.bench_anomalies                    # 60 rows × 60 months
+    python -m bench.bench_anomalies --months 120 --repeat 500
+
+No Sheets or network access: the cube is generated in memory.
+"""
+
+import argparse
+import math
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+
+import spend_cube
+from handlers.monthly_report import _shift_months_back, detect_anomalies
+from parsing.category_map import BROAD_CATEGORIES
+from spend_cube import CubeSlice
+
+# Spikes injected into the reported month (category, × its usual amount).
+SPIKES = [("Groceries", 2.5), ("Fuel MG", 4.0), ("Software", 6.0)]
+
+
+def _synthetic_cube(months: int, seed: int) -> tuple[CubeSlice, np.ndarray, datetime]:
+    """(history, reported month's column, reported month) with seasonal noise."""
+    rng = random.Random(seed)
+    spiked = {spend_cube.ROW_INDEX[name] for name, _ in SPIKES}
+    end = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_list = [_shift_months_back(end, i) for i in range(months, -1, -1)]
+    values = np.zeros((len(month_list), len(spend_cube.ROWS), 3))
+
+    for row in spend_cube.CATEGORY_ROWS:
+        base   = rng.uniform(50, 1500)
+        season = rng.uniform(0, 0.4)
+        budget = round(base * rng.uniform(1.0, 3.0), -1)
+        sparse = row not in spiked and rng.random() < 0.2   # mostly-₪0 categories
+        for i, month in enumerate(month_list):
+            if sparse and rng.random() < 0.8:
+                spent = 0.0
+            else:
+                wave  = 1 + season * math.sin(2 * math.pi * month.month / 12)
+                spent = max(0.0, rng.gauss(base * wave, base * 0.15))
+            values[i, row] = (budget, spent, budget - spent)
+
+    for name, factor in SPIKES:
+        row = spend_cube.ROW_INDEX[name]
+        values[-1, row, spend_cube.SPENT] *= factor
+        values[-1, row, spend_cube.BALANCE] = (
+            values[-1, row, spend_cube.BUDGET] - values[-1, row, spend_cube.SPENT]
+        )
+
+    for section, subcats in BROAD_CATEGORIES.items():
+        members = [spend_cube.ROW_INDEX[cat] for cat in subcats]
+        values[:, spend_cube.ROW_INDEX[section]] = values[:, members].sum(axis=1)
+
+    history = CubeSlice(
+        months=month_list[:-1],
+        values=values[:-1],
+        present=np.ones(len(month_list) - 1, dtype=bool),
+    )
+    return history, values[-1], month_list[-1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time detect_anomalies() on a synthetic spend cube.")
+    parser.add_argument("--months", type=int, default=60, help="months of history")
+    parser.add_argument("--repeat", type=int, default=200, help="timed runs")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    history, current, month = _synthetic_cube(args.months, args.seed)
+    detect_anomalies(current, history, month)   # warm-up
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        anomalies, months_available = detect_anomalies(current, history, month)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    print(f"{len(spend_cube.ROWS)} rows × {months_available} months, {args.repeat} runs")
+    print(
+        f"detect_anomalies p50 {timings[len(timings) // 2]:.2f}ms | "
+        f"p95 {timings[int(len(timings) * 0.95)]:.2f}ms | max {timings[-1]:.2f}ms"
+    )
+    print(f"\nInjected spikes: {', '.join(f'{name} ×{factor:g}' for name, factor in SPIKES)}")
+    for a in anomalies:
+        print(f"  • {a}")
+
+
+if __name__ == "__main__":
+    main()
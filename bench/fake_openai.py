@@ -0,0 +1,283 @@
+"""
+bench/fake_openai.py — Local OpenAI-compatible chat-completions stand-in.
+
+Lets us measure the agent loop (iterations, tool calls, prompt size, latency)
+without paying for live calls. Standard library only.
+
+    python -m bench.fake_openai --port 8765 --corpus bench/corpus.json --latency 0.6
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python main.py
+
+Endpoint: POST /v1/chat/completions, plain JSON or SSE streaming
+(stream=true, including the final usage chunk when
+stream_options.include_usage is set). GET /stats returns the request log.
+
+Scripts
+-------
+Replies are scripted per user message. A script is a list of turns; the
+server picks the turn by counting the assistant messages that follow the
+last user message in the request — i.e. by agent-loop iteration — so it
+needs no session state:
+
+    {"text": "am I over budget?",
+     "turns": [
+        {"tool_calls": [{"name": "show_summary", "arguments": {}}]},
+        {"content": "You're ₪300 under budget overall."}
+     ]}
+
+Argument strings may use $MONTH, $YEAR, $PREV_MONTH and $PREV_YEAR (current
+date) so a corpus stays valid month after month. A turn may set "latency" to
+override the server default. Unscripted messages get DEFAULT_REPLY.
+
+Latency model: `latency` seconds before the first byte (time to first
+token), then `chunk_delay` seconds between streamed chunks.
+"""
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = "OK."
+
+# Characters per streamed content chunk / tool-argument fragment.
+STREAM_CHUNK_CHARS = 12
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 chars per token — close enough to compare runs against each other."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _expand(value):
+    """Substitute $MONTH / $YEAR / $PREV_MONTH / $PREV_YEAR in script arguments."""
+    if isinstance(value, dict):
+        return {k: _expand(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_expand(v) for v in value]
+    if not isinstance(value, str) or "$" not in value:
+        return value
+    now = datetime.now()
+    prev = now.replace(day=1, year=now.year - 1, month=12) if now.month == 1 else now.replace(day=1, month=now.month - 1)
+    subs = {"$PREV_MONTH": prev.month, "$PREV_YEAR": prev.year, "$MONTH": now.month, "$YEAR": now.year}
+    if value in subs:
+        return subs[value]
+    for token, number in subs.items():
+        value = value.replace(token, str(number))
+    return value
+
+
+def load_scripts(corpus_path: str) -> dict[str, list[dict]]:
+    """user text (casefolded) → turns, from a bench corpus file."""
+    with open(corpus_path, encoding="utf-8") as f:
+        corpus = json.load(f)
+    scripts = {}
+    for conversation in corpus:
+        for message in conversation["messages"]:
+            key = message["text"].strip().casefold()
+            if key in scripts:
+                raise ValueError(f"duplicate corpus message {message['text']!r}")
+            scripts[key] = message.get("turns", [])
+    return scripts
+
+
+class FakeOpenAI:
+    """Script lookup, response building and the request log."""
+
+    def __init__(self, scripts: dict[str, list[dict]], latency: float = 0.5, chunk_delay: float = 0.02):
+        self.scripts = scripts
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.log: list[dict] = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _pick_turn(self, messages: list[dict]) -> tuple[str, int, dict]:
+        last_user = max(
+            (i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1
+        )
+        user_text = messages[last_user].get("content") or "" if last_user >= 0 else ""
+        iteration = sum(1 for m in messages[last_user + 1:] if m.get("role") == "assistant")
+        turns = self.scripts.get(user_text.strip().casefold())
+        if not turns:
+            return user_text, iteration, {"content": DEFAULT_REPLY}
+        return user_text, iteration, turns[min(iteration, len(turns) - 1)]
+
+    def respond(self, body: dict) -> tuple[dict, dict, float]:
+        """(assistant message, usage, latency) for one request; logs it."""
+        messages = body.get("messages", [])
+        tools = body.get("tools") or []
+        user_text, iteration, turn = self._pick_turn(messages)
+        call_id = next(self._ids)
+
+        message: dict = {"role": "assistant", "content": turn.get("content")}
+        if turn.get("tool_calls"):
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{call_id}_{i}",
+                    "type": "function",
+                    "function": {
+                        "name": call["name"],
+                        "arguments": json.dumps(_expand(call.get("arguments", {})), ensure_ascii=False),
+                    },
+                }
+                for i, call in enumerate(turn["tool_calls"])
+            ]
+
+        prompt_tokens = estimate_tokens(json.dumps(messages, ensure_ascii=False)) + (
+            estimate_tokens(json.dumps(tools, ensure_ascii=False)) if tools else 0
+        )
+        completion_tokens = estimate_tokens(json.dumps(message, ensure_ascii=False))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        with self._lock:
+            self.log.append({
+                "user_text": user_text,
+                "iteration": iteration,
+                "stream": bool(body.get("stream")),
+                "tools_offered": [t["function"]["name"] for t in tools],
+                "tool_calls": [c["function"]["name"] for c in message.get("tool_calls", [])],
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+            })
+        return message, usage, turn.get("latency", self.latency)
+
+    def entries_for(self, user_text: str) -> list[dict]:
+        with self._lock:
+            return [e for e in self.log if e["user_text"] == user_text]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeOpenAIServer"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, payload) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.server.fake.log)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        message, usage, latency = self.server.fake.respond(body)
+        model = body.get("model", "fake-model")
+        completion_id = f"chatcmpl-fake-{time.monotonic_ns()}"
+        finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+
+        time.sleep(latency)
+
+        if not body.get("stream"):
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def _chunk(delta: dict, finish: str | None = None, **extra) -> None:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                **extra,
+            }
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode())
+            self.wfile.flush()
+            if self.server.fake.chunk_delay:
+                time.sleep(self.server.fake.chunk_delay)
+
+        _chunk({"role": "assistant", "content": ""})
+        content = message.get("content") or ""
+        for i in range(0, len(content), STREAM_CHUNK_CHARS):
+            _chunk({"content": content[i:i + STREAM_CHUNK_CHARS]})
+        for index, call in enumerate(message.get("tool_calls", [])):
+            _chunk({"tool_calls": [{
+                "index": index, "id": call["id"], "type": "function",
+                "function": {"name": call["function"]["name"], "arguments": ""},
+            }]})
+            arguments = call["function"]["arguments"]
+            for i in range(0, len(arguments), STREAM_CHUNK_CHARS):
+                _chunk({"tool_calls": [{
+                    "index": index,
+                    "function": {"arguments": arguments[i:i + STREAM_CHUNK_CHARS]},
+                }]})
+        _chunk({}, finish_reason)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            payload = {
+                "id": completion_id, "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": model,
+                "choices": [], "usage": usage,
+            }
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fake: FakeOpenAI, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.fake = fake
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_in_thread(fake: FakeOpenAI, port: int = 0) -> FakeOpenAIServer:
+    """Start a server on a background thread; port 0 picks a free port."""
+    server = FakeOpenAIServer(fake, port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--corpus", default="bench/corpus.json")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds to first byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between SSE chunks")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(load_scripts(args.corpus), args.latency, args.chunk_delay)
+    server = FakeOpenAIServer(fake, port=args.port)
+    print(f"Fake OpenAI endpoint on {server.base_url} — Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+bench/fake_sheets.py — In-memory stand-in for the Google Sheets service.
+
+Implements just the calls the bot makes, on the same layout as the real
+sheet (one tab per month named MMYY; per broad section a header row, one row
+per subcategory, then a total row; column A label, B budget, C spent + note,
+D balance):
+
+    spreadsheets().get(spreadsheetId, [ranges], [fields])
+    spreadsheets().values().get(spreadsheetId, range)
+    spreadsheets().values().batchGet(spreadsheetId, ranges)
+    spreadsheets().values().update(spreadsheetId, range, valueInputOption, body)
+    spreadsheets().batchUpdate(spreadsheetId, body)   updateCells / duplicateSheet
+
+Field masks are ignored — every response carries all fields. Section totals
+and balances are computed on read, like the sheet's formulas. `latency`
+seconds are slept on every execute() to model the network round trip.
+
+    service = FakeSheetsService.with_months(13, latency=0.15)
+    install(service)       # patch every module that imported _build_service
+"""
+
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+from parsing.category_map import BROAD_CATEGORIES, CATEGORY_MAP
+
+# Default budget per category in generated tabs.
+DEFAULT_BUDGET = 500.0
+
+_A1_RE = re.compile(r"^'?(?P<tab>.*?)'?!(?P<c1>[A-Z])(?P<r1>\d+)(?::(?P<c2>[A-Z])(?P<r2>\d+))?$")
+
+_SAMPLE_NOTES = [
+    "groceries {n} shufersal", "coffee {n} ☕", "pizza {n} 🍕 with the kids",
+    "fuel {n} paz", "superpharm {n}", "{n} train to tel aviv", "dinner {n} 🍣",
+]
+
+
+def _fmt(value: float) -> str:
+    return f"₪{value:,.2f}"
+
+
+class _Tab:
+    def __init__(self, title: str, sheet_id: int):
+        self.title = title
+        self.sheet_id = sheet_id
+        # row index (0-based) → {"label", "budget", "spent", "note", "kind"}
+        self.rows: list[dict] = []
+
+    def copy(self, title: str, sheet_id: int) -> "_Tab":
+        tab = _Tab(title, sheet_id)
+        tab.rows = [dict(row) for row in self.rows]
+        return tab
+
+    # -- formulas ---------------------------------------------------------
+
+    def _section_rows(self, total_idx: int) -> list[dict]:
+        rows = []
+        for row in reversed(self.rows[:total_idx]):
+            if row["kind"] == "header":
+                break
+            rows.append(row)
+        return rows
+
+    def cell(self, row_idx: int, col: int) -> dict:
+        """Cell dict with formattedValue / userEnteredValue / note."""
+        if row_idx >= len(self.rows):
+            return {}
+        row = self.rows[row_idx]
+        if col == 0:
+            return {"formattedValue": row["label"]}
+        if row["kind"] == "header":
+            return {}
+        if row["kind"] == "total":
+            members = self._section_rows(row_idx)
+            budget = sum(r["budget"] for r in members)
+            spent = sum(r["spent"] for r in members)
+            value = {1: budget, 2: spent, 3: budget - spent}[col]
+            return {"formattedValue": _fmt(value), "userEnteredValue": {"formulaValue": "=SUM()"}}
+        if col == 1:
+            return {"formattedValue": _fmt(row["budget"]), "userEnteredValue": {"numberValue": row["budget"]}}
+        if col == 2:
+            cell = {"formattedValue": _fmt(row["spent"]), "userEnteredValue": {"numberValue": row["spent"]}}
+            if row["note"]:
+                cell["note"] = row["note"]
+            return cell
+        return {
+            "formattedValue": _fmt(row["budget"] - row["spent"]),
+            "userEnteredValue": {"formulaValue": "=B-C"},
+        }
+
+
+class _Request:
+    def __init__(self, service: "FakeSheetsService", fn):
+        self._service = service
+        self._fn = fn
+
+    def execute(self):
+        if self._service.latency:
+            time.sleep(self._service.latency)
+        with self._service.lock:
+            self._service.calls += 1
+            return self._fn()
+
+
+class _Values:
+    def __init__(self, service: "FakeSheetsService"):
+        self._service = service
+
+    def get(self, spreadsheetId=None, range=None, **_):
+        return _Request(self._service, lambda: {"values": self._service.read_values(range)})
+
+    def batchGet(self, spreadsheetId=None, ranges=None, **_):
+        return _Request(self._service, lambda: {"valueRanges": [
+            {"range": a1, "values": self._service.read_values(a1)} for a1 in ranges
+        ]})
+
+    def update(self, spreadsheetId=None, range=None, valueInputOption=None, body=None, **_):
+        return _Request(self._service, lambda: self._service.write_values(range, body["values"]))
+
+
+class _Spreadsheets:
+    def __init__(self, service: "FakeSheetsService"):
+        self._service = service
+
+    def values(self) -> _Values:
+        return _Values(self._service)
+
+    def get(self, spreadsheetId=None, ranges=None, fields=None, **_):
+        return _Request(self._service, lambda: self._service.read_grid(ranges))
+
+    def batchUpdate(self, spreadsheetId=None, body=None, **_):
+        return _Request(self._service, lambda: self._service.batch_update(body["requests"]))
+
+
+class FakeSheetsService:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.tabs: list[_Tab] = []    # newest first, like the real spreadsheet
+        self.calls = 0
+
+    @classmethod
+    def with_months(cls, months: int, latency: float = 0.0, seed: int = 7) -> "FakeSheetsService":
+        """A spreadsheet with `months` month tabs ending at the current month."""
+        service = cls(latency)
+        rng = random.Random(seed)
+        dt = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        for i in range(months):
+            service.tabs.append(service._generate_tab(dt, 100 + i, rng))
+            dt = dt.replace(year=dt.year - 1, month=12) if dt.month == 1 else dt.replace(month=dt.month - 1)
+        return service
+
+    def spreadsheets(self) -> _Spreadsheets:
+        return _Spreadsheets(self)
+
+    # -- generation --------------------------------------------------------
+
+    @staticmethod
+    def _generate_tab(dt: datetime, sheet_id: int, rng: random.Random) -> _Tab:
+        tab = _Tab(dt.strftime("%m%y"), sheet_id)
+        today = datetime.now()
+        last_day = today.day if (dt.year, dt.month) == (today.year, today.month) else 28
+
+        def _category_row(cat: str) -> dict:
+            entries, spent = [], 0.0
+            for _ in range(rng.randint(0, 4)):
+                amount = rng.randint(10, 400)
+                day = rng.randint(1, last_day)
+                text = rng.choice(_SAMPLE_NOTES).format(n=amount)
+                entries.append(f"{dt.year}-{dt.month:02d}-{day:02d} {rng.randint(7, 22):02d}:00  {text}")
+                spent += amount
+            return {"label": cat, "budget": DEFAULT_BUDGET, "spent": spent,
+                    "note": "\n".join(sorted(entries)), "kind": "category"}
+
+        in_sections = set()
+        for section, subcats in BROAD_CATEGORIES.items():
+            tab.rows.append({"label": section, "budget": 0.0, "spent": 0.0, "note": "", "kind": "header"})
+            for cat in subcats:
+                tab.rows.append(_category_row(cat))
+                in_sections.add(cat)
+            tab.rows.append({"label": f"Total {section}", "budget": 0.0, "spent": 0.0,
+                             "note": "", "kind": "total"})
+        for cat in CATEGORY_MAP:
+            if cat not in in_sections:
+                tab.rows.append(_category_row(cat))
+        return tab
+
+    # -- lookup helpers ------------------------------------------------------
+
+    def _tab(self, title: str = None, sheet_id: int = None) -> _Tab:
+        for tab in self.tabs:
+            if tab.title == title or tab.sheet_id == sheet_id:
+                return tab
+        raise KeyError(f"no such tab: {title or sheet_id}")
+
+    @staticmethod
+    def _parse_range(a1: str) -> tuple[str, int, int, int, int]:
+        """'tab'!B5:D7 → (tab, row0, row1_exclusive, col0, col1_exclusive)"""
+        m = _A1_RE.match(a1)
+        if not m:
+            raise ValueError(f"unsupported range {a1!r}")
+        c1, r1 = ord(m["c1"]) - 65, int(m["r1"]) - 1
+        c2 = ord(m["c2"]) - 65 if m["c2"] else c1
+        r2 = int(m["r2"]) - 1 if m["r2"] else r1
+        return m["tab"], r1, r2 + 1, c1, c2 + 1
+
+    # -- API operations ------------------------------------------------------
+
+    def read_values(self, a1: str) -> list[list[str]]:
+        title, r0, r1, c0, c1 = self._parse_range(a1)
+        tab = self._tab(title)
+        values = []
+        for r in range(r0, min(r1, len(tab.rows))):
+            row = [tab.cell(r, c).get("formattedValue", "") for c in range(c0, c1)]
+            while row and row[-1] == "":
+                row.pop()
+            values.append(row)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def write_values(self, a1: str, values: list[list]) -> dict:
+        title, r0, _, c0, _ = self._parse_range(a1)
+        row = self._tab(title).rows[r0]
+        field = {1: "budget", 2: "spent"}[c0]
+        row[field] = float(values[0][0])
+        return {"updatedCells": 1}
+
+    def read_grid(self, ranges: list[str] | None) -> dict:
+        if not ranges:
+            return {"sheets": [
+                {"properties": {"title": t.title, "sheetId": t.sheet_id, "index": i}}
+                for i, t in enumerate(self.tabs)
+            ]}
+        sheets = []
+        for a1 in ranges:
+            title, r0, r1, c0, c1 = self._parse_range(a1)
+            tab = self._tab(title)
+            row_data = [
+                {"values": [tab.cell(r, c) for c in range(c0, c1)]}
+                for r in range(r0, min(r1, len(tab.rows)))
+            ]
+            sheets.append({
+                "properties": {"title": tab.title, "sheetId": tab.sheet_id,
+                               "index": self.tabs.index(tab)},
+                "data": [{"startRow": r0, "startColumn": c0, "rowData": row_data}],
+            })
+        return {"sheets": sheets}
+
+    def batch_update(self, requests: list[dict]) -> dict:
+        replies = []
+        for req in requests:
+            if "duplicateSheet" in req:
+                spec = req["duplicateSheet"]
+                source = self._tab(sheet_id=spec["sourceSheetId"])
+                new = source.copy(spec["newSheetName"], spec.get("newSheetId", 1000 + len(self.tabs)))
+                self.tabs.insert(spec.get("insertSheetIndex", 0), new)
+                replies.append({"duplicateSheet": {"properties": {"sheetId": new.sheet_id,
+                                                                  "title": new.title}}})
+            elif "updateCells" in req:
+                spec = req["updateCells"]
+                rng = spec["range"]
+                tab = self._tab(sheet_id=rng["sheetId"])
+                fields = set(spec["fields"].split(","))
+                for offset, row_spec in enumerate(spec["rows"]):
+                    row = tab.rows[rng["startRowIndex"] + offset]
+                    cell = (row_spec.get("values") or [{}])[0]
+                    if "note" in fields:
+                        row["note"] = cell.get("note", "")
+                    if "userEnteredValue" in fields:
+                        row["spent"] = float(cell.get("userEnteredValue", {}).get("numberValue", 0.0))
+                replies.append({})
+            else:
+                raise NotImplementedError(f"fake sheets: unsupported request {list(req)}")
+        return {"replies": replies}
+
+
+def install(service: FakeSheetsService) -> None:
+    """Route every module's _build_service() to `service`."""
+    import handlers.commands
+    import sheets
+    import spend_cube
+    import transaction_index
+
+    for module in (sheets, handlers.commands, spend_cube, transaction_index):
+        module._build_service = lambda: service
@@ -15,20 +15,39 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
 # OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Point the client at any OpenAI-compatible endpoint, e.g. the local stand-in
+# in bench/fake_openai.py. Unset → the official API.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 # Google Sheets
 SPREADSHEET_ID          = os.getenv("SPREADSHEET_ID")
 GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS")
 
-# Path to the expense history file used by /delete.
+# SQLite database of recently logged expenses, used by /delete (see history_store.py).
 # Kept at the project root so it survives folder refactors.
-HISTORY_FILE = os.path.join(os.path.dirname(__file__), "expense_history.json")
+HISTORY_DB = os.path.join(os.path.dirname(__file__), "expense_history.sqlite3")
 
-# How many recent expenses /delete can reach back to.
+# How many recent expenses /delete can reach back to — kept per user.
 HISTORY_LIMIT = 10
 
 # Subscriber list — chat_ids that receive the monthly report.
 SUBSCRIBERS_FILE = os.path.join(os.path.dirname(__file__), "subscribers.json")
 
+# Journal of recently handled update / callback ids (see dedup.py), so a
+# redelivered update is not logged twice after a restart.
+DEDUP_FILE = os.path.join(os.path.dirname(__file__), "dedup_journal.log")
+
+# Cached budget / spent / balance of every month tab (see spend_cube.py), so
+# reports and comparisons do not re-read months they have already seen.
+SPEND_CUBE_FILE = os.path.join(os.path.dirname(__file__), "spend_cube.npz")
+
+# Monthly reports computed ahead of delivery, with their summary and section
+# views (see handlers/monthly_report.py).
+REPORT_ARTIFACT_FILE = os.path.join(os.path.dirname(__file__), "monthly_report_cache.json")
+
 # Timezone for scheduled jobs (monthly report fires at 09:00 local time).
 ISRAEL_TZ = ZoneInfo("Asia/Jerusalem")
+
+# Stream AI replies into Telegram by progressively editing one message.
+# Set AI_STREAMING=0 to fall back to a single reply once the answer is complete.
+AI_STREAMING = os.getenv("AI_STREAMING", "1") != "0"
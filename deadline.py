@@ -0,0 +1,104 @@
+"""
+deadline.py — Time budget for handling one Telegram update.
+
+One free-text update can trigger the parser, several LLM round trips, a
+handful of Sheets reads and a final Sheets write. A Deadline is created at
+the top of tg_handle_message / handle_callback and passed down, so every
+stage sizes its own timeout from what is actually left:
+
+    deadline = Deadline(UPDATE_DEADLINE_SECONDS)
+    timeout  = deadline.budget_for("llm", cap=LLM_CALL_TIMEOUT)
+    rows     = await deadline.run("sheets_read", asyncio.to_thread(fetch), share=0.5)
+    with deadline.track("sheets_write"):
+        log_expense(...)          # never cancelled, only measured
+
+Every overrun is logged and counted per stage in metrics
+("deadline_overruns{stage=...}").
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Awaitable, TypeVar
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Total budget for one free-text message (parser + AI loop + Sheets).
+UPDATE_DEADLINE_SECONDS = 45.0
+
+# Total budget for one inline-button tap.
+CALLBACK_DEADLINE_SECONDS = 20.0
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """A stage ran out of budget."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    def __init__(self, budget: float, name: str = "update"):
+        self.name = name
+        self.budget = budget
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def budget_for(self, stage: str, share: float = 1.0, cap: float | None = None) -> float:
+        """
+        Seconds a stage may spend: `share` of what is left, optionally capped.
+        Leaving share < 1 reserves time for the stages that come after.
+        """
+        seconds = self.remaining() * share
+        if cap is not None:
+            seconds = min(seconds, cap)
+        return seconds
+
+    def record_overrun(self, stage: str) -> None:
+        metrics.incr("deadline_overruns", stage=stage)
+        elapsed = time.monotonic() - self.started_at
+        logger.warning(
+            f"Deadline overrun in stage '{stage}' "
+            f"({self.name}: {elapsed:.1f}s elapsed of {self.budget:g}s)"
+        )
+
+    async def run(
+        self,
+        stage: str,
+        awaitable: Awaitable[T],
+        share: float = 1.0,
+        cap: float | None = None,
+    ) -> T:
+        """Await with this stage's budget; raise DeadlineExceeded on timeout."""
+        try:
+            return await asyncio.wait_for(awaitable, self.budget_for(stage, share, cap))
+        except asyncio.TimeoutError:
+            self.record_overrun(stage)
+            raise DeadlineExceeded(stage) from None
+
+    @contextmanager
+    def track(self, stage: str):
+        """
+        Measure a stage that must not be cancelled (e.g. a Sheets write that
+        may already have reached the server). Records an overrun if the
+        deadline had passed by the time it finished.
+        """
+        try:
+            yield
+        finally:
+            if self.expired:
+                self.record_overrun(stage)
@@ -0,0 +1,167 @@
+"""
+dedup.py — Idempotency guard for updates that write to the sheet.
+
+log_expense() adds to a running total, so handling the same update twice
+logs the expense twice. That happens when polling restarts and Telegram
+redelivers updates the bot already handled, or when a parent double-taps a
+write button (two separate callback queries for the same button).
+
+    if dedup.is_duplicate(f"update:{update.update_id}"):
+        return
+
+is_duplicate(key) checks and claims the key in one step: the first call
+returns False, every later call within DEDUP_WINDOW_SECONDS returns True.
+
+Store
+-----
+An OrderedDict of key → claim time in insertion order. A check is O(1):
+one dict lookup, plus popping expired or over-capacity entries off the old
+end. Memory is fixed at DEDUP_MAX_KEYS entries.
+
+Persistence
+-----------
+Every claim is appended to DEDUP_FILE ("<unix time>\\t<key>" per line) so a
+restart still recognises updates handled just before it. is_duplicate() only
+buffers the line; flush() writes the buffer in a worker thread (scheduled on
+the running event loop, or inline when there is none), so no file I/O
+happens on the loop. The journal is replayed on first use and rewritten from
+the live entries once it has grown to twice DEDUP_MAX_KEYS lines, so it
+stays bounded too.
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from config import DEDUP_FILE
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed key is remembered (seconds). Telegram keeps undelivered
+# updates for 24 hours.
+DEDUP_WINDOW_SECONDS = 24 * 3600
+
+# Most keys remembered at once — oldest are forgotten first.
+DEDUP_MAX_KEYS = 5000
+
+_lock = threading.Lock()
+_seen: "OrderedDict[str, float]" = OrderedDict()
+_loaded = False
+
+# Claims not yet written, guarded by _lock; the file itself by _journal_lock.
+_pending: list[str] = []
+_flush_tasks: set[asyncio.Task] = set()
+_journal_lock = threading.Lock()
+_journal_lines = 0
+
+
+def _evict(now: float) -> None:
+    while _seen:
+        key, claimed_at = next(iter(_seen.items()))
+        if claimed_at >= now - DEDUP_WINDOW_SECONDS and len(_seen) <= DEDUP_MAX_KEYS:
+            break
+        _seen.popitem(last=False)
+
+
+def _load() -> None:
+    """Replay the journal (once, under _lock)."""
+    global _journal_lines, _loaded
+    _loaded = True
+    try:
+        with open(DEDUP_FILE, encoding="utf-8") as f:
+            for line in f:
+                claimed_at, sep, key = line.rstrip("\n").partition("\t")
+                if not sep:
+                    continue  # torn last line after a crash
+                try:
+                    _seen[key] = float(claimed_at)
+                except ValueError:
+                    continue
+                _seen.move_to_end(key)
+                _journal_lines += 1
+    except FileNotFoundError:
+        return
+    except OSError as exc:
+        logger.warning(f"Could not read dedup journal {DEDUP_FILE}: {exc}")
+        return
+    _evict(time.time())
+    logger.info(f"Dedup journal replayed: {len(_seen)} live key(s)")
+
+
+def _compact() -> None:
+    """Rewrite the journal with only the live entries (under _journal_lock)."""
+    global _journal_lines
+    with _lock:
+        live = list(_seen.items())
+    tmp_path = f"{DEDUP_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for key, claimed_at in live:
+            f.write(f"{claimed_at:.0f}\t{key}\n")
+    os.replace(tmp_path, DEDUP_FILE)
+    _journal_lines = len(live)
+
+
+def flush() -> None:
+    """Append buffered claims to the journal, compacting it when due. Blocking."""
+    global _journal_lines
+    with _lock:
+        lines = list(_pending)
+        _pending.clear()
+    if not lines:
+        return
+    with _journal_lock:
+        try:
+            with open(DEDUP_FILE, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+            _journal_lines += len(lines)
+            if _journal_lines > 2 * DEDUP_MAX_KEYS:
+                _compact()
+        except OSError as exc:
+            # The in-memory guard still works; only restart protection is lost.
+            logger.warning(f"Could not write dedup journal {DEDUP_FILE}: {exc}")
+
+
+atexit.register(flush)
+
+
+def _schedule_flush() -> bool:
+    """Run flush() in a worker thread; False if there is no event loop to do it on."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    task = loop.create_task(asyncio.to_thread(flush))
+    _flush_tasks.add(task)
+    task.add_done_callback(_flush_tasks.discard)
+    return True
+
+
+def is_duplicate(key: str) -> bool:
+    """
+    True if `key` was already claimed within the window; otherwise claim it
+    and return False. Keys are strings like "update:123" or "callback:abc".
+    """
+    now = time.time()
+    with _lock:
+        if not _loaded:
+            _load()
+        _evict(now)
+        claimed_at = _seen.get(key)
+        if claimed_at is not None and claimed_at >= now - DEDUP_WINDOW_SECONDS:
+            kind = key.split(":", 1)[0]
+            metrics.incr("dedup_duplicates", kind=kind)
+            logger.warning(f"Duplicate {kind} ignored: {key}")
+            return True
+        _seen[key] = now
+        _seen.move_to_end(key)
+        _pending.append(f"{now:.0f}\t{key}\n")
+        # One flush per batch: the first claim after a flush schedules the next
+        scheduled = len(_pending) > 1 or _schedule_flush()
+    if not scheduled:
+        flush()   # no event loop (CLI) — write inline
+    return False
@@ -8,6 +8,7 @@ ask_ai(user_message, history) -> dict
         {"action": "delete",     "n": int}
         {"action": "reply",      "text": str}
         {"action": "reply",      "text": str, "show_summary": {"month": int, "year": int}}
+        {"action": "unavailable"}  — LLM gateway degraded; caller falls back
 
 Tools available to the AI:
     log_expense           — log one expense (caller handles the write)
@@ -18,48 +19,73 @@ Tools available to the AI:
     get_all_transactions  — every logged transaction across ALL categories for a
                             month — enables emoji search, keyword search, full
                             cross-category analysis
+    search_transactions   — filtered search over every month's transactions
+                            (keywords, emoji, category, date range, amount);
+                            returns only the matching rows
     compare_months        — side-by-side budget vs actuals for two months
+
+Streaming mode
+--------------
+Pass on_text to ask_ai() and every completion is requested with stream=True.
+Text deltas are forwarded to on_text(text_so_far) as they arrive, so the
+caller can progressively edit a Telegram message instead of waiting for the
+whole answer. Tool-call turns are reassembled from their deltas and handled
+exactly like non-streamed responses.
 """
 
 import asyncio
+import hashlib
 import json
 import logging
 import re
+import time
 from datetime import datetime
+from typing import Awaitable, Callable
 
-from openai import AsyncOpenAI
+import numpy as np
+from openai.types.chat.chat_completion import Choice
 
-from config import OPENAI_API_KEY
+from config import ISRAEL_TZ
+from handlers import llm_gateway
+from handlers.ai_history import count_tokens
+from handlers.llm_gateway import LLM_CALL_TIMEOUT, LLMUnavailable
+import metrics
+from deadline import Deadline
 from parsing.category_map import CATEGORY_MAP
+from sheets import add_write_listener
 
 logger = logging.getLogger(__name__)
 
-# Per-user history window (number of individual messages, not pairs)
-AI_HISTORY_LIMIT = 12
 # Safety cap on the agentic tool-call loop per response
 MAX_TOOL_ITERATIONS = 6
-
-_client: AsyncOpenAI | None = None
-
-
-def _get_client() -> AsyncOpenAI:
-    """Return the shared AsyncOpenAI client, creating it on first use."""
-    global _client
-    if _client is None:
-        if not OPENAI_API_KEY:
-            raise RuntimeError(
-                "OPENAI_API_KEY is not set. Add it to your environment variables."
-            )
-        _client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-    return _client
-
+# Read tools executed at once for a single model turn. Each one is a Sheets
+# read on a worker thread; the cap keeps one response from flooding the
+# thread pool or the Sheets per-minute quota.
+MAX_CONCURRENT_TOOL_CALLS = 4
+# Don't start another LLM round trip with less than this many seconds left
+# on the update's deadline — it would almost certainly be cut off.
+MIN_LLM_BUDGET = 3.0
+
+# Rows search_transactions returns by default / at most.
+SEARCH_DEFAULT_LIMIT = 30
+SEARCH_MAX_LIMIT = 100
 
 # ---------------------------------------------------------------------------
 # System prompt
 # ---------------------------------------------------------------------------
 
+# The system prompt is split in two so provider-side prompt caching works:
+#
+#   SYSTEM_PROMPT     — rules + category block. Built once at import and
+#                       byte-identical on every call, so together with the
+#                       (equally static) tool schemas it forms a cacheable prefix.
+#   _date_context()   — one short system message with today's date in
+#                       ISRAEL_TZ, rebuilt per request so it never goes stale
+#                       after midnight. It sits right after the static prefix;
+#                       it only changes once a day, so the conversation history
+#                       that follows it stays cacheable too.
+
 def _build_system_prompt() -> str:
-    now = datetime.now()
     category_lines = [
         f"  - {cat}: {', '.join(kws[:8])}"
         for cat, kws in CATEGORY_MAP.items()
@@ -67,7 +93,7 @@ def _build_system_prompt() -> str:
     categories_block = "\n".join(category_lines)
 
     return f"""You are a smart, concise expense-tracking assistant for a household \
-budget bot. Today is {now.strftime('%B %d, %Y')}.
+budget bot. Today's date is given in the next system message.
 
 You have five capabilities:
 1. LOG expenses          → call log_expense for each expense you identify.
@@ -75,9 +101,9 @@ You have five capabilities:
 recent entry.
 3. BUDGET SUMMARY        → call show_summary for anything involving the monthly \
 budget overview — whether the user wants to view it OR asks a question about it.
-4. READ transaction data → call get_category_spending (one category) or \
-get_all_transactions (everything) to see individual entries, search notes, \
-find specific items.
+4. READ transaction data → call get_category_spending (one category), \
+search_transactions (find specific entries across any months) or \
+get_all_transactions (one whole month) to see individual entries.
 5. ADVISE                → after reading data, give specific, number-backed \
 recommendations.
 
@@ -111,9 +137,13 @@ RULES — SUMMARY:
 RULES — GENERAL:
 - Logging: call log_expense immediately — zero filler text alongside the call.
 - Questions about specific items, keywords, or entries (including emojis, names, \
-  stores): use get_all_transactions.
+  stores, amounts, or "when did I last…"): use search_transactions — it covers \
+  all months and returns only matching rows. Use get_all_transactions only when \
+  you truly need every entry of one month.
 - Questions about one category: use get_category_spending.
 - Month comparisons: use compare_months.
+- Need several reads (e.g. three categories)? Call all of them in the SAME \
+  response — they run in parallel.
 - Missing amount: ask in ONE sentence only.
 - Recommendations: reference real numbers.
 - Currency is Israeli Shekel (₪).
@@ -123,6 +153,12 @@ RULES — GENERAL:
 
 SYSTEM_PROMPT = _build_system_prompt()
 
+
+def _date_context() -> dict:
+    """Per-request system message carrying the current date (Israel time)."""
+    today = datetime.now(ISRAEL_TZ)
+    return {"role": "system", "content": f"Today is {today.strftime('%A, %B %d, %Y')}."}
+
 # ---------------------------------------------------------------------------
 # Tool definitions
 # ---------------------------------------------------------------------------
@@ -269,6 +305,47 @@ GET_ALL_TRANSACTIONS_TOOL = {
     },
 }
 
+SEARCH_TRANSACTIONS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "search_transactions",
+        "description": (
+            "Search individual transactions across ALL months and categories. "
+            "Returns only matching rows as 'date|category|amount|text', newest "
+            "first. Use for keyword, store, emoji or amount questions, e.g. "
+            "'when did I last buy 🍕?' or 'all superpharm entries this year'."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": (
+                        "Words or emoji that must all appear in the entry "
+                        "(word prefixes match). Omit to filter by the other fields only."
+                    ),
+                },
+                "category": {
+                    "type": "string",
+                    "description": "Exact category name from the list in the instructions.",
+                },
+                "from_month": {"type": "integer", "description": "Start month (1–12)."},
+                "from_year":  {"type": "integer", "description": "Start year."},
+                "to_month":   {"type": "integer", "description": "End month (1–12)."},
+                "to_year":    {"type": "integer", "description": "End year."},
+                "has_emoji":  {"type": "boolean", "description": "Only entries containing an emoji."},
+                "min_amount": {"type": "number"},
+                "max_amount": {"type": "number"},
+                "limit": {
+                    "type": "integer",
+                    "description": f"Max rows to return (default {SEARCH_DEFAULT_LIMIT}).",
+                },
+            },
+            "required": [],
+        },
+    },
+}
+
 COMPARE_MONTHS_TOOL = {
     "type": "function",
     "function": {
@@ -297,9 +374,156 @@ ALL_TOOLS = [
     SHOW_SUMMARY_TOOL,
     GET_CATEGORY_TOOL,
     GET_ALL_TRANSACTIONS_TOOL,
+    SEARCH_TRANSACTIONS_TOOL,
     COMPARE_MONTHS_TOOL,
 ]
 
+# ---------------------------------------------------------------------------
+# Intent-scoped tool selection
+#
+# ALL_TOOLS is ~1.5k tokens — two copies of the full category enum plus long
+# descriptions — and used to be sent on every completion, even for small talk.
+# A cheap local regex pass over the user's message now picks the relevant
+# subset, and once a read tool has returned the write tools are dropped for
+# the rest of the loop (the model is answering a question by then).
+# log_expense is in every first-iteration subset: amounts can be spelled out
+# ("spent fifty on coffee"), so no pattern can tell a loggable message apart.
+#
+# The subset always keeps ALL_TOOLS order, so each distinct subset is itself a
+# stable, cacheable prompt prefix. Set PRUNE_TOOLS = False to send everything
+# (useful to compare prompt tokens / latency in the "LLM call" log lines).
+# ---------------------------------------------------------------------------
+
+PRUNE_TOOLS = True
+
+_WRITE_TOOL_NAMES = {"log_expense", "delete_expense"}
+
+_TOOL_INTENTS: list[tuple[re.Pattern, dict]] = [
+    # Hebrew terms are whole words too: "מתי" (when) must not match inside
+    # "שילמתי" (I paid).
+    (re.compile(
+        r"\b(delete|undo|remove|cancel|oops|mistake|wrong|"
+        r"מחק|תמחק|למחוק|בטל|תבטל|לבטל|טעות)\b", re.I),
+     DELETE_EXPENSE_TOOL),
+    (re.compile(
+        r"\b(summary|budget|overview|over|under|total|left|recommend\w*|"
+        r"advi[cs]e|cut|sav(e|ing)|סיכום|תקציב|התקציב)\b", re.I),
+     SHOW_SUMMARY_TOOL),
+    (re.compile(
+        r"\b(how much|spen[dt]|spending|history|balance|categor\w*|כמה)\b", re.I),
+     GET_CATEGORY_TOOL),
+    (re.compile(
+        r"\b(find|search|which|where|what did|entr(y|ies)|transactions?|"
+        r"mention\w*|store|note|bought)\b|[\U0001F300-\U0001FAFF\u2600-\u27BF]", re.I),
+     GET_ALL_TRANSACTIONS_TOOL),
+    (re.compile(
+        r"\b(find|search|which|where|when|what did|last time|ever|entr(y|ies)|"
+        r"transactions?|mention\w*|store|bought|over|above|more than|"
+        r"חפש|תחפש|לחפש|מתי)\b|[\U0001F300-\U0001FAFF\u2600-\u27BF]", re.I),
+     SEARCH_TRANSACTIONS_TOOL),
+    (re.compile(
+        r"\b(compare\w*|vs\.?|versus|trend\w*|last month|previous month|"
+        r"went (up|down)|increase|decrease|השוואה|השווה|להשוות|תשווה)\b", re.I),
+     COMPARE_MONTHS_TOOL),
+]
+
+# Small talk and vague questions: the cheap read tools, plus log_expense.
+_FALLBACK_TOOLS = [LOG_EXPENSE_TOOL, SHOW_SUMMARY_TOOL, SEARCH_TRANSACTIONS_TOOL]
+
+
+def _tool_name(tool: dict) -> str:
+    return tool["function"]["name"]
+
+
+def _select_tools(user_message: str) -> list[dict]:
+    """Pick the tools relevant to this message, preserving ALL_TOOLS order."""
+    if not PRUNE_TOOLS:
+        return ALL_TOOLS
+    wanted = {
+        _tool_name(tool)
+        for pattern, tool in _TOOL_INTENTS
+        if pattern.search(user_message)
+    }
+    if not wanted:
+        return _FALLBACK_TOOLS
+    wanted.add(_tool_name(LOG_EXPENSE_TOOL))
+    return [tool for tool in ALL_TOOLS if _tool_name(tool) in wanted]
+
+
+def _without_write_tools(tools: list[dict]) -> list[dict]:
+    """Tools for follow-up iterations once a read tool has returned."""
+    if not PRUNE_TOOLS:
+        return tools
+    return [tool for tool in tools if _tool_name(tool) not in _WRITE_TOOL_NAMES]
+
+
+def _tools_tokens(tools: list[dict]) -> int:
+    return count_tokens(json.dumps(tools, ensure_ascii=False))
+
+
+_ALL_TOOLS_TOKENS = _tools_tokens(ALL_TOOLS)
+
+# ---------------------------------------------------------------------------
+# Per-user tool result cache
+#
+# Within one ask_ai call — and across a user's consecutive messages — the
+# model often re-requests the same month's summary or transactions, and every
+# request re-reads the sheet. Read tool results are memoized per user for
+# TOOL_CACHE_TTL seconds, keyed by tool name + normalized args.
+#
+# The sheet is shared by the whole family, so every sheet write — from any
+# user or path — clears ALL cached results: invalidate_tool_cache() is a
+# sheets write listener.
+# ---------------------------------------------------------------------------
+
+TOOL_CACHE_TTL = 120  # seconds
+
+# Tools whose month/year args default to "now" — resolved before keying so
+# {} and {"month": 4, "year": 2026} share one entry.
+_CURRENT_MONTH_TOOLS = {"show_summary", "get_category_spending", "get_all_transactions"}
+
+# user_id → {cache_key: (expires_at_monotonic, result)}
+_tool_cache: dict[int | None, dict[str, tuple[float, str]]] = {}
+# Bumped on every invalidation; guards against in-flight reads storing
+# results that started before the write.
+_tool_cache_generation = 0
+
+
+def _tool_cache_key(tool_name: str, args: dict) -> str:
+    normalized = {k: v for k, v in args.items() if v is not None}
+    if tool_name in _CURRENT_MONTH_TOOLS:
+        now = datetime.now()
+        normalized["month"] = normalized.get("month") or now.month
+        normalized["year"]  = normalized.get("year")  or now.year
+    return f"{tool_name}:{json.dumps(normalized, sort_keys=True)}"
+
+
+def _tool_cache_get(user_id: int | None, key: str) -> str | None:
+    entry = _tool_cache.get(user_id, {}).get(key)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return entry[1]
+
+
+def _tool_cache_put(user_id: int | None, key: str, result: str) -> None:
+    now = time.monotonic()
+    user_cache = _tool_cache.setdefault(user_id, {})
+    # Drop expired entries while we're here so the dict stays small.
+    for stale in [k for k, (expires, _) in user_cache.items() if expires < now]:
+        del user_cache[stale]
+    user_cache[key] = (now + TOOL_CACHE_TTL, result)
+
+
+def invalidate_tool_cache(tab_name: str = "") -> None:
+    """Forget every cached tool result, for every user (runs after any sheet write)."""
+    global _tool_cache_generation
+    _tool_cache.clear()
+    _tool_cache_generation += 1
+
+
+add_write_listener(invalidate_tool_cache)
+
+
 # ---------------------------------------------------------------------------
 # Tool execution helpers
 # ---------------------------------------------------------------------------
@@ -401,6 +625,34 @@ async def _run_get_all_transactions(month: int | None, year: int | None) -> str:
     return await asyncio.to_thread(_fetch)
 
 
+async def _run_search_transactions(args: dict) -> str:
+    """Query the local transaction index — only matching rows reach the prompt."""
+    import transaction_index
+
+    def _month(m: int | None, y: int | None, default_month: int) -> datetime | None:
+        if not m and not y:
+            return None
+        return datetime(y or datetime.now().year, m or default_month, 1)
+
+    # A bare year means the whole year: January … December.
+    start = _month(args.get("from_month"), args.get("from_year"), default_month=1)
+    end   = _month(args.get("to_month"),   args.get("to_year"),   default_month=12)
+    limit = max(1, min(int(args.get("limit") or SEARCH_DEFAULT_LIMIT), SEARCH_MAX_LIMIT))
+
+    matches, total = await asyncio.to_thread(
+        transaction_index.search,
+        query=args.get("query") or "",
+        category=args.get("category"),
+        start=start,
+        end=end,
+        has_emoji=bool(args.get("has_emoji")),
+        min_amount=args.get("min_amount"),
+        max_amount=args.get("max_amount"),
+        limit=limit,
+    )
+    return transaction_index.format_compact(matches, total)
+
+
 async def _run_compare_months(
     month1: int, year1: int, month2: int, year2: int
 ) -> str:
@@ -415,34 +667,382 @@ async def _run_compare_months(
     )
 
 
-async def _execute_tool(tool_name: str, args: dict) -> str:
-    try:
+# ---------------------------------------------------------------------------
+# Compact tool outputs
+#
+# The runners above hand the model the same text a human sees: HTML-stripped
+# summaries full of emoji, "₪1,234 / ₪2,000" strings and headings. The model
+# only needs the numbers, so with COMPACT_TOOL_OUTPUT each read tool returns a
+# terse pipe-separated table instead — one header line naming the columns,
+# plain numbers, no currency symbols, rows with nothing budgeted or spent
+# left out. Every result's token count is recorded in metrics as
+# "tool_result_tokens{tool=...,format=compact|text}", so flipping the flag
+# gives a before/after comparison on the same traffic.
+# ---------------------------------------------------------------------------
+
+COMPACT_TOOL_OUTPUT = True
+
+
+def _num(value: float) -> str:
+    """Plain number for the model: 1234, 1234.5 — no ₪, no thousands separators."""
+    return f"{round(value, 2):g}"
+
+
+def _compact_sections(sections: list[dict]) -> list[str]:
+    """One '#Section' total line followed by its non-empty category lines."""
+    lines = []
+    for section in sections:
+        lines.append(
+            f"#{section['name']}|{_num(section['budget'])}|"
+            f"{_num(section['spent'])}|{_num(section['balance'])}"
+        )
+        for cat, budget, spent, balance in section["categories"]:
+            if budget or spent:
+                lines.append(f"{cat}|{_num(budget)}|{_num(spent)}|{_num(balance)}")
+    return lines
+
+
+def _month_arg(month: int | None, year: int | None) -> datetime:
+    now = datetime.now()
+    return datetime(year or now.year, month or now.month, 1)
+
+
+def _no_tab(dt: datetime) -> str:
+    return f"No sheet tab for {dt.strftime('%Y-%m')}."
+
+
+async def _compact_monthly_summary(month: int | None, year: int | None) -> str:
+    from handlers.commands import summary_data
+    dt = _month_arg(month, year)
+    sections = await asyncio.to_thread(summary_data, dt)
+    if sections is None:
+        return _no_tab(dt)
+    totals = [sum(s[k] for s in sections) for k in ("budget", "spent", "balance")]
+    return "\n".join([
+        f"{dt.strftime('%Y-%m')} name|budget|spent|balance (#=section total)",
+        *_compact_sections(sections),
+        f"#TOTAL|{'|'.join(_num(t) for t in totals)}",
+    ])
+
+
+async def _compact_category_spending(
+    category: str, month: int | None, year: int | None
+) -> str:
+    from handlers.commands import _resolve_category_name, category_data
+    dt = _month_arg(month, year)
+    canonical = _resolve_category_name(category)
+    if not canonical:
+        return f"Unknown category '{category}'."
+    data = await asyncio.to_thread(category_data, canonical, dt)
+    if data is None:
+        return f"No '{canonical}' data for {dt.strftime('%Y-%m')} (tab or row missing)."
+    lines = [
+        f"{canonical} {dt.strftime('%Y-%m')} budget|spent|balance",
+        f"{_num(data['budget'])}|{_num(data['spent'])}|{_num(data['balance'])}",
+    ]
+    if data["notes"]:
+        lines.append("entries:")
+        lines.extend(data["notes"])
+    return "\n".join(lines)
+
+
+async def _compact_all_transactions(month: int | None, year: int | None) -> str:
+    """One spreadsheets.get (labels + notes) via the transaction index reader."""
+    from sheets import _build_service, find_tab_for_month
+    from transaction_index import iter_month_transactions
+
+    dt = _month_arg(month, year)
+
+    def _fetch() -> str:
+        service  = _build_service()
+        tab_info = find_tab_for_month(service, dt)
+        if not tab_info:
+            return _no_tab(dt)
+        txns = [
+            txn
+            for _, _, month_txns in iter_month_transactions(service, [(dt, tab_info[0])])
+            for txn in month_txns
+        ]
+        if not txns:
+            return f"No transactions in {dt.strftime('%Y-%m')}."
+        lines = [f"{dt.strftime('%Y-%m')} {len(txns)} entries: date|category|text"]
+        for txn in txns:
+            # The year-month is in the header — keep only "DD HH:MM"
+            lines.append(f"{txn.timestamp[8:]}|{txn.category}|{txn.text}")
+        return "\n".join(lines)
+
+    return await asyncio.to_thread(_fetch)
+
+
+async def _compact_compare_months(
+    month1: int, year1: int, month2: int, year2: int
+) -> str:
+    """Both months from the spend cube — no Sheets read when they are cached."""
+    import spend_cube
+    dt1 = datetime(year1, month1, 1)
+    dt2 = datetime(year2, month2, 1)
+    cube1, cube2 = await asyncio.gather(
+        asyncio.to_thread(spend_cube.load, dt1, dt1),
+        asyncio.to_thread(spend_cube.load, dt2, dt2),
+    )
+    col1, col2 = cube1.month(dt1), cube2.month(dt2)
+    if col1 is None or col2 is None:
+        return _no_tab(dt1 if col1 is None else dt2)
+
+    # (rows, [budget1, spent1, budget2, spent2]); a row missing from a tab counts as 0
+    measures = [spend_cube.BUDGET, spend_cube.SPENT]
+    table = np.nan_to_num(np.hstack([col1[:, measures], col2[:, measures]]))
+    keep  = np.flatnonzero(table.any(axis=1))
+
+    section_rows = set(spend_cube.SECTION_ROWS.tolist())
+    m1, m2 = dt1.strftime("%Y-%m"), dt2.strftime("%Y-%m")
+    lines = [f"name|budget {m1}|spent {m1}|budget {m2}|spent {m2} (#=section total)"]
+    for row in keep:
+        name = spend_cube.ROWS[row]
+        label = f"#{name}" if row in section_rows else name
+        lines.append(f"{label}|{'|'.join(_num(v) for v in table[row])}")
+    return "\n".join(lines)
+
+
+async def _dispatch_tool(tool_name: str, args: dict) -> str:
+    if COMPACT_TOOL_OUTPUT:
+        if tool_name == "show_summary":
+            return await _compact_monthly_summary(args.get("month"), args.get("year"))
         if tool_name == "get_category_spending":
-            return await _run_get_category_spending(
-                category=args["category"],
-                month=args.get("month"),
-                year=args.get("year"),
+            return await _compact_category_spending(
+                args["category"], args.get("month"), args.get("year")
             )
         if tool_name == "get_all_transactions":
-            return await _run_get_all_transactions(
-                month=args.get("month"), year=args.get("year")
-            )
+            return await _compact_all_transactions(args.get("month"), args.get("year"))
         if tool_name == "compare_months":
-            return await _run_compare_months(
-                month1=args["month1"], year1=args["year1"],
-                month2=args["month2"], year2=args["year2"],
+            return await _compact_compare_months(
+                args["month1"], args["year1"], args["month2"], args["year2"]
+            )
+    if tool_name == "show_summary":
+        return await _run_get_monthly_summary(
+            month=args.get("month"), year=args.get("year")
+        )
+    if tool_name == "get_category_spending":
+        return await _run_get_category_spending(
+            category=args["category"],
+            month=args.get("month"),
+            year=args.get("year"),
+        )
+    if tool_name == "get_all_transactions":
+        return await _run_get_all_transactions(
+            month=args.get("month"), year=args.get("year")
+        )
+    if tool_name == "search_transactions":
+        return await _run_search_transactions(args)
+    if tool_name == "compare_months":
+        return await _run_compare_months(
+            month1=args["month1"], year1=args["year1"],
+            month2=args["month2"], year2=args["year2"],
+        )
+    return f"Unknown tool: {tool_name}"
+
+
+async def _execute_tool(
+    tool_name: str,
+    args: dict,
+    user_id: int | None = None,
+    deadline: Deadline | None = None,
+) -> str:
+    """
+    Run one read tool through the per-user cache. Never raises.
+    With a deadline, the read may use at most half of the remaining budget —
+    the model still needs time to turn the result into an answer.
+    """
+    key = _tool_cache_key(tool_name, args)
+    cached = _tool_cache_get(user_id, key)
+    if cached is not None:
+        logger.info("Tool cache hit for user %s: %s", user_id, key)
+        return cached
+
+    generation = _tool_cache_generation
+    try:
+        if deadline is not None:
+            result = await deadline.run(
+                f"tool:{tool_name}", _dispatch_tool(tool_name, args), share=0.5
             )
-        return f"Unknown tool: {tool_name}"
+        else:
+            result = await _dispatch_tool(tool_name, args)
     except Exception as exc:
         logger.error("Tool %s failed: %s", tool_name, exc)
         return f"Error fetching data: {exc}"
 
+    result_tokens = count_tokens(result)
+    metrics.observe(
+        "tool_result_tokens", result_tokens,
+        tool=tool_name, format="compact" if COMPACT_TOOL_OUTPUT else "text",
+    )
+    logger.info("Tool %s result: %d tokens", tool_name, result_tokens)
+
+    # Skip the store if the user wrote to the sheet while we were reading —
+    # the result may already be stale.
+    if _tool_cache_generation == generation:
+        _tool_cache_put(user_id, key, result)
+    return result
+
+
+async def _execute_tool_calls(
+    calls: list[tuple],
+    user_id: int | None = None,
+    deadline: Deadline | None = None,
+) -> list[str]:
+    """
+    Run every (tool_call, args) pair from one model turn concurrently.
+
+    At most MAX_CONCURRENT_TOOL_CALLS run at once. Results come back in the
+    same order as `calls`; _execute_tool never raises, so one failing read
+    cannot take down the others.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+
+    async def _run_one(tool_call, args: dict) -> str:
+        async with semaphore:
+            started = time.monotonic()
+            result = await _execute_tool(tool_call.function.name, args, user_id, deadline)
+        logger.info(
+            "Tool %s%s took %.0fms",
+            tool_call.function.name, args, (time.monotonic() - started) * 1000,
+        )
+        return result
+
+    started = time.monotonic()
+    results = await asyncio.gather(*(_run_one(tc, args) for tc, args in calls))
+    logger.info(
+        "Executed %d tool call(s) in %.0fms",
+        len(calls), (time.monotonic() - started) * 1000,
+    )
+    return list(results)
+
+
+# ---------------------------------------------------------------------------
+# Completion helpers
+# ---------------------------------------------------------------------------
+
+# Callback used in streaming mode — receives the full text of the current
+# turn so far (not just the newest delta).
+TextCallback = Callable[[str], Awaitable[None]]
+
+
+def _log_usage(usage, started: float, tools: list[dict]) -> None:
+    """Log prompt size, prompt-cache hits, tool pruning and latency for one completion."""
+    latency_ms = (time.monotonic() - started) * 1000
+    tools_note = (
+        f"tools={len(tools)}/{len(ALL_TOOLS)} "
+        f"(~{_tools_tokens(tools)}/{_ALL_TOOLS_TOKENS} schema tokens)"
+    )
+    if usage is None:
+        logger.info("LLM call: %s latency=%.0fms (no usage reported)", tools_note, latency_ms)
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+    logger.info(
+        "LLM call: prompt=%d cached=%d completion=%d %s latency=%.0fms",
+        usage.prompt_tokens, cached, usage.completion_tokens, tools_note, latency_ms,
+    )
+
+
+async def _create_completion(
+    messages: list,
+    tools: list[dict],
+    on_text: TextCallback | None = None,
+    timeout: float = LLM_CALL_TIMEOUT,
+) -> Choice:
+    """
+    Run one chat completion and return its first Choice.
+
+    Without on_text this is a plain request. With on_text the request is
+    streamed and the Choice is rebuilt from the deltas, so callers can treat
+    both modes identically. Goes through llm_gateway, so it raises
+    LLMUnavailable when the endpoint is slow, failing or circuit-broken.
+    """
+    async def _request(client) -> Choice:
+        started = time.monotonic()
+        if on_text is None:
+            response = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                tools=tools,
+                tool_choice="auto",
+                temperature=0,
+            )
+            _log_usage(response.usage, started, tools)
+            return response.choices[0]
+
+        stream = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            tools=tools,
+            tool_choice="auto",
+            temperature=0,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+        content_parts: list[str] = []
+        tool_calls: dict[int, dict] = {}
+        finish_reason = "stop"
+        usage = None
+
+        async for chunk in stream:
+            # With include_usage the last chunk has no choices, only usage.
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta_choice = chunk.choices[0]
+            delta = delta_choice.delta
+
+            if delta.content:
+                content_parts.append(delta.content)
+                await on_text("".join(content_parts))
+
+            # Tool calls arrive as fragments keyed by index — the id and name in
+            # the first fragment, the JSON arguments spread over the rest.
+            for tc in delta.tool_calls or []:
+                slot = tool_calls.setdefault(tc.index, {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""},
+                })
+                if tc.id:
+                    slot["id"] = tc.id
+                if tc.function:
+                    if tc.function.name:
+                        slot["function"]["name"] += tc.function.name
+                    if tc.function.arguments:
+                        slot["function"]["arguments"] += tc.function.arguments
+
+            if delta_choice.finish_reason:
+                finish_reason = delta_choice.finish_reason
+
+        _log_usage(usage, started, tools)
+        message: dict = {"role": "assistant", "content": "".join(content_parts) or None}
+        if tool_calls:
+            message["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+        return Choice.model_validate({
+            "index": 0,
+            "finish_reason": finish_reason,
+            "message": message,
+        })
+
+    return await llm_gateway.call(_request, timeout=timeout)
+
 
 # ---------------------------------------------------------------------------
 # Main coroutine
 # ---------------------------------------------------------------------------
 
-async def ask_ai(user_message: str, history: list[dict]) -> dict:
+async def ask_ai(
+    user_message: str,
+    history: list[dict],
+    on_text: TextCallback | None = None,
+    user_id: int | None = None,
+    deadline: Deadline | None = None,
+) -> dict:
     """
     Send user_message to GPT-4o-mini with recent conversation history.
 
@@ -450,12 +1050,51 @@ async def ask_ai(user_message: str, history: list[dict]) -> dict:
     and produce a natural final answer — all surfaced as one reply to the user.
     log_expense is the only write tool; it is returned immediately to the caller.
 
+    If on_text is given the loop runs in streaming mode (see module docstring)
+    and the final reply text is also delivered progressively through it.
+    user_id scopes the tool result cache (see invalidate_tool_cache).
+    deadline (see deadline.py) bounds every LLM call and tool read; the loop
+    stops early once too little of it is left for another round trip.
+
     Returns:
         {"action": "log",   "category": str, "amount": float}
         {"action": "reply", "text": str}
     """
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-    messages.extend(history[-AI_HISTORY_LIMIT:])
+    started = time.monotonic()
+    first_token_at: float | None = None
+
+    async def _timed_on_text(text: str) -> None:
+        nonlocal first_token_at
+        if first_token_at is None:
+            first_token_at = time.monotonic()
+        await on_text(text)
+
+    result = await _agent_loop(
+        user_message, history, _timed_on_text if on_text else None, user_id, deadline
+    )
+
+    total_ms = (time.monotonic() - started) * 1000
+    if first_token_at is not None:
+        ttft = f"{(first_token_at - started) * 1000:.0f}ms"
+    else:
+        ttft = "n/a"
+    logger.info(
+        "ask_ai: action=%s ttft=%s total=%.0fms streaming=%s",
+        result["action"], ttft, total_ms, on_text is not None,
+    )
+    return result
+
+
+async def _agent_loop(
+    user_message: str,
+    history: list[dict],
+    on_text: TextCallback | None,
+    user_id: int | None,
+    deadline: Deadline | None,
+) -> dict:
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, _date_context()]
+    # history is already token-budgeted by handlers/ai_history.py
+    messages.extend(history)
     messages.append({"role": "user", "content": user_message})
 
     # Tracks whether the interactive summary UI should be displayed after the loop.
@@ -463,15 +1102,20 @@ async def ask_ai(user_message: str, history: list[dict]) -> dict:
     # can render the UI alongside any text the AI produces.
     pending_show_summary: dict | None = None
 
+    tools = _select_tools(user_message)
+
     for _ in range(MAX_TOOL_ITERATIONS):
+        timeout = LLM_CALL_TIMEOUT
+        if deadline is not None:
+            timeout = deadline.budget_for("llm", cap=LLM_CALL_TIMEOUT)
+            if timeout < MIN_LLM_BUDGET:
+                deadline.record_overrun("agent_loop")
+                break
         try:
-            response = await _get_client().chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                tools=ALL_TOOLS,
-                tool_choice="auto",
-                temperature=0,
-            )
+            choice = await _create_completion(messages, tools, on_text, timeout)
+        except LLMUnavailable as exc:
+            logger.warning("LLM unavailable, degrading: %s", exc)
+            return {"action": "unavailable"}
         except Exception as exc:
             logger.error("OpenAI API error: %s", exc)
             return {
@@ -479,8 +1123,6 @@ async def ask_ai(user_message: str, history: list[dict]) -> dict:
                 "text": "Sorry, I couldn't process that right now. Please try again.",
             }
 
-        choice = response.choices[0]
-
         if choice.finish_reason == "tool_calls" and choice.message.tool_calls:
             all_calls = choice.message.tool_calls
 
@@ -502,46 +1144,42 @@ async def ask_ai(user_message: str, history: list[dict]) -> dict:
                         return {"action": "log", **expenses[0]}
                     return {"action": "log_multiple", "expenses": expenses}
 
-            # --- Single non-log tool call ----------------------------------------
-            tool_call = all_calls[0]
-            tool_name = tool_call.function.name
-
-            try:
-                args = json.loads(tool_call.function.arguments)
-            except json.JSONDecodeError:
-                args = {}
+            # --- Parse every call's arguments once ----------------------------
+            parsed_calls: list[tuple] = []
+            for tc in all_calls:
+                try:
+                    args = json.loads(tc.function.arguments or "{}")
+                except json.JSONDecodeError:
+                    args = {}
+                parsed_calls.append((tc, args))
 
             # delete_expense — return to caller for execution
-            if tool_name == "delete_expense":
-                return {"action": "delete", "n": int(args.get("n", 1))}
-
-            # show_summary — fetch data so AI can reason, flag UI for display,
-            # then stay in the loop so the AI can formulate a text response
-            if tool_name == "show_summary":
-                now_dt = datetime.now()
-                pending_show_summary = {
-                    "month": args.get("month") or now_dt.month,
-                    "year":  args.get("year")  or now_dt.year,
-                }
-                data = await _run_get_monthly_summary(
-                    args.get("month"), args.get("year")
-                )
-                messages.append(choice.message)
+            for tc, args in parsed_calls:
+                if tc.function.name == "delete_expense":
+                    return {"action": "delete", "n": int(args.get("n", 1))}
+
+            # show_summary — flag the UI for display; its data is fetched with
+            # the other reads below so the AI can formulate a text response
+            for tc, args in parsed_calls:
+                if tc.function.name == "show_summary":
+                    now_dt = datetime.now()
+                    pending_show_summary = {
+                        "month": args.get("month") or now_dt.month,
+                        "year":  args.get("year")  or now_dt.year,
+                    }
+
+            # Read tools: execute ALL of them concurrently, feed every result
+            # back (the API requires one tool message per call id), then loop
+            # for the final answer
+            tool_results = await _execute_tool_calls(parsed_calls, user_id, deadline)
+            messages.append(choice.message)
+            for (tc, _), tool_result in zip(parsed_calls, tool_results):
                 messages.append({
                     "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": data,
+                    "tool_call_id": tc.id,
+                    "content": tool_result,
                 })
-                continue
-
-            # All other read tools: execute, feed result back, loop for final answer
-            tool_result = await _execute_tool(tool_name, args)
-            messages.append(choice.message)
-            messages.append({
-                "role": "tool",
-                "tool_call_id": tool_call.id,
-                "content": tool_result,
-            })
+            tools = _without_write_tools(tools)
             continue
 
         # Plain text response — done; attach show_summary if it was requested
@@ -617,14 +1255,49 @@ Rules you must follow:
 """
 
 
-async def explain_sheet_missing(user_message: str, failure) -> str:
-    """
-    Produce a natural-language explanation of why the target sheet couldn't
-    be found, given a TabLookupFailure from sheets.py.
+# The explanation is a nice-to-have — don't make the user wait long for it.
+EXPLAIN_TIMEOUT = 10.0
 
-    One-shot: no tools, no history, no retries. Falls back to a templated
-    message if the API call fails.
-    """
+# ---------------------------------------------------------------------------
+# Explanation cache
+#
+# On the 1st of the month, before anyone creates the new tab, every family
+# member's first expense fails with the same TabLookupFailure. The explanation
+# depends only on the target month and the tab list, so it is cached under
+# (target_month, hash of existing_tabs) and concurrent identical requests
+# share one in-flight LLM call. Creating or renaming a tab changes the hash,
+# which retires the old entry — the month-start burst costs one call, not N.
+# ---------------------------------------------------------------------------
+
+EXPLAIN_CACHE_TTL = 3600  # seconds
+
+# (target_month, tabs_hash) → (expires_at_monotonic, explanation)
+_explain_cache: dict[tuple[str, str], tuple[float, str]] = {}
+# (target_month, tabs_hash) → the task currently asking the LLM
+_explain_inflight: dict[tuple[str, str], asyncio.Task] = {}
+
+
+def _explain_cache_key(failure) -> tuple[str, str]:
+    tabs_hash = hashlib.sha1("\n".join(failure.existing_tabs).encode()).hexdigest()[:16]
+    return failure.target_month, tabs_hash
+
+
+def _explain_cache_get(key: tuple[str, str]) -> str | None:
+    entry = _explain_cache.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return entry[1]
+
+
+def _explain_cache_put(key: tuple[str, str], text: str) -> None:
+    # The tab list changed since any other entry for this month was stored —
+    # those are stale now.
+    for stale in [k for k in _explain_cache if k[0] == key[0] and k != key]:
+        del _explain_cache[stale]
+    _explain_cache[key] = (time.monotonic() + EXPLAIN_CACHE_TTL, text)
+
+
+def _explain_user_content(failure) -> str:
     # Keep the prompt small — cap the tab list to avoid ballooning tokens
     # for users with many years of tabs.
     tabs_preview = failure.existing_tabs[:40]
@@ -632,28 +1305,91 @@ async def explain_sheet_missing(user_message: str, failure) -> str:
     if len(failure.existing_tabs) > 40:
         tabs_note = f"\n(plus {len(failure.existing_tabs) - 40} older tabs not shown)"
 
-    user_content = (
+    return (
         f"Target month: {failure.target_month}\n"
         f"Tab name formats the bot tried: {failure.tried_formats}\n"
         f"Existing tab names in the spreadsheet: {tabs_preview}{tabs_note}\n\n"
-        f"The user's original message was: {user_message!r}\n\n"
         f"Write the explanation."
     )
 
+
+async def _request_explanation(
+    key: tuple[str, str],
+    user_content: str,
+    timeout: float,
+) -> str | None:
+    """One LLM call; caches and returns the text, or None on any failure."""
     try:
-        response = await _get_client().chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": _SHEET_MISSING_SYSTEM_PROMPT},
-                {"role": "user", "content": user_content},
-            ],
-            temperature=0.2,
+        response = await llm_gateway.call(
+            lambda client: client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": _SHEET_MISSING_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content},
+                ],
+                temperature=0.2,
+            ),
+            timeout=timeout,
         )
-        text = (response.choices[0].message.content or "").strip()
-        if text:
-            return text
     except Exception as exc:
         logger.error("OpenAI error in explain_sheet_missing: %s", exc)
+        return None
+
+    text = (response.choices[0].message.content or "").strip()
+    if text:
+        _explain_cache_put(key, text)
+    return text or None
+
+
+async def explain_sheet_missing(
+    user_message: str,
+    failure,
+    deadline: Deadline | None = None,
+) -> str:
+    """
+    Produce a natural-language explanation of why the target sheet couldn't
+    be found, given a TabLookupFailure from sheets.py.
+
+    One-shot: no tools, no history, no retries. Cached and coalesced per
+    (target month, tab list) — see above — so user_message is only logged,
+    never sent. Falls back to a templated message if the API call fails or
+    the LLM gateway is degraded.
+    """
+    key = _explain_cache_key(failure)
+    cached = _explain_cache_get(key)
+    if cached is not None:
+        metrics.incr("explain_sheet_missing", result="cache_hit")
+        logger.info("explain_sheet_missing cache hit for %s (message %r)", key, user_message)
+        return cached
+
+    timeout = EXPLAIN_TIMEOUT
+    if deadline is not None:
+        timeout = deadline.budget_for("explain", cap=EXPLAIN_TIMEOUT)
+
+    text = None
+    if timeout < MIN_LLM_BUDGET:
+        logger.info("Skipping explain_sheet_missing LLM call — update deadline nearly spent")
+    else:
+        task = _explain_inflight.get(key)
+        if task is None:
+            metrics.incr("explain_sheet_missing", result="llm_call")
+            task = asyncio.create_task(
+                _request_explanation(key, _explain_user_content(failure), timeout)
+            )
+            _explain_inflight[key] = task
+            task.add_done_callback(lambda _: _explain_inflight.pop(key, None))
+        else:
+            metrics.incr("explain_sheet_missing", result="coalesced")
+            logger.info("explain_sheet_missing coalesced onto in-flight call for %s", key)
+        # shield: a caller with a shorter deadline giving up must not cancel
+        # the shared call the others are waiting on.
+        try:
+            text = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            logger.info("explain_sheet_missing wait timed out after %.1fs", timeout)
+
+    if text:
+        return text
 
     # Fallback: deterministic template so the user still gets something useful
     recent = ", ".join(failure.existing_tabs[:3]) if failure.existing_tabs else "(none)"
@@ -663,3 +1399,4 @@ async def explain_sheet_missing(user_message: str, failure) -> str:
         f"Please check that you have a tab named '{failure.tried_formats[0]}' "
         f"(or rename an existing one if it's close)."
     )
+
@@ -0,0 +1,148 @@
+"""
+handlers/ai_history.py — Token-budgeted per-user AI conversation history.
+
+Stored in context.user_data (one dict per user, owned by python-telegram-bot):
+    ai_history          list of {"role": "user"|"assistant", "content": str}
+                        — the most recent turns, sent verbatim
+    ai_history_summary  str — rolling condensed summary of everything older
+
+add_turn(user_data, role, content)   — record one message, enforce the budget
+build_history(user_data) -> list     — the messages ask_ai should send
+count_tokens(text) -> int            — local token count, no API call
+
+Why a token budget instead of an entry count
+--------------------------------------------
+An entry cap lets a few long advisory answers blow up every prompt, and ask_ai
+resends the history on every iteration of its tool loop. Here the verbatim
+turns are capped at AI_HISTORY_TOKEN_BUDGET tokens. When a new turn pushes
+past it, the oldest turns are folded, one line each, into the rolling summary,
+which is itself capped at SUMMARY_TOKEN_BUDGET (oldest lines fall off first).
+The prompt therefore stays roughly the same size however chatty a user gets.
+
+Summarization is purely local (truncate + strip HTML) — an extra LLM call per
+overflow would add exactly the latency this is meant to remove.
+"""
+
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Verbatim recent turns are kept within this many tokens.
+AI_HISTORY_TOKEN_BUDGET = 1200
+
+# The rolling summary of older turns is kept within this many tokens.
+SUMMARY_TOKEN_BUDGET = 300
+
+# Truncate any single history entry to this many characters before counting.
+# Long tool outputs (e.g. summary text) occasionally leak into assistant
+# messages; cap them so one entry cannot crowd out the rest of the budget.
+MAX_CONTENT_CHARS = 1000
+
+# Each condensed summary line keeps at most this many characters of the turn.
+SUMMARY_LINE_CHARS = 120
+
+# Per-message framing overhead in the chat format (role, separators).
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+# UI bookkeeping notes like "[Showed summary for April 2026]" carry no
+# information the model can use — they are never stored.
+_BOOKKEEPING_RE = re.compile(r"^\[[^\]]*\]$")
+
+
+# ---------------------------------------------------------------------------
+# Token counting
+# ---------------------------------------------------------------------------
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")  # gpt-4o family
+except Exception:  # not installed, or the encoding file can't be fetched
+    _encoding = None
+    logger.info("tiktoken unavailable — estimating tokens as chars / 4")
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens locally. Exact with tiktoken, ~4 chars/token otherwise."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def _entry_tokens(entry: dict) -> int:
+    return count_tokens(entry["content"]) + _MESSAGE_OVERHEAD_TOKENS
+
+
+# ---------------------------------------------------------------------------
+# Summary helpers
+# ---------------------------------------------------------------------------
+
+def _condense(entry: dict) -> str:
+    """One short summary line for a turn that is leaving the verbatim window."""
+    text = re.sub(r"<[^>]+>", "", entry["content"])
+    text = " ".join(text.split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS] + "…"
+    speaker = "User" if entry["role"] == "user" else "Bot"
+    return f"{speaker}: {text}"
+
+
+def _trim_summary(lines: list[str]) -> list[str]:
+    total = sum(count_tokens(line) for line in lines)
+    while lines and total > SUMMARY_TOKEN_BUDGET:
+        total -= count_tokens(lines.pop(0))
+    return lines
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def add_turn(user_data: dict, role: str, content: str) -> None:
+    """
+    Append a message to the user's history and enforce the token budget.
+    Turns that overflow the verbatim window are folded into the summary.
+    """
+    content = content.strip()
+    if not content or _BOOKKEEPING_RE.match(content):
+        return
+    if len(content) > MAX_CONTENT_CHARS:
+        content = content[:MAX_CONTENT_CHARS] + "..."
+
+    history: list = user_data.setdefault("ai_history", [])
+    history.append({"role": role, "content": content})
+
+    total = sum(_entry_tokens(e) for e in history)
+    if total <= AI_HISTORY_TOKEN_BUDGET:
+        return
+
+    summary = user_data.get("ai_history_summary", "")
+    lines = summary.split("\n") if summary else []
+    # Always keep the newest entry verbatim, even if it alone is over budget.
+    while len(history) > 1 and total > AI_HISTORY_TOKEN_BUDGET:
+        oldest = history.pop(0)
+        total -= _entry_tokens(oldest)
+        lines.append(_condense(oldest))
+    user_data["ai_history_summary"] = "\n".join(_trim_summary(lines))
+
+
+def build_history(user_data: dict) -> list[dict]:
+    """Return the summary (if any) followed by the verbatim recent turns."""
+    history = list(user_data.get("ai_history", []))
+    summary = user_data.get("ai_history_summary")
+    if summary:
+        history.insert(0, {
+            "role": "system",
+            "content": f"Earlier in this conversation (condensed):\n{summary}",
+        })
+    return history
+
+
+def clear(user_data: dict) -> bool:
+    """Drop all AI history for a user. Returns True if there was any."""
+    had_any = bool(user_data.get("ai_history") or user_data.get("ai_history_summary"))
+    user_data.pop("ai_history", None)
+    user_data.pop("ai_history_summary", None)
+    return had_any
@@ -9,17 +9,20 @@ The pending state (suggestion, amount, original_text) is stored in
 context.user_data["pending"] by tg_handle_message before the buttons are sent.
 """
 
+import asyncio
 import logging
 from datetime import datetime
 
 from telegram import Update
 from telegram.ext import ContextTypes
 
+import dedup
+from deadline import CALLBACK_DEADLINE_SECONDS, Deadline, DeadlineExceeded
 from sheets import log_expense
 from handlers.commands import (
     append_to_history,
-    summary as get_summary,
-    section_detail as get_section_detail,
+    render_summary,
+    render_section,
     delete as do_delete,
     BROAD_CATEGORIES,
 )
@@ -27,12 +30,24 @@ from handlers.ai_handler import explain_sheet_missing
 
 logger = logging.getLogger(__name__)
 
+# Buttons that write to the sheet. A double tap sends two callback queries
+# (different ids) for the same button, so these are also deduplicated per
+# message + button.
+WRITE_CALLBACKS = {"fuzzy_yes", "help_delete"}
+
 
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    deadline = Deadline(CALLBACK_DEADLINE_SECONDS, name="callback")
     query = update.callback_query
     await query.answer()  # acknowledge the tap immediately (removes loading indicator)
 
     data = query.data
+    if dedup.is_duplicate(f"callback:{query.id}"):
+        return
+    if data in WRITE_CALLBACKS and query.message is not None and dedup.is_duplicate(
+        f"button:{query.message.chat.id}:{query.message.message_id}:{data}"
+    ):
+        return
     pending = context.user_data.get("pending")
 
     # ------------------------------------------------------------------
@@ -61,26 +76,32 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             )
             return
 
-        log_result = log_expense(
-            category=category,
-            amount=amount,
-            original_text=original,
-        )
+        # Writes are never cancelled, only measured against the deadline
+        with deadline.track("sheets_write"):
+            log_result = await asyncio.to_thread(
+                log_expense,
+                category=category,
+                amount=amount,
+                original_text=original,
+            )
 
         if log_result.success:
             append_to_history(
+                user_id=update.effective_user.id,
                 category=log_result.category,
                 amount=log_result.amount_added,
                 tab_name=log_result.tab_name,
                 row=log_result.row,
                 timestamp=log_result.timestamp,
                 original_text=original,
+                txn_id=log_result.txn_id,
+                line=log_result.line,
             )
             await query.edit_message_text(
                 f"<b>{log_result.message}</b>", parse_mode="HTML"
             )
         elif log_result.failure is not None:
-            explanation = await explain_sheet_missing(original, log_result.failure)
+            explanation = await explain_sheet_missing(original, log_result.failure, deadline)
             await query.edit_message_text(explanation, parse_mode="HTML")
         else:
             await query.edit_message_text(
@@ -104,7 +125,11 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif data.startswith("summary|"):
         _, year_str, month_str = data.split("|")
         dt = datetime(int(year_str), int(month_str), 1)
-        text, keyboard = get_summary(dt)
+        try:
+            text, keyboard = await deadline.run("sheets_read", render_summary(dt))
+        except DeadlineExceeded:
+            await query.edit_message_text("The summary is taking too long — please tap again.")
+            return
         await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
     # ------------------------------------------------------------------
@@ -113,7 +138,11 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif data.startswith("section|"):
         _, section_name, year_str, month_str = data.split("|", 3)
         dt = datetime(int(year_str), int(month_str), 1)
-        text, keyboard = get_section_detail(section_name, dt)
+        try:
+            text, keyboard = await deadline.run("sheets_read", render_section(section_name, dt))
+        except DeadlineExceeded:
+            await query.edit_message_text("This section is taking too long — please tap again.")
+            return
         await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
 
     # ------------------------------------------------------------------
@@ -131,7 +160,8 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # help_delete — undo the most recent expense (tapped from /help keyboard)
     # ------------------------------------------------------------------
     elif data == "help_delete":
-        result = do_delete(1)
+        with deadline.track("sheets_write"):
+            result = await asyncio.to_thread(do_delete, update.effective_user.id, 1)
         await query.edit_message_text(result, parse_mode="HTML")
 
     else:
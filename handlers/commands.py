@@ -9,31 +9,57 @@ Commands:
     categories()            → list all categories by section
     keywords(name)          → show keywords that trigger a category
     summary()               → this month's budget vs actual per broad section
+    render_summary()        → the same, async, cached with neighbouring months prefetched
+    summary_data()          → the same figures (plus per-category rows) as dicts
     category(name)          → budget/actual/balance + transaction history for one category
+    category_data(name)     → the same as a dict, for the AI tools
     balance(name)           → quick remaining balance for one category
-    delete(n)               → undo the nth most recent logged expense (default: 1)
-    show_history()          → list the last N logged expenses (for picking which to delete)
+    delete(user_id, n)      → undo the user's n most recent logged expenses (default: 1)
+    edit(txn_id, amount)    → change the amount of one logged expense
+    show_history(user_id)   → list the user's last N logged expenses (for picking which to delete)
+    search(args)            → find logged expenses across all months
+    export_csv(args)        → every transaction in a month range as a CSV file
 """
 
-import json
+import asyncio
+import csv
+import html
+import io
 import logging
+import math
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import IO, Optional
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
-from config import HISTORY_FILE, HISTORY_LIMIT
+import history_store
+import metrics
+import spend_cube
+from config import HISTORY_LIMIT
+from parsing import category_index
 from parsing.category_map import CATEGORY_MAP, BROAD_CATEGORIES
 from sheets import (
     _build_service,
     find_tab_for_month,
     find_category_row,
-    _read_current_amount,
+    _find_note_line,
+    _parse_currency,
+    _read_cells,
     _read_existing_note,
-    _write_amount,
-    _write_note,
+    _row_amounts,
+    _txn_tag,
+    _write_cells,
+    _write_lock,
+    add_write_listener,
     get_spreadsheet_tabs,
+    notify_write,
+    split_txn_tag,
     SPREADSHEET_ID,
 )
 
@@ -51,15 +77,19 @@ def help() -> str:
         "  Just type it naturally, e.g.:\n"
         "    groceries 120\n"
         "    Mortgage insurance 1052 paid online\n"
-        "    250 fuel toyota\n\n"
+        "    250 fuel toyota\n"
+        "  Or type @<bot name> groc 120 in the chat and tap a suggested category.\n\n"
         "Commands:\n"
         "  /summary              — this month's budget overview\n"
         "  /category <name>      — details + history for one category\n"
         "  /balance <name>       — quick remaining balance for a category\n"
         "  /categories           — list all available categories\n"
         "  /keywords <name>      — show keywords that trigger a category\n"
+        "  /search <words>       — find past expenses (cat: from: to: min: max: emoji)\n"
+        "  /export [from] [to]   — all expenses in a month range as CSV (e.g. /export 0126 1226)\n"
         "  /delete               — undo the most recent expense\n"
         "  /delete <n>           — undo the last n expenses (e.g. /delete 3)\n"
+        "  /edit <id> <amount>   — change an expense's amount (IDs shown by /search)\n"
         "  /help                 — show this message\n"
     )
 
@@ -83,17 +113,16 @@ def categories() -> str:
 # ---------------------------------------------------------------------------
 
 def keywords(name: str) -> str:
-    name_lower = name.strip().lower()
+    cat_name = category_index.canonical_name(name)
+    if cat_name:
+        joined = "\n  ".join(CATEGORY_MAP[cat_name])
+        return f"Keywords for '{cat_name}':\n  {joined}"
 
-    for cat_name, kw_list in CATEGORY_MAP.items():
-        if cat_name.lower() == name_lower:
-            joined = "\n  ".join(kw_list)
-            return f"Keywords for '{cat_name}':\n  {joined}"
-
-    for cat_name, kw_list in CATEGORY_MAP.items():
-        if name_lower in [kw.lower() for kw in kw_list]:
-            joined = "\n  ".join(kw_list)
-            return f"'{name}' is a keyword for '{cat_name}'.\nAll keywords:\n  {joined}"
+    owners = category_index.categories_for_keyword(name)
+    if owners:
+        cat_name = owners[0]
+        joined = "\n  ".join(CATEGORY_MAP[cat_name])
+        return f"'{name}' is a keyword for '{cat_name}'.\nAll keywords:\n  {joined}"
 
     return (
         f"Category '{name}' not found.\n"
@@ -220,6 +249,41 @@ def _summary_keyboard(dt: datetime, section_names: list[str] = None) -> InlineKe
     return InlineKeyboardMarkup(rows)
 
 
+def _parse_sections(rows: list) -> list[dict]:
+    """
+    Parse an A:D grid into one dict per broad section found in the sheet:
+        {"name", "budget", "spent", "balance",
+         "categories": [(name, budget, spent, balance), ...]}
+
+    Section totals come from the sheet's own total row, which sits x+1 rows
+    below the header, where x = number of subcategories in that section.
+    """
+    sections = []
+    for section_name, subcats in BROAD_CATEGORIES.items():
+        header_idx = _find_row_index(rows, section_name)
+        if header_idx is None:
+            continue
+        total_idx = header_idx + len(subcats) + 1
+        if total_idx >= len(rows):
+            continue
+
+        budget, spent, balance = _row_amounts(rows[total_idx])
+        categories = []
+        for cat in subcats:
+            idx = _find_row_index(rows, cat)
+            if idx is not None:
+                categories.append((cat, *_row_amounts(rows[idx])))
+
+        sections.append({
+            "name": section_name,
+            "budget": budget,
+            "spent": spent,
+            "balance": balance,
+            "categories": categories,
+        })
+    return sections
+
+
 def _format_summary_html(
     dt: datetime,
     sections: list[tuple],
@@ -252,76 +316,97 @@ def _format_summary_html(
 # /summary
 # ---------------------------------------------------------------------------
 
+def _render_summary(dt: datetime, parsed: list[dict]) -> tuple[str, InlineKeyboardMarkup]:
+    """(html_text, navigation_keyboard) from the month's _parse_sections() dicts."""
+    sections      = []
+    grand_spent   = 0.0
+    grand_budget  = 0.0
+    grand_balance = 0.0
+    over_budget   = []
+
+    for section in parsed:
+        sections.append((section["name"], section["spent"], section["budget"], section["balance"]))
+        grand_spent   += section["spent"]
+        grand_budget  += section["budget"]
+        grand_balance += section["balance"]
+
+        if section["balance"] < 0:
+            over_budget.append(section["name"])
+
+    text = _format_summary_html(
+        dt, sections, grand_spent, grand_budget, grand_balance, over_budget
+    )
+    keyboard = _summary_keyboard(dt, section_names=[s[0] for s in sections])
+    return text, keyboard
+
+
 def summary(dt: datetime = None) -> tuple[str, InlineKeyboardMarkup]:
     """
     Return (html_text, navigation_keyboard) for the given month.
 
-    Reads each broad category's total row directly from the sheet:
-      - Finds the broad category header in column A
-      - Reads B, C, D from row: header_row + len(subcategories) + 1
-    This trusts the sheet's own totals rather than summing subcategories in Python.
+    Reads each broad category's total row directly from the sheet (see
+    _parse_sections). This trusts the sheet's own totals rather than summing
+    subcategories in Python. Served from the render cache when fresh.
+    """
+    if dt is None:
+        dt = datetime.now()
+
+    rendered = _cached_month(dt) or _render_month(dt)
+    if rendered is None:
+        return _tab_not_found_message(_build_service(), dt), _summary_keyboard(dt)
+    return rendered.summary
+
+
+def summary_data(dt: datetime = None) -> Optional[list[dict]]:
+    """
+    Structured version of summary() for programmatic callers (the AI tools):
+    the _parse_sections() dicts for the month, including per-category rows.
+    Returns None if the month has no tab. One API call besides the tab lookup.
     """
     if dt is None:
         dt = datetime.now()
 
     service  = _build_service()
     tab_info = find_tab_for_month(service, dt)
-
     if not tab_info:
-        return (
-            _tab_not_found_message(service, dt),
-            _summary_keyboard(dt),
-        )
-
+        return None
     tab_name, _ = tab_info
 
-    # One API call — read all of A:D
     result = service.spreadsheets().values().get(
         spreadsheetId=SPREADSHEET_ID,
         range=f"'{tab_name}'!A1:D200"
     ).execute()
     rows = result.get("values", [])
 
-    sections      = []
-    grand_spent   = 0.0
-    grand_budget  = 0.0
-    grand_balance = 0.0
-    over_budget   = []
-
-    for section_name, subcats in BROAD_CATEGORIES.items():
-        header_idx = _find_row_index(rows, section_name)
-        if header_idx is None:
-            continue
+    spend_cube.record(dt, tab_name, rows)
+    return _parse_sections(rows)
 
-        # The sheet places the section total x+1 rows below the header,
-        # where x = number of subcategories in that section.
-        total_idx = header_idx + len(subcats) + 1
-        if total_idx >= len(rows):
-            continue
 
-        total_row = rows[total_idx]
-        budget  = _parse_currency(total_row[1] if len(total_row) > 1 else "")
-        spent   = _parse_currency(total_row[2] if len(total_row) > 2 else "")
-        balance = _parse_currency(total_row[3] if len(total_row) > 3 else "")
-
-        sections.append((section_name, spent, budget, balance))
-        grand_spent   += spent
-        grand_budget  += budget
-        grand_balance += balance
+# ---------------------------------------------------------------------------
+# Section drill-down (tapped from /summary keyboard)
+# ---------------------------------------------------------------------------
 
-        if balance < 0:
-            over_budget.append(section_name)
+def _render_section(section_name: str, dt: datetime, rows: list) -> tuple[str, InlineKeyboardMarkup]:
+    """(html_text, back_keyboard) for one broad section, from the month's A:D rows."""
+    emoji = _section_emoji(section_name)
+    lines = [f"{emoji} <b>{section_name} — {dt.strftime('%B %Y')}</b>\n"]
 
-    text = _format_summary_html(
-        dt, sections, grand_spent, grand_budget, grand_balance, over_budget
-    )
-    keyboard = _summary_keyboard(dt, section_names=[s[0] for s in sections])
-    return text, keyboard
+    for cat in BROAD_CATEGORIES[section_name]:
+        idx = _find_row_index(rows, cat)
+        if idx is None:
+            continue
+        budget, spent, bal = _row_amounts(rows[idx])
+        warning = " ⚠" if bal < 0 else ""
+        lines.append(f"  • <b>{cat}</b>{warning}   {_fmt_amount(spent)} / {_fmt_amount(budget)}")
 
+    keyboard = InlineKeyboardMarkup([[
+        InlineKeyboardButton(
+            f"← Back to summary",
+            callback_data=f"summary|{dt.year}|{dt.month}",
+        ),
+    ]])
+    return "\n".join(lines), keyboard
 
-# ---------------------------------------------------------------------------
-# Section drill-down (tapped from /summary keyboard)
-# ---------------------------------------------------------------------------
 
 def section_detail(section_name: str, dt: datetime = None) -> tuple[str, InlineKeyboardMarkup]:
     """
@@ -331,46 +416,200 @@ def section_detail(section_name: str, dt: datetime = None) -> tuple[str, InlineK
     if dt is None:
         dt = datetime.now()
 
-    subcats = BROAD_CATEGORIES.get(section_name)
-    if not subcats:
+    if section_name not in BROAD_CATEGORIES:
         return f"Section '{section_name}' not found.", _summary_keyboard(dt)
 
+    rendered = _cached_month(dt) or _render_month(dt)
+    if rendered is None:
+        return _tab_not_found_message(_build_service(), dt), _summary_keyboard(dt)
+    return rendered.sections[section_name]
+
+
+# ---------------------------------------------------------------------------
+# Summary render cache
+#
+# ←/→ taps and section drill-downs used to re-read the month tab every time.
+# Now one read of a month renders its summary AND every section drill-down,
+# cached per month together with the tab's revision: sheets.notify_write bumps
+# a tab's revision on every bot write, which invalidates it. Hand edits in the
+# sheet are picked up after SUMMARY_CACHE_TTL.
+#
+# The async wrappers (render_summary / render_section) share one in-flight
+# read per month, and whenever a summary is shown the previous and next
+# months are rendered in the background so the next tap is instant.
+# ---------------------------------------------------------------------------
+
+# Seconds a rendered month is trusted without a bot write to its tab.
+SUMMARY_CACHE_TTL = 300
+
+# Rendered months kept (least recently used dropped first).
+SUMMARY_CACHE_MONTHS = 24
+
+
+@dataclass
+class _RenderedMonth:
+    tab_name: str
+    revision: int
+    rendered_at: float
+    summary: tuple[str, InlineKeyboardMarkup]
+    sections: dict[str, tuple[str, InlineKeyboardMarkup]]
+
+
+_render_lock = threading.Lock()
+_render_cache: "OrderedDict[tuple[int, int], _RenderedMonth]" = OrderedDict()
+_tab_revisions: dict[str, int] = {}
+_render_inflight: dict[tuple[int, int], asyncio.Task] = {}
+
+
+def _bump_revision(tab_name: str) -> None:
+    with _render_lock:
+        _tab_revisions[tab_name] = _tab_revisions.get(tab_name, 0) + 1
+
+
+add_write_listener(_bump_revision)
+
+
+def _cached_month(dt: datetime) -> Optional[_RenderedMonth]:
+    key = (dt.year, dt.month)
+    with _render_lock:
+        rendered = _render_cache.get(key)
+        if rendered is None:
+            return None
+        if (
+            rendered.revision != _tab_revisions.get(rendered.tab_name, 0)
+            or time.monotonic() - rendered.rendered_at > SUMMARY_CACHE_TTL
+        ):
+            del _render_cache[key]
+            return None
+        _render_cache.move_to_end(key)
+        return rendered
+
+
+def _render_month(dt: datetime) -> Optional[_RenderedMonth]:
+    """Read the month's A:D once and render summary + all sections. Blocking."""
     service  = _build_service()
     tab_info = find_tab_for_month(service, dt)
     if not tab_info:
-        return (
-            _tab_not_found_message(service, dt),
-            _summary_keyboard(dt),
-        )
-
+        return None
     tab_name, _ = tab_info
+
+    # Taken before the read: a write landing mid-read leaves this stale copy
+    # with an old revision, so it is never served.
+    with _render_lock:
+        revision = _tab_revisions.get(tab_name, 0)
+
+    # One API call — read all of A:D
     result = service.spreadsheets().values().get(
         spreadsheetId=SPREADSHEET_ID,
-        range=f"'{tab_name}'!A1:D200",
+        range=f"'{tab_name}'!A1:D200"
     ).execute()
     rows = result.get("values", [])
 
-    emoji = _section_emoji(section_name)
-    lines = [f"{emoji} <b>{section_name} — {dt.strftime('%B %Y')}</b>\n"]
+    spend_cube.record(dt, tab_name, rows)
 
-    for cat in subcats:
-        idx = _find_row_index(rows, cat)
-        if idx is None:
-            continue
-        row = rows[idx]
-        budget = _parse_currency(row[1] if len(row) > 1 else "")
-        spent  = _parse_currency(row[2] if len(row) > 2 else "")
-        bal    = _parse_currency(row[3] if len(row) > 3 else "")
-        warning = " ⚠" if bal < 0 else ""
-        lines.append(f"  • <b>{cat}</b>{warning}   {_fmt_amount(spent)} / {_fmt_amount(budget)}")
+    rendered = _RenderedMonth(
+        tab_name=tab_name,
+        revision=revision,
+        rendered_at=time.monotonic(),
+        summary=_render_summary(dt, _parse_sections(rows)),
+        sections={name: _render_section(name, dt, rows) for name in BROAD_CATEGORIES},
+    )
+    _cache_put(dt, rendered)
+    return rendered
 
-    keyboard = InlineKeyboardMarkup([[
-        InlineKeyboardButton(
-            f"← Back to summary",
-            callback_data=f"summary|{dt.year}|{dt.month}",
-        ),
-    ]])
-    return "\n".join(lines), keyboard
+
+def _cache_put(dt: datetime, rendered: _RenderedMonth) -> None:
+    with _render_lock:
+        _render_cache[(dt.year, dt.month)] = rendered
+        _render_cache.move_to_end((dt.year, dt.month))
+        while len(_render_cache) > SUMMARY_CACHE_MONTHS:
+            _render_cache.popitem(last=False)
+
+
+def seed_rendered_month(
+    dt: datetime,
+    tab_name: str,
+    summary: tuple[str, InlineKeyboardMarkup],
+    sections: dict[str, tuple[str, InlineKeyboardMarkup]],
+) -> None:
+    """
+    Cache views rendered elsewhere — the precomputed monthly report — so the
+    button taps that follow are hits. The caller vouches they match the tab now.
+    """
+    with _render_lock:
+        revision = _tab_revisions.get(tab_name, 0)
+    _cache_put(dt, _RenderedMonth(
+        tab_name=tab_name,
+        revision=revision,
+        rendered_at=time.monotonic(),
+        summary=summary,
+        sections=sections,
+    ))
+
+
+def _month_task(dt: datetime) -> asyncio.Task:
+    """The in-flight render of dt's month, starting one if there is none."""
+    key = (dt.year, dt.month)
+    task = _render_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(asyncio.to_thread(_render_month, dt))
+        _render_inflight[key] = task
+
+        def _done(t: asyncio.Task) -> None:
+            _render_inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is not None:
+                logger.warning(f"Rendering summary for {dt:%B %Y} failed: {t.exception()}")
+
+        task.add_done_callback(_done)
+    return task
+
+
+def prefetch_adjacent_months(dt: datetime) -> None:
+    """
+    Render the previous and next month in the background (if not cached).
+    Months after the current one are skipped — their tab rarely exists yet.
+    """
+    now = datetime.now()
+    for month in (_prev_month(dt), _next_month(dt)):
+        if (month.year, month.month) > (now.year, now.month):
+            continue
+        if _cached_month(month) is None and (month.year, month.month) not in _render_inflight:
+            metrics.incr("summary_render", result="prefetch")
+            _month_task(month)
+
+
+async def _rendered_month(dt: datetime) -> Optional[_RenderedMonth]:
+    rendered = _cached_month(dt)
+    if rendered is not None:
+        metrics.incr("summary_render", result="hit")
+        return rendered
+    coalesced = (dt.year, dt.month) in _render_inflight
+    metrics.incr("summary_render", result="coalesced" if coalesced else "miss")
+    # shield: a caller hitting its deadline must not cancel a shared render.
+    return await asyncio.shield(_month_task(dt))
+
+
+async def render_summary(dt: datetime = None) -> tuple[str, InlineKeyboardMarkup]:
+    """Async summary(): cached, shared in-flight read, prefetches neighbours."""
+    dt = (dt or datetime.now()).replace(day=1)
+    rendered = await _rendered_month(dt)
+    prefetch_adjacent_months(dt)
+    if rendered is None:
+        text = await asyncio.to_thread(lambda: _tab_not_found_message(_build_service(), dt))
+        return text, _summary_keyboard(dt)
+    return rendered.summary
+
+
+async def render_section(section_name: str, dt: datetime = None) -> tuple[str, InlineKeyboardMarkup]:
+    """Async section_detail(), served from the same per-month render."""
+    dt = (dt or datetime.now()).replace(day=1)
+    if section_name not in BROAD_CATEGORIES:
+        return f"Section '{section_name}' not found.", _summary_keyboard(dt)
+    rendered = await _rendered_month(dt)
+    if rendered is None:
+        text = await asyncio.to_thread(lambda: _tab_not_found_message(_build_service(), dt))
+        return text, _summary_keyboard(dt)
+    return rendered.sections[section_name]
 
 
 # ---------------------------------------------------------------------------
@@ -384,7 +623,7 @@ def category(name: str, dt: datetime = None) -> str:
     canonical = _resolve_category_name(name)
     if not canonical:
         return (
-            f"Category '{name}' not found.\n"
+            f"Category '{name}' not found.{_did_you_mean(name)}\n"
             "Use /categories to see all available category names."
         )
 
@@ -428,6 +667,52 @@ def category(name: str, dt: datetime = None) -> str:
     return "\n".join(lines)
 
 
+def category_data(canonical: str, dt: datetime = None) -> Optional[dict]:
+    """
+    Structured version of category() for programmatic callers:
+        {"budget", "spent", "balance", "notes": [note line, ...]}
+    `canonical` must be an exact CATEGORY_MAP key. Returns None if the month
+    has no tab or the tab has no such row.
+
+    Reads labels, amounts and the column-C note in one spreadsheets.get
+    instead of category()'s separate row lookup, values read and note read.
+    """
+    if dt is None:
+        dt = datetime.now()
+
+    service  = _build_service()
+    tab_info = find_tab_for_month(service, dt)
+    if not tab_info:
+        return None
+    tab_name, _ = tab_info
+
+    resp = service.spreadsheets().get(
+        spreadsheetId=SPREADSHEET_ID,
+        ranges=[f"'{tab_name}'!A1:D200"],
+        fields="sheets(data(rowData(values(formattedValue,note))))",
+    ).execute()
+    row_data = (
+        resp.get("sheets", [{}])[0]
+        .get("data", [{}])[0]
+        .get("rowData", [])
+    )
+
+    for row in row_data:
+        cells  = row.get("values", [])
+        values = [c.get("formattedValue", "") for c in cells]
+        if not values or values[0].strip().lower() != canonical.lower():
+            continue
+        budget, spent, balance = _row_amounts(values)
+        note = (cells[2].get("note") or "") if len(cells) > 2 else ""
+        return {
+            "budget": budget,
+            "spent": spent,
+            "balance": balance,
+            "notes": [line.strip() for line in note.split("\n") if line.strip()],
+        }
+    return None
+
+
 # ---------------------------------------------------------------------------
 # /balance <name>
 # ---------------------------------------------------------------------------
@@ -438,7 +723,7 @@ def balance(name: str, dt: datetime = None) -> str:
 
     canonical = _resolve_category_name(name)
     if not canonical:
-        return f"Category '{name}' not found. Use /categories to see all categories."
+        return f"Category '{name}' not found.{_did_you_mean(name)} Use /categories to see all categories."
 
     service = _build_service()
     tab_info = find_tab_for_month(service, dt)
@@ -465,66 +750,203 @@ def balance(name: str, dt: datetime = None) -> str:
     )
 
 
+# ---------------------------------------------------------------------------
+# /search <words> [cat:<name>] [from:<MMYY>] [to:<MMYY>] [min:<n>] [max:<n>] [emoji]
+# ---------------------------------------------------------------------------
+
+# Rows shown per /search reply — keeps the message well under Telegram's limit.
+SEARCH_RESULT_LIMIT = 25
+
+SEARCH_USAGE = (
+    "Usage: /search &lt;words&gt; [cat:&lt;name&gt;] [from:MMYY] [to:MMYY] "
+    "[min:&lt;n&gt;] [max:&lt;n&gt;] [emoji]\n"
+    "e.g. <code>/search pizza from:0126</code>  "
+    "<code>/search cat:dining_out min:200</code>"
+)
+
+
+def search(args: list[str]) -> str:
+    """
+    Search every month's transaction notes via the local transaction index.
+    Plain words must all match (prefixes count); filters use key:value tokens.
+    Category names with spaces are written with underscores (cat:dining_out).
+    """
+    from handlers.monthly_report import _parse_month_arg
+    import transaction_index
+
+    words: list[str] = []
+    filters: dict = {}
+    for token in args:
+        key, sep, value = token.partition(":")
+        key = key.lower()
+        if token.lower() == "emoji":
+            filters["has_emoji"] = True
+        elif sep and key in ("cat", "category"):
+            canonical = _resolve_category_name(value.replace("_", " "))
+            if not canonical:
+                return f"Category '{html.escape(value)}' not found. Use /categories to see all categories."
+            filters["category"] = canonical
+        elif sep and key in ("from", "to"):
+            dt = _parse_month_arg(value)
+            if dt is None:
+                return f"Couldn't parse month '{html.escape(value)}'. Try MMYY, e.g. {key}:0326."
+            filters["start" if key == "from" else "end"] = dt
+        elif sep and key in ("min", "max"):
+            try:
+                filters[f"{key}_amount"] = float(value.replace("₪", "").replace(",", ""))
+            except ValueError:
+                return f"'{html.escape(token)}' is not a number."
+        else:
+            words.append(token)
+
+    if not words and not filters:
+        return SEARCH_USAGE
+
+    matches, total = transaction_index.search(
+        query=" ".join(words), limit=SEARCH_RESULT_LIMIT, **filters
+    )
+    if not matches:
+        return "🔍 No matching expenses found."
+
+    shown = f" (newest {len(matches)} shown)" if total > len(matches) else ""
+    lines = [f"🔍 <b>{total} match{'es' if total != 1 else ''}</b>{shown}\n"]
+    for t in matches:
+        date   = t.timestamp[:10] if t.timestamp else t.month.strftime("%Y-%m")
+        amount = f" ₪{t.amount:,g}" if t.amount is not None else ""
+        txn_id = f" <code>#{t.txn_id}</code>" if t.txn_id else ""
+        lines.append(
+            f"<code>{date}</code> {html.escape(t.category)}{amount} — {html.escape(t.text)}{txn_id}"
+        )
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------------
+# /export [from] [to] — every transaction in a month range as a CSV document
+# ---------------------------------------------------------------------------
+
+# CSV bytes kept in memory before the export spills to a temporary file.
+EXPORT_SPOOL_BYTES = 1024 * 1024
+
+EXPORT_USAGE = (
+    "Usage: /export [from] [to]  — months as MMYY, e.g. <code>/export 0126 1226</code>\n"
+    "Without arguments: January of this year to this month."
+)
+
+
+def export_csv(args: list[str]) -> tuple[Optional[IO[bytes]], str, str]:
+    """
+    Write every transaction in the month range to a CSV file.
+    Returns (file positioned at 0, filename, caption), or (None, "", error).
+
+    Tabs come from one metadata fetch; notes are read a chunk of tabs per
+    request (transaction_index.iter_month_transactions) and written out row by
+    row, so memory stays bounded however long the range is. Large exports
+    spill to disk past EXPORT_SPOOL_BYTES.
+    """
+    from handlers.monthly_report import _parse_month_arg
+    import transaction_index
+
+    if len(args) > 2:
+        return None, "", EXPORT_USAGE
+    now = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    months = []
+    for arg in args:
+        dt = _parse_month_arg(arg)
+        if dt is None:
+            return None, "", f"Couldn't parse month '{html.escape(arg)}'. Try MMYY, e.g. 0326."
+        months.append(dt)
+    start = months[0] if months else now.replace(month=1)
+    end   = months[1] if len(months) > 1 else now
+    if start > end:
+        start, end = end, start
+
+    service    = _build_service()
+    month_tabs = transaction_index.resolve_month_tabs(get_spreadsheet_tabs(service), start, end)
+    if not month_tabs:
+        return None, "", f"No month tabs found between {start:%B %Y} and {end:%B %Y}."
+
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    # utf-8-sig: the BOM makes Excel read Hebrew and emoji correctly
+    text = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="", write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(["date", "time", "category", "amount", "text", "id"])
+    rows = 0
+    for month, _title, txns in transaction_index.iter_month_transactions(service, month_tabs):
+        for t in txns:
+            writer.writerow([
+                t.timestamp[:10] if t.timestamp else month.strftime("%Y-%m"),
+                t.timestamp[11:],
+                t.category,
+                f"{t.amount:g}" if t.amount is not None else "",
+                t.text,
+                t.txn_id,
+            ])
+            rows += 1
+    text.detach()
+    spool.seek(0)
+
+    filename = f"expenses_{start:%Y-%m}_{end:%Y-%m}.csv"
+    caption  = f"{rows} transaction(s), {start:%B %Y} – {end:%B %Y} ({len(month_tabs)} tab(s))"
+    return spool, filename, caption
+
+
 # ---------------------------------------------------------------------------
 # Expense history — used by /delete
 #
-# expense_history.json holds a list of the last HISTORY_LIMIT expenses,
-# most recent first (index 0 = most recent).
+# history_store.py keeps each user's last HISTORY_LIMIT expenses, so /delete
+# only ever undoes the caller's own entries. Lists are most recent first
+# (index 0 = most recent).
 #
 # Each entry:
 #   {
+#     "id":            17,
 #     "category":      "Groceries",
 #     "amount":        50.0,
 #     "tab_name":      "0426",
 #     "row":           45,
 #     "timestamp":     "2026-04-01 15:04",
-#     "original_text": "super 50 milk"
+#     "original_text": "super 50 milk",
+#     "txn_id":        "3fa9c21e",
+#     "line":          4
 #   }
 # ---------------------------------------------------------------------------
 
-def load_history() -> list[dict]:
-    """Load the expense history list from disk. Returns [] if file doesn't exist."""
-    try:
-        with open(HISTORY_FILE, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-
-def save_history(history: list[dict]) -> None:
-    """Write the expense history list to disk."""
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=2)
+def load_history(user_id: int) -> list[dict]:
+    """The user's last HISTORY_LIMIT expenses, most recent first."""
+    return history_store.recent(user_id, HISTORY_LIMIT)
 
 
 def append_to_history(
+    user_id: int,
     category: str,
     amount: float,
     tab_name: str,
     row: int,
     timestamp: str,
     original_text: str,
+    txn_id: str = "",
+    line: int = -1,
 ) -> None:
     """
-    Add a new expense to the front of the history list and trim to HISTORY_LIMIT.
-    Called by handlers/message.py right after a successful log_expense().
+    Record a new expense in the user's history (older entries beyond
+    HISTORY_LIMIT are dropped). Called by handlers/message.py right after a
+    successful log_expense().
     """
-    history = load_history()
-    history.insert(0, {
+    history_store.append(user_id, {
         "category":      category,
         "amount":        amount,
         "tab_name":      tab_name,
         "row":           row,
         "timestamp":     timestamp,
         "original_text": original_text,
+        "txn_id":        txn_id,
+        "line":          line,
     })
-    history = history[:HISTORY_LIMIT]
-    save_history(history)
 
 
-def show_history() -> str:
-    """Return a numbered list of the last HISTORY_LIMIT expenses."""
-    history = load_history()
+def show_history(user_id: int) -> str:
+    """Return a numbered list of the user's last HISTORY_LIMIT expenses."""
+    history = load_history(user_id)
     if not history:
         return "No recent expenses on record."
 
@@ -532,19 +954,19 @@ def show_history() -> str:
     for i, entry in enumerate(history, start=1):
         lines.append(
             f"  {i}. [{entry['timestamp']}]  {entry['original_text']}  "
-            f"→ {entry['category']}"
+            f"→ {entry['category']}" + (f"  #{entry['txn_id']}" if entry["txn_id"] else "")
         )
     lines.append(f"\nUse /delete <n> to undo one of these.")
     return "\n".join(lines)
 
 
-def delete(n: int = 1) -> str:
+def delete(user_id: int, n: int = 1) -> str:
     """
-    Undo the last n expenses (n=1 means only the most recent, n=3 means the last 3).
+    Undo the user's last n expenses (n=1 means only the most recent, n=3 means the last 3).
     For each entry: subtracts the amount from the sheet and removes the note line.
     Prints a summary of everything that was deleted.
     """
-    history = load_history()
+    history = load_history(user_id)
 
     if not history:
         return "Nothing to delete — no recent expenses on record."
@@ -558,68 +980,126 @@ def delete(n: int = 1) -> str:
 
     service = _build_service()
 
-    # Cache sheet_ids so we don't fetch metadata more than once per tab
-    sheet_id_cache: dict[str, int] = {}
-    meta = service.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute()
-    for s in meta.get("sheets", []):
-        sheet_id_cache[s["properties"]["title"]] = s["properties"]["sheetId"]
-
-    lines = [f"✅ Deleted {len(to_delete)} expense(s):\n"]
+    # Entries on the same category cell are netted: one read, one write per
+    # (tab, row), and all of them in a single get + a single batchUpdate.
+    groups: dict[tuple[str, int], list[dict]] = {}
+    for entry in to_delete:
+        groups.setdefault((entry["tab_name"], entry["row"]), []).append(entry)
+
+    new_totals: dict[tuple[str, int], float] = {}
+    with _write_lock:
+        cells = _read_cells(service, list(groups))
+        updates = []
+        for key, entries in groups.items():
+            if key not in cells:
+                continue
+            current, note, sheet_id = cells[key]
+            note_lines = note.split("\n")
+            for entry in entries:
+                # Drop this entry's note line — by transaction ID; entries
+                # logged before IDs fall back to the newest line with their
+                # timestamp.
+                if entry["txn_id"]:
+                    idx = _find_note_line(note_lines, entry["txn_id"], entry["line"])
+                else:
+                    idx = next(
+                        (i for i in range(len(note_lines) - 1, -1, -1)
+                         if note_lines[i].startswith(entry["timestamp"])),
+                        None,
+                    )
+                if idx is not None:
+                    del note_lines[idx]
+            new_totals[key] = current - sum(entry["amount"] for entry in entries)
+            updates.append((sheet_id, key[1], new_totals[key], "\n".join(note_lines).strip()))
+        _write_cells(service, updates)
+    for tab_name in {tab_name for tab_name, _ in new_totals}:
+        notify_write(tab_name)
+
+    deleted = sum(len(groups[key]) for key in new_totals)
+    lines = [f"✅ Deleted {deleted} expense(s):\n"]
 
     for i, entry in enumerate(to_delete, start=1):
-        category_name = entry["category"]
-        amount        = entry["amount"]
-        tab_name      = entry["tab_name"]
-        row           = entry["row"]
-        timestamp     = entry["timestamp"]
-
-        sheet_id = sheet_id_cache.get(tab_name)
-        if sheet_id is None:
-            lines.append(f"  {i}. ⚠️ Could not find tab '{tab_name}' — skipped.")
+        key = (entry["tab_name"], entry["row"])
+        if key not in new_totals:
+            lines.append(f"  {i}. ⚠️ Could not find tab '{entry['tab_name']}' — skipped.")
             continue
-
-        # Subtract amount
-        current   = _read_current_amount(service, tab_name, row)
-        new_total = current - amount
-        _write_amount(service, tab_name, row, new_total)
-
-        # Remove matching note line
-        existing_note = _read_existing_note(service, tab_name, row)
-        updated_lines = [
-            line for line in existing_note.split("\n")
-            if not line.startswith(timestamp)
-        ]
-        _write_note(service, tab_name, row, sheet_id, "\n".join(updated_lines).strip())
-
         lines.append(
             f"  {i}. {entry['original_text']}  "
-            f"(₪{amount:g} from '{category_name}', new total ₪{new_total:g})"
+            f"(₪{entry['amount']:g} from '{entry['category']}', new total ₪{new_totals[key]:g})"
         )
 
-    # Remove deleted entries from history
-    history = history[len(to_delete):]
-    save_history(history)
+    # Remove deleted entries from history — by id, so expenses logged
+    # meanwhile are kept
+    history_store.remove(entry["id"] for entry in to_delete)
 
     return "\n".join(lines)
 
 
 # ---------------------------------------------------------------------------
-# Internal helpers
+# /edit <id> <amount>
 # ---------------------------------------------------------------------------
 
-def _parse_currency(value: str) -> float:
-    try:
-        return float(str(value).replace("₪", "").replace(",", "").strip() or 0)
-    except ValueError:
-        return 0.0
+EDIT_USAGE = (
+    "Usage: /edit &lt;id&gt; &lt;amount&gt;  e.g. <code>/edit 3fa9c21e 95</code>\n"
+    "IDs are shown by /search and /category."
+)
 
 
+def edit(txn_id: str, new_amount: float) -> str:
+    """
+    Change the amount of one logged expense, found by its transaction ID.
+    The category total moves by the difference and only that expense's note
+    line is rewritten. Recent expenses are located via the history store;
+    older ones via the transaction index.
+    """
+    import transaction_index
+
+    txn_id = txn_id.strip().lower().lstrip("#")
+    entry = history_store.find(txn_id)
+    if entry is not None:
+        tab_name, row, hint, category_name = entry["tab_name"], entry["row"], entry["line"], entry["category"]
+    else:
+        txn = transaction_index.locate(txn_id)
+        if txn is None:
+            return f"No expense with ID <code>{html.escape(txn_id)}</code>. Use /search to find its ID."
+        tab_name, row, hint, category_name = txn.tab, txn.row, txn.line, txn.category
+
+    service = _build_service()
+    with _write_lock:
+        cell = _read_cells(service, [(tab_name, row)]).get((tab_name, row))
+        if cell is None:
+            return f"⚠️ Could not find tab '{html.escape(tab_name)}'."
+        current, note, sheet_id = cell
+        note_lines = note.split("\n")
+        idx = _find_note_line(note_lines, txn_id, hint)
+        if idx is None:
+            return f"Expense <code>{txn_id}</code> is no longer in the sheet."
+        text, _, old_amount = split_txn_tag(note_lines[idx])
+        new_total = current + new_amount - old_amount
+        note_lines[idx] = text + _txn_tag(txn_id, new_amount)
+        _write_cells(service, [(sheet_id, row, new_total, "\n".join(note_lines).strip())])
+    notify_write(tab_name)
+
+    if entry is not None:
+        history_store.set_amount(entry["id"], new_amount)
+    return (
+        f"✏️ Changed <code>#{txn_id}</code> in '{html.escape(category_name)}' "
+        f"from ₪{old_amount:g} to ₪{new_amount:g}. New total: ₪{new_total:g}"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Internal helpers
+# ---------------------------------------------------------------------------
+
 def _resolve_category_name(name: str) -> Optional[str]:
-    name_lower = name.strip().lower()
-    for cat_name in CATEGORY_MAP:
-        if cat_name.lower() == name_lower:
-            return cat_name
-    return None
+    return category_index.canonical_name(name)
+
+
+def _did_you_mean(name: str) -> str:
+    """' Did you mean: A, B?' from the category index, or '' if nothing is close."""
+    suggestions = category_index.suggest(name, limit=3)
+    return f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
 
 
 # ---------------------------------------------------------------------------
@@ -644,15 +1124,19 @@ async def tg_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "Examples:\n"
         "<code>groceries 120</code>\n"
         "<code>fuel 50 shell station</code>\n"
-        "<code>250 train</code>\n\n"
+        "<code>250 train</code>\n"
+        "Or type <code>@&lt;bot name&gt; groc 120</code> and tap a suggested category.\n\n"
         "<b>Commands:</b>\n"
         "/summary — monthly budget overview\n"
         "/categories — list all categories &amp; keywords\n"
         "/category &lt;name&gt; — spending details for one category\n"
         "/balance &lt;name&gt; — remaining budget for one category\n"
         "/keywords &lt;name&gt; — what triggers a category\n"
+        "/search &lt;words&gt; — find past expenses across all months\n"
+        "/export [from] [to] — download expenses as a CSV file\n"
         "/delete — undo the last expense\n"
-        "/delete &lt;n&gt; — undo the last n expenses"
+        "/delete &lt;n&gt; — undo the last n expenses\n"
+        "/edit &lt;id&gt; &lt;amount&gt; — change one expense's amount"
     )
     keyboard = InlineKeyboardMarkup([
         [
@@ -691,7 +1175,7 @@ async def tg_summary(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     track_subscriber(update.effective_chat.id)
     # Send a "loading" message first, then edit it in-place with the real data.
     msg = await update.message.reply_text("Fetching summary...")
-    text, keyboard = summary()
+    text, keyboard = await render_summary()
     await msg.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
 
 
@@ -727,4 +1211,50 @@ async def tg_delete(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             parse_mode="HTML",
         )
         return
-    await update.message.reply_text(delete(n), parse_mode="HTML")
+    result = await asyncio.to_thread(delete, update.effective_user.id, n)
+    await update.message.reply_text(result, parse_mode="HTML")
+
+
+async def tg_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    track_subscriber(update.effective_chat.id)
+    try:
+        txn_id, raw_amount = context.args
+        amount = float(raw_amount.replace("₪", "").replace(",", ""))
+        if not math.isfinite(amount):   # float() accepts "nan" and "inf"
+            raise ValueError(raw_amount)
+    except ValueError:
+        await update.message.reply_text(EDIT_USAGE, parse_mode="HTML")
+        return
+    result = await asyncio.to_thread(edit, txn_id, amount)
+    await update.message.reply_text(result, parse_mode="HTML")
+
+
+async def tg_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    track_subscriber(update.effective_chat.id)
+    if not context.args:
+        await update.message.reply_text(SEARCH_USAGE, parse_mode="HTML")
+        return
+    msg = await update.message.reply_text("Searching...")
+    try:
+        text = await asyncio.to_thread(search, context.args)
+    except Exception:
+        logger.exception("/search failed")
+        text = "❌ Search failed — please try again."
+    await msg.edit_text(text, parse_mode="HTML")
+
+
+async def tg_export(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    track_subscriber(update.effective_chat.id)
+    msg = await update.message.reply_text("Exporting...")
+    try:
+        document, filename, caption = await asyncio.to_thread(export_csv, context.args or [])
+    except Exception:
+        logger.exception("/export failed")
+        await msg.edit_text("❌ Export failed — please try again.")
+        return
+    if document is None:
+        await msg.edit_text(caption, parse_mode="HTML")
+        return
+    with document:
+        await update.message.reply_document(document=document, filename=filename, caption=caption)
+    await msg.delete()
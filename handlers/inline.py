@@ -0,0 +1,72 @@
+"""
+handlers/inline.py — Inline-query autocomplete for categories and quick logging.
+
+Typing "@bot groc 120 shufersal" in the chat with the bot offers ranked
+categories ("Groceries ₪120", ...). Tapping one sends a message the parser
+matches exactly ("Groceries 120 shufersal"), so the expense is logged in one
+tap by the normal message handler. Without an amount, results send
+"/balance <category>" instead — a quick way to look a category up without
+remembering its exact name. So do categories that no keyword logs to (every
+term they list belongs to another category too), even with an amount.
+
+Answers come from parsing/category_index.py — memory only, no Sheets or LLM
+call — and the handling time is recorded as the inline_query_ms metric.
+"""
+
+import re
+import time
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import ContextTypes
+
+import metrics
+from parsing.category_index import log_keyword, suggest
+from parsing.parser import format_amount
+
+# Results offered per query.
+INLINE_RESULT_LIMIT = 8
+
+# Seconds Telegram may cache an answer — results depend only on the query text.
+INLINE_CACHE_SECONDS = 300
+
+_NUMBER_RE = re.compile(r"(-?\d+(?:\.\d+)?)")
+
+
+def _split_query(query: str) -> tuple[str, float | None, str]:
+    """(keyword phrase, amount, note) — same split as parser.parse()."""
+    match = _NUMBER_RE.search(query)
+    if not match:
+        return query.strip(), None, ""
+    amount = float(match.group(1))
+    if match.start() > 0:
+        return query[:match.start()].strip(), amount, query[match.end():].strip()
+    return query[match.end():].strip(), amount, ""   # "120 groc"
+
+
+def inline_results(query: str) -> list[InlineQueryResultArticle]:
+    phrase, amount, note = _split_query(query)
+    results = []
+    for i, category in enumerate(suggest(phrase, INLINE_RESULT_LIMIT)):
+        keyword = log_keyword(category)
+        if amount is None or keyword is None:
+            text        = f"/balance {category}"
+            title       = category
+            description = "Tap for the remaining budget — add an amount to log"
+        else:
+            text        = f"{keyword} {format_amount(amount)}" + (f" {note}" if note else "")
+            title       = f"{category} ₪{format_amount(amount)}"
+            description = f"Tap to log: {text}"
+        results.append(InlineQueryResultArticle(
+            id=str(i),
+            title=title,
+            description=description,
+            input_message_content=InputTextMessageContent(text),
+        ))
+    return results
+
+
+async def tg_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    started = time.perf_counter()
+    results = inline_results(update.inline_query.query)
+    metrics.observe("inline_query_ms", (time.perf_counter() - started) * 1000)
+    await update.inline_query.answer(results, cache_time=INLINE_CACHE_SECONDS)
@@ -0,0 +1,187 @@
+"""
+handlers/llm_gateway.py — Shared gateway for every OpenAI call.
+
+call(fn, timeout=...)   run `await fn(client)` under the gateway's protections
+is_available()          False while the circuit breaker is open
+LLMUnavailable          raised instead of letting callers hang on a bad endpoint
+
+Protections
+-----------
+1. Bounded semaphore — at most LLM_MAX_CONCURRENCY calls in flight, shared by
+   ask_ai and explain_sheet_missing across all users.
+2. Per-call deadline — one asyncio.wait_for covers both the wait for a
+   semaphore slot and the call itself (including consuming a stream).
+3. Circuit breaker — after CIRCUIT_FAILURE_THRESHOLD consecutive endpoint
+   failures (timeouts, connection errors, 5xx, 429) the circuit opens for
+   CIRCUIT_OPEN_SECONDS and every call fails fast with LLMUnavailable. Then a
+   single probe call is let through: success closes the circuit, failure
+   re-opens it. Client errors such as 400 don't count — they say nothing
+   about the endpoint's health.
+
+Callers treat LLMUnavailable as "degraded mode": message.py falls back to the
+parser's fuzzy suggestion, explain_sheet_missing to its deterministic template.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, TypeVar
+
+import openai
+from openai import AsyncOpenAI
+
+from config import OPENAI_API_KEY, OPENAI_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Concurrent OpenAI calls allowed across the whole bot.
+LLM_MAX_CONCURRENCY = 4
+
+# Default deadline for one call, semaphore wait included (seconds).
+LLM_CALL_TIMEOUT = 30.0
+
+# Consecutive endpoint failures that open the circuit.
+CIRCUIT_FAILURE_THRESHOLD = 3
+
+# How long the circuit stays open before a probe call is allowed (seconds).
+CIRCUIT_OPEN_SECONDS = 60.0
+
+# Exceptions that indicate the endpoint itself is unhealthy.
+_ENDPOINT_FAILURES = (
+    asyncio.TimeoutError,
+    openai.APIConnectionError,   # includes APITimeoutError
+    openai.InternalServerError,
+    openai.RateLimitError,
+)
+
+T = TypeVar("T")
+
+
+class LLMUnavailable(Exception):
+    """The LLM endpoint is failing or the circuit is open — use a fallback."""
+
+
+_client: AsyncOpenAI | None = None
+_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+_consecutive_failures = 0
+_opened_at: float | None = None
+_probe_in_flight = False
+
+
+def _get_client() -> AsyncOpenAI:
+    """Return the shared AsyncOpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        if not OPENAI_API_KEY:
+            raise RuntimeError(
+                "OPENAI_API_KEY is not set. Add it to your environment variables."
+            )
+        # The gateway owns deadlines; keep the client's own retry loop short
+        # so it can't silently outlive them.
+        _client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            timeout=LLM_CALL_TIMEOUT,
+            max_retries=1,
+        )
+    return _client
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------------
+
+def is_available() -> bool:
+    """True unless the circuit is open and still cooling down."""
+    if _opened_at is None:
+        return True
+    return time.monotonic() - _opened_at >= CIRCUIT_OPEN_SECONDS and not _probe_in_flight
+
+
+def _admit() -> bool:
+    """
+    Decide whether a call may proceed. Returns True if this call is the
+    half-open probe. Raises LLMUnavailable while the circuit is open.
+    """
+    global _probe_in_flight
+    if _opened_at is None:
+        return False
+    if not is_available():
+        raise LLMUnavailable("circuit open")
+    _probe_in_flight = True
+    logger.info("LLM circuit half-open — sending probe call")
+    return True
+
+
+def _release_probe() -> None:
+    """The probe ended without telling us anything (e.g. a 400) — allow another."""
+    global _probe_in_flight
+    _probe_in_flight = False
+
+
+def _record_success(is_probe: bool) -> None:
+    global _consecutive_failures, _opened_at, _probe_in_flight
+    if is_probe or _opened_at is not None:
+        logger.info("LLM circuit closed — endpoint recovered")
+    _consecutive_failures = 0
+    _opened_at = None
+    if is_probe:
+        _probe_in_flight = False
+
+
+def _record_failure(is_probe: bool, exc: BaseException) -> None:
+    global _consecutive_failures, _opened_at, _probe_in_flight
+    _consecutive_failures += 1
+    if is_probe:
+        _probe_in_flight = False
+    if is_probe or _consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+        if is_probe or _opened_at is None:
+            logger.warning(
+                f"LLM circuit OPEN for {CIRCUIT_OPEN_SECONDS:.0f}s after "
+                f"{_consecutive_failures} consecutive failure(s) (last: {exc!r})"
+            )
+        _opened_at = time.monotonic()
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+async def call(
+    fn: Callable[[AsyncOpenAI], Awaitable[T]],
+    *,
+    timeout: float = LLM_CALL_TIMEOUT,
+) -> T:
+    """
+    Run `await fn(client)` with the concurrency cap, deadline and breaker.
+
+    Raises LLMUnavailable on an open circuit, a missed deadline or an
+    endpoint failure. Any other exception (e.g. a 400) propagates unchanged.
+    """
+    is_probe = _admit()
+
+    async def _guarded() -> T:
+        async with _semaphore:
+            return await fn(_get_client())
+
+    try:
+        result = await asyncio.wait_for(_guarded(), timeout)
+    except asyncio.TimeoutError as exc:
+        # A caller that passed a shortened timeout (its update deadline is
+        # nearly spent) timing out says nothing about the endpoint.
+        if timeout >= LLM_CALL_TIMEOUT:
+            _record_failure(is_probe, exc)
+        elif is_probe:
+            _release_probe()
+        raise LLMUnavailable(f"timed out after {timeout:.1f}s") from exc
+    except _ENDPOINT_FAILURES as exc:
+        _record_failure(is_probe, exc)
+        raise LLMUnavailable(f"{type(exc).__name__}: {exc}") from exc
+    except BaseException:
+        if is_probe:
+            _release_probe()
+        raise
+
+    _record_success(is_probe)
+    return result
@@ -11,46 +11,56 @@ Flow
 3.  Otherwise → hand off to the AI handler (ask_ai), which either:
       a. calls log_expense via tool-use  →  log the expense
       b. returns a short text reply       →  send it as-is
+4.  If the LLM gateway is degraded, fall back to the parser's fuzzy
+    suggestion with Yes/No buttons (or ask for the missing amount).
 
 Conversation history
 --------------------
-Per-user history is stored in context.user_data["ai_history"] as a plain list
-of {"role": "user"|"assistant", "content": str} dicts (OpenAI message format).
-The list is hard-capped at AI_HISTORY_MAX_STORED entries so it cannot grow
-without bound, and each individual entry is truncated at MAX_CONTENT_CHARS to
-prevent one verbose turn from ballooning memory.
+Per-user history lives in context.user_data and is managed by
+handlers/ai_history.py: recent turns are kept verbatim within a token budget
+and older turns are folded into a short rolling summary, so neither memory
+nor prompt size grows with how chatty a user is.
+
+Streaming replies
+-----------------
+When AI_STREAMING is on, ask_ai streams its text into a _StreamingReply, which
+sends one message on the first token and then edits it in place at most once
+every STREAM_EDIT_INTERVAL seconds. The final edit applies HTML formatting.
 """
 
 import asyncio
 import logging
+import re
+import time
 from datetime import datetime
 
-from telegram import Update
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
+import dedup
+from config import AI_STREAMING
+from deadline import Deadline, DeadlineExceeded, UPDATE_DEADLINE_SECONDS
 from parsing.parser import parse, ParseResult
 from sheets import log_expense
-from handlers.commands import append_to_history, delete as delete_expenses, summary as get_summary
+from handlers.commands import append_to_history, delete as delete_expenses, render_summary
+from handlers import ai_history
 from handlers.subscribers import track_subscriber
 from handlers.ai_handler import ask_ai, explain_sheet_missing
 
 logger = logging.getLogger(__name__)
 
-# Keep at most this many entries in ai_history (each "user" + each "assistant"
-# counts as one). 24 = 12 full exchanges — larger than AI_HISTORY_LIMIT (12) so
-# trimming is cheap and there's always enough context for the AI to read.
-AI_HISTORY_MAX_STORED = 24
+# Minimum seconds between progressive edits of a streamed reply. Telegram
+# rate-limits message edits to roughly one per second per chat; going faster
+# earns a RetryAfter and a frozen message.
+STREAM_EDIT_INTERVAL = 1.0
 
-# Truncate any single history entry to this many characters. Long tool outputs
-# (e.g. summary text) occasionally leak into assistant messages; cap them so
-# one entry cannot balloon memory on its own.
-MAX_CONTENT_CHARS = 1000
 
-
-def process_expense(text: str) -> tuple[str, ParseResult]:
+def process_expense(text: str, user_id: int = 0) -> tuple[str, ParseResult]:
     """
     Parse and (if matched) log a free-text expense message.
     Used by main.py CLI test runner — no AI involved here.
+    History entries go under user_id (0 for the CLI).
 
     Returns:
         (reply, result) where reply is the string to send the user
@@ -66,12 +76,15 @@ def process_expense(text: str) -> tuple[str, ParseResult]:
         )
         if log_result.success:
             append_to_history(
+                user_id=user_id,
                 category=log_result.category,
                 amount=log_result.amount_added,
                 tab_name=log_result.tab_name,
                 row=log_result.row,
                 timestamp=log_result.timestamp,
                 original_text=result.original_text,
+                txn_id=log_result.txn_id,
+                line=log_result.line,
             )
             return log_result.message, result
         else:
@@ -108,28 +121,136 @@ def process_expense(text: str) -> tuple[str, ParseResult]:
 # ---------------------------------------------------------------------------
 
 def _add_to_ai_history(context: ContextTypes.DEFAULT_TYPE, role: str, content: str) -> None:
+    """Append a message to the per-user AI history (token-budgeted, see ai_history)."""
+    ai_history.add_turn(context.user_data, role, content)
+
+
+def _get_ai_history(context: ContextTypes.DEFAULT_TYPE) -> list[dict]:
+    return ai_history.build_history(context.user_data)
+
+
+class _StreamingReply:
     """
-    Append a message to the per-user AI conversation history.
+    One Telegram message that grows as ask_ai streams text into it.
 
-    Bounded in two ways to prevent the memory leak that previously pushed the
-    bot past Render's 512 MB limit:
-      1. Each entry's content is truncated at MAX_CONTENT_CHARS.
-      2. The total list length is capped at AI_HISTORY_MAX_STORED — oldest
-         entries are dropped when the cap is exceeded.
+    Intermediate edits are sent as plain text — a half-streamed reply can end
+    in the middle of an HTML tag — and only finish() applies parse_mode="HTML".
     """
-    if len(content) > MAX_CONTENT_CHARS:
-        content = content[:MAX_CONTENT_CHARS] + "..."
 
-    history: list = context.user_data.setdefault("ai_history", [])
-    history.append({"role": role, "content": content})
+    def __init__(self, update: Update):
+        self._update = update
+        self._last_edit = 0.0
+        self._last_text = ""
+        self.message = None
+
+    async def push(self, text: str) -> None:
+        """Show text_so_far, throttled to one edit per STREAM_EDIT_INTERVAL."""
+        text = text.strip()
+        if not text or text == self._last_text:
+            return
+        now = time.monotonic()
+        try:
+            if self.message is None:
+                self.message = await self._update.message.reply_text(text)
+            elif now - self._last_edit >= STREAM_EDIT_INTERVAL:
+                await self.message.edit_text(text)
+            else:
+                return
+        except TelegramError as exc:
+            # Dropping an intermediate frame is harmless — finish() catches up.
+            logger.debug(f"Streaming edit skipped: {exc}")
+            return
+        self._last_edit = now
+        self._last_text = text
+
+    async def finish(self, text: str) -> bool:
+        """
+        Replace the streamed message with the final HTML text.
+        Returns False if nothing was streamed, so the caller sends a normal reply.
+        """
+        if self.message is None:
+            return False
+        try:
+            await self.message.edit_text(text, parse_mode="HTML")
+        except TelegramError as exc:
+            # Usually "message is not modified" or HTML the model got wrong —
+            # either way the plain streamed text is already on screen.
+            logger.debug(f"Final streaming edit failed: {exc}")
+            if text.strip() != self._last_text:
+                await self.message.edit_text(text)
+        return True
+
+    async def discard(self) -> None:
+        """Remove any streamed text when the turn ended in a non-reply action."""
+        if self.message is None:
+            return
+        try:
+            await self.message.delete()
+        except TelegramError as exc:
+            logger.debug(f"Could not delete streamed message: {exc}")
+        self.message = None
+
+
+def _parse_bare_amount(text: str) -> float | None:
+    """Return the amount if text is just a number (optionally with ₪), else None."""
+    match = re.fullmatch(r"₪?\s*(-?\d+(?:\.\d+)?)\s*₪?", text.strip())
+    return float(match.group(1)) if match else None
+
+
+async def _reply_degraded(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    result: ParseResult,
+) -> None:
+    """
+    The AI is unavailable (see llm_gateway). Instead of a dead-end apology,
+    offer the parser's fuzzy suggestion with confirm buttons — handled by
+    callbacks.py exactly like a normal fuzzy confirmation.
+    """
+    if result.status == "fuzzy_confirm":
+        context.user_data["pending"] = {
+            "type": "fuzzy_confirm",
+            "suggestion": result.suggestion,
+            "amount": result.amount,
+            "original_text": result.original_text,
+        }
+        amount_note = f" (₪{result.amount:g})" if result.amount is not None else ""
+        keyboard = InlineKeyboardMarkup([[
+            InlineKeyboardButton("✅ Yes", callback_data="fuzzy_yes"),
+            InlineKeyboardButton("❌ No",  callback_data="fuzzy_no"),
+        ]])
+        await update.message.reply_text(
+            f"Did you mean <b>{result.suggestion}</b>{amount_note}?",
+            parse_mode="HTML",
+            reply_markup=keyboard,
+        )
+    elif result.status == "ask_amount":
+        context.user_data["pending"] = {
+            "type": "ask_amount",
+            "category": result.category,
+            "original_text": result.original_text,
+        }
+        await update.message.reply_text(
+            f"<b>{result.category}</b> — how much was it? Just reply with the amount.",
+            parse_mode="HTML",
+        )
+    else:
+        await update.message.reply_text(
+            "The assistant is unavailable right now. You can still log expenses "
+            "as <code>keyword amount</code>, e.g. <code>groceries 120</code>.",
+            parse_mode="HTML",
+        )
 
-    overflow = len(history) - AI_HISTORY_MAX_STORED
-    if overflow > 0:
-        del history[:overflow]
 
+async def _sheets_write(deadline: Deadline, fn, *args, **kwargs):
+    """
+    Run a Sheets write (log_expense / delete) off the event loop.
 
-def _get_ai_history(context: ContextTypes.DEFAULT_TYPE) -> list[dict]:
-    return context.user_data.get("ai_history", [])
+    Never cancelled once started — the write may already have reached the
+    server — so it is only measured against the update's deadline.
+    """
+    with deadline.track("sheets_write"):
+        return await asyncio.to_thread(fn, *args, **kwargs)
 
 
 async def _handle_log_failure(
@@ -137,6 +258,7 @@ async def _handle_log_failure(
     context: ContextTypes.DEFAULT_TYPE,
     log_result,
     user_text: str,
+    deadline: Deadline,
 ) -> None:
     """
     Send a helpful error when log_expense() fails.
@@ -147,7 +269,7 @@ async def _handle_log_failure(
     the raw LogResult.message.
     """
     if log_result.failure is not None:
-        explanation = await explain_sheet_missing(user_text, log_result.failure)
+        explanation = await explain_sheet_missing(user_text, log_result.failure, deadline)
     else:
         explanation = f"❌ {log_result.message}"
     _add_to_ai_history(context, "assistant", explanation)
@@ -170,29 +292,57 @@ async def tg_handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
         If AI picks a category + amount → log it.
         If AI replies with text → send it (e.g. asking for the amount).
     """
+    # Telegram redelivers updates after a restart or a failed getUpdates —
+    # never log the same message twice.
+    if dedup.is_duplicate(f"update:{update.update_id}"):
+        return
+
+    deadline = Deadline(UPDATE_DEADLINE_SECONDS, name="message")
     track_subscriber(update.effective_chat.id)
     context.user_data["last_seen"] = datetime.now().timestamp()
     text = update.message.text.strip()
+    user_id = update.effective_user.id
 
     result = parse(text)
 
+    # ------------------------------------------------------------------
+    # Pending amount — we asked "How much was it?" for a known category
+    # (fuzzy_yes without an amount, or degraded mode). A bare number
+    # completes that expense; anything else just drops the question.
+    # ------------------------------------------------------------------
+    pending = context.user_data.get("pending")
+    if pending and pending.get("type") == "ask_amount":
+        context.user_data.pop("pending", None)
+        amount = _parse_bare_amount(text)
+        if amount is not None:
+            result = ParseResult(
+                status="matched",
+                original_text=f"{pending['original_text']} {text}",
+                category=pending["category"],
+                amount=amount,
+            )
+
     # ------------------------------------------------------------------
     # Fast path — rule-based parser is confident
     # ------------------------------------------------------------------
     if result.status in ("matched", "reversed"):
-        log_result = log_expense(
+        log_result = await _sheets_write(
+            deadline, log_expense,
             category=result.category,
             amount=result.amount,
             original_text=result.original_text,
         )
         if log_result.success:
             append_to_history(
+                user_id=user_id,
                 category=log_result.category,
                 amount=log_result.amount_added,
                 tab_name=log_result.tab_name,
                 row=log_result.row,
                 timestamp=log_result.timestamp,
                 original_text=result.original_text,
+                txn_id=log_result.txn_id,
+                line=log_result.line,
             )
             # Keep AI history in sync so follow-up messages have context
             _add_to_ai_history(context, "user", text)
@@ -200,41 +350,60 @@ async def tg_handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text(f"<b>{log_result.message}</b>", parse_mode="HTML")
         else:
             _add_to_ai_history(context, "user", text)
-            await _handle_log_failure(update, context, log_result, text)
+            await _handle_log_failure(update, context, log_result, text, deadline)
         return
 
     # ------------------------------------------------------------------
     # AI path — parser is uncertain or has no match
     # ------------------------------------------------------------------
     history = _get_ai_history(context)
-    ai_result = await ask_ai(text, history)
+    streamer = _StreamingReply(update) if AI_STREAMING else None
+    ai_result = await ask_ai(
+        text, history,
+        on_text=streamer.push if streamer else None,
+        user_id=user_id,
+        deadline=deadline,
+    )
 
     action = ai_result["action"]
+    if streamer is not None and action != "reply":
+        await streamer.discard()
+
+    # ------------------------------------------------------------------
+    # LLM gateway degraded — fall back to the parser's best guess
+    # ------------------------------------------------------------------
+    if action == "unavailable":
+        _add_to_ai_history(context, "user", text)
+        await _reply_degraded(update, context, result)
 
     # ------------------------------------------------------------------
     # Single expense log
     # ------------------------------------------------------------------
-    if action == "log":
-        log_result = log_expense(
+    elif action == "log":
+        log_result = await _sheets_write(
+            deadline, log_expense,
             category=ai_result["category"],
             amount=ai_result["amount"],
             original_text=text,
         )
         if log_result.success:
             append_to_history(
+                user_id=user_id,
                 category=log_result.category,
                 amount=log_result.amount_added,
                 tab_name=log_result.tab_name,
                 row=log_result.row,
                 timestamp=log_result.timestamp,
                 original_text=text,
+                txn_id=log_result.txn_id,
+                line=log_result.line,
             )
             _add_to_ai_history(context, "user", text)
             _add_to_ai_history(context, "assistant", log_result.message)
             await update.message.reply_text(f"<b>{log_result.message}</b>", parse_mode="HTML")
         else:
             _add_to_ai_history(context, "user", text)
-            await _handle_log_failure(update, context, log_result, text)
+            await _handle_log_failure(update, context, log_result, text, deadline)
 
     # ------------------------------------------------------------------
     # Multiple expenses in one message
@@ -243,19 +412,23 @@ async def tg_handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
         lines = ["✅ Logged:"]
         sheet_failure_result = None
         for exp in ai_result["expenses"]:
-            log_result = log_expense(
+            log_result = await _sheets_write(
+                deadline, log_expense,
                 category=exp["category"],
                 amount=exp["amount"],
                 original_text=text,
             )
             if log_result.success:
                 append_to_history(
+                    user_id=user_id,
                     category=log_result.category,
                     amount=log_result.amount_added,
                     tab_name=log_result.tab_name,
                     row=log_result.row,
                     timestamp=log_result.timestamp,
                     original_text=text,
+                    txn_id=log_result.txn_id,
+                    line=log_result.line,
                 )
                 lines.append(f"  • ₪{exp['amount']:g} → {exp['category']}")
             elif log_result.failure is not None:
@@ -275,7 +448,7 @@ async def tg_handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 partial = "\n".join(lines)
                 _add_to_ai_history(context, "assistant", partial)
                 await update.message.reply_text(f"<b>{partial}</b>", parse_mode="HTML")
-            await _handle_log_failure(update, context, sheet_failure_result, text)
+            await _handle_log_failure(update, context, sheet_failure_result, text, deadline)
         else:
             reply_text = "\n".join(lines)
             _add_to_ai_history(context, "assistant", reply_text)
@@ -286,7 +459,7 @@ async def tg_handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # ------------------------------------------------------------------
     elif action == "delete":
         n = ai_result.get("n", 1)
-        reply_text = delete_expenses(n)
+        reply_text = await _sheets_write(deadline, delete_expenses, user_id, n)
         _add_to_ai_history(context, "user", text)
         _add_to_ai_history(context, "assistant", reply_text)
         await update.message.reply_text(reply_text, parse_mode="HTML")
@@ -308,17 +481,21 @@ async def tg_handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
             year  = show_summary_info["year"]
             dt    = datetime(year, month, 1)
             msg   = await update.message.reply_text("Fetching summary...")
-            summary_text, keyboard = await asyncio.to_thread(get_summary, dt)
-            await msg.edit_text(summary_text, parse_mode="HTML", reply_markup=keyboard)
-            _add_to_ai_history(
-                context, "assistant",
-                f"[Showed summary for {dt.strftime('%B %Y')}]",
-            )
+            try:
+                summary_text, keyboard = await deadline.run("sheets_read", render_summary(dt))
+            except DeadlineExceeded:
+                await msg.edit_text("The summary is taking too long — try /summary again.")
+            else:
+                await msg.edit_text(summary_text, parse_mode="HTML", reply_markup=keyboard)
 
-        # Send the AI's text response only if it has something to say
+        # Send the AI's text response only if it has something to say.
+        # In streaming mode it is already on screen — just apply the final edit.
         if reply_text:
             _add_to_ai_history(context, "assistant", reply_text)
-            await update.message.reply_text(reply_text, parse_mode="HTML")
+            if streamer is None or not await streamer.finish(reply_text):
+                await update.message.reply_text(reply_text, parse_mode="HTML")
+        elif streamer is not None:
+            await streamer.discard()
 
         # If neither the summary nor text was produced (shouldn't happen), log it
         if not show_summary_info and not reply_text:
@@ -1,50 +1,77 @@
 """
 handlers/monthly_report.py — Automated monthly summary + anomaly report.
 
-Runs on the 1st of each month at 09:00 Israel time.
-Covers the previous calendar month.
+Runs on the 1st of each month at 09:00 Israel time, from an artifact
+precomputed at 08:45. Covers the previous calendar month.
 
 Public API:
-    send_monthly_report(context)  — job callback registered in bot.py
-    format_monthly_report(dt)     — build (html_text, keyboard) for any month
+    prepare_monthly_report(context) — job callback: precompute the report
+    send_monthly_report(context)    — job callback registered in bot.py
+    format_monthly_report(dt)       — build (html_text, keyboard) for any month
+    report_artifact(dt)             — the precomputed report + views for a month
 """
 
+import asyncio
 import json
 import logging
-import math
+import os
+import threading
+import time
+import warnings
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 
+import numpy as np
+from telegram import InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from config import SUBSCRIBERS_FILE, SPREADSHEET_ID
+import metrics
+import spend_cube
+from config import REPORT_ARTIFACT_FILE, SUBSCRIBERS_FILE
 from handlers.commands import (
-    _find_row_index,
     _fmt_amount,
-    _parse_currency,
+    _render_month,
     _section_emoji,
     _summary_keyboard,
+    seed_rendered_month,
 )
 from parsing.category_map import BROAD_CATEGORIES
-from sheets import _build_service, find_tab_for_month, find_tab_in_tabs, get_spreadsheet_tabs
+from spend_cube import CubeSlice
 
 logger = logging.getLogger(__name__)
 
 # Maximum number of anomaly bullets shown in the report.
 MAX_ANOMALIES = 5
 
-# Tier 2: only flag if spending is this many times above the rolling average.
+# Tier 2: only flag if spending is this many times above the expected amount.
 ANOMALY_MULTIPLIER = 1.5
 
-# Tier 2: skip historical comparison for categories whose coefficient of
-# variation exceeds this threshold (too noisy to be meaningful).
+# Tier 2: ...and at least this many robust standard deviations above it
+# (3.5 is the usual cut-off for modified z-scores).
+ROBUST_Z_THRESHOLD = 3.5
+
+# Tier 2: skip categories whose robust coefficient of variation (scaled MAD /
+# median) exceeds this threshold (too noisy to be meaningful).
 HIGH_VARIANCE_COV = 1.0
 
+# Tier 2: with this many past values for the same calendar month, the
+# expected amount is their median (seasonal) instead of the overall median.
+SEASONAL_MIN_YEARS = 2
+
+# Scales a median absolute deviation to a standard deviation for normal data.
+MAD_TO_STD = 1.4826
+
+# The deviation used for z-scores is at least this share of the expected
+# amount — a category that cost exactly the same every month has MAD 0.
+MIN_SCALE_SHARE = 0.1
+
 # Minimum months of history required before Tier 2 runs.
 MIN_HISTORY_MONTHS = 3
 
-# How far back to look for historical data (months).
-MAX_HISTORY_MONTHS = 12
+# How far back to look for historical data (months). Closed months come from
+# the spend cube's local store, so a longer window costs no extra API calls.
+MAX_HISTORY_MONTHS = 36
 
 
 # ---------------------------------------------------------------------------
@@ -69,135 +96,135 @@ def _shift_months_back(dt: datetime, n: int) -> datetime:
 
 
 # ---------------------------------------------------------------------------
-# Historical data
+# Anomaly detection
+#
+# Runs over every cube row — section totals and each CATEGORY_MAP category —
+# as whole-array operations, so the cost barely depends on how many
+# categories or months there are (see bench/bench_anomalies.py).
+#
+#   Tier 1  over budget: spent > budget
+#   Tier 2  unusual vs history: the expected amount is the median of past
+#           months (or of past same-calendar-months, once there are
+#           SEASONAL_MIN_YEARS of them), the spread is the scaled MAD; flag
+#           when spent is ANOMALY_MULTIPLIER × expected and ROBUST_Z_THRESHOLD
+#           deviations above it
+#   New     spending where every past month was ₪0 and nothing is budgeted
+#
+# Every flag is ranked by its excess in ₪ (spent minus budget / expected /
+# 0), ties by sheet order. A section total is left out when one of its own
+# categories is flagged — the category says more.
 # ---------------------------------------------------------------------------
 
-def _extract_section_spent(rows: list, section_name: str, subcats: list[str]) -> Optional[float]:
-    """
-    Extract the total-row spent value for one broad section from pre-loaded rows.
-    Returns None if the section header or total row is not found.
-    """
-    header_idx = _find_row_index(rows, section_name)
-    if header_idx is None:
-        return None
-    total_idx = header_idx + len(subcats) + 1
-    if total_idx >= len(rows):
-        return None
-    total_row = rows[total_idx]
-    return _parse_currency(total_row[2] if len(total_row) > 2 else "")
-
-
-def _build_history_tab_data(
-    service,
-    prev_month_dt: datetime,
-    existing_tabs: dict,
-    months_back: int = MAX_HISTORY_MONTHS,
-) -> list[tuple]:
-    """
-    Fetch A1:D200 for each available historical month tab (oldest → newest).
-    Uses the already-fetched `existing_tabs` dict — no additional metadata call.
-    Makes ONE data read per found tab (max `months_back` reads).
-    Returns a list of (rows, dt) pairs for each month that had a tab.
-    """
-    result = []
-    for i in range(months_back, 0, -1):   # oldest first
-        dt       = _shift_months_back(prev_month_dt, i)
-        tab_info = find_tab_in_tabs(existing_tabs, dt)
-        if not tab_info:
-            continue
-        tab_name, _ = tab_info
-        try:
-            resp = service.spreadsheets().values().get(
-                spreadsheetId=SPREADSHEET_ID,
-                range=f"'{tab_name}'!A1:D200",
-            ).execute()
-            result.append((resp.get("values", []), dt))
-        except Exception as exc:
-            logger.debug(f"Skipping tab {tab_name}: {exc}")
-    return result
-
-
-def get_historical_spending(
-    section_name: str,
-    subcats: list[str],
-    history_tab_data: list[tuple],   # list of (rows, dt) from _build_history_tab_data
-) -> list[float]:
-    """
-    Extract spent amounts for `section_name` from pre-fetched historical tab data.
-    Returns a list ordered oldest → newest (missing months omitted).
-    """
-    results = []
-    for rows, _ in history_tab_data:
-        spent = _extract_section_spent(rows, section_name, subcats)
-        if spent is not None:
-            results.append(spent)
-    return results
+_OVER_BUDGET, _UNUSUAL, _NEW = 0, 1, 2
+
+# Row → row of the section it belongs to (-1 for sections and unsectioned rows)
+_SECTION_OF = np.full(len(spend_cube.ROWS), -1)
+for _section, _subcats in BROAD_CATEGORIES.items():
+    for _cat in _subcats:
+        _SECTION_OF[spend_cube.ROW_INDEX[_cat]] = spend_cube.ROW_INDEX[_section]
+
+
+def _score_anomalies(
+    current: np.ndarray,        # (rows, 3) reported month
+    history: np.ndarray,        # (months, rows, 3) the months before it, NaN = missing
+    month_of_year: np.ndarray,  # (months,) 1–12 for each history month
+    month: int,                 # the reported month's 1–12
+    section_of: np.ndarray,     # (rows,) see _SECTION_OF
+) -> dict[str, np.ndarray]:
+    """Per-row kind (-1 = not flagged), excess, expected amount and the history behind it."""
+    spent  = current[:, spend_cube.SPENT]
+    budget = current[:, spend_cube.BUDGET]
+    past   = history[:, :, spend_cube.SPENT]
+    same   = past[month_of_year == month]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # all-NaN rows → NaN
+        n_past   = (~np.isnan(past)).sum(axis=0)
+        n_same   = (~np.isnan(same)).sum(axis=0)
+        median   = np.nanmedian(past, axis=0) if len(past) else np.full(len(spent), np.nan)
+        spread   = MAD_TO_STD * np.nanmedian(np.abs(past - median), axis=0) if len(past) else median
+        seasonal = np.nanmedian(same, axis=0) if len(same) else np.full(len(spent), np.nan)
+        highest  = np.nanmax(past, axis=0) if len(past) else np.full(len(spent), np.nan)
+
+    use_seasonal = n_same >= SEASONAL_MIN_YEARS
+    expected = np.where(use_seasonal, seasonal, median)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (spent - expected) / np.maximum(spread, MIN_SCALE_SHARE * expected)
+        noisy = spread / median >= HIGH_VARIANCE_COV
+
+    enough   = n_past >= MIN_HISTORY_MONTHS
+    over     = (budget > 0) & (spent > budget)
+    unusual  = (enough & (expected > 0) & ~noisy
+                & (spent > expected * ANOMALY_MULTIPLIER) & (z >= ROBUST_Z_THRESHOLD))
+    new      = enough & (highest == 0) & (spent > 0) & (budget == 0)
+
+    # Over budget wins when several apply
+    kind   = np.select([over, unusual, new], [_OVER_BUDGET, _UNUSUAL, _NEW], default=-1)
+    excess = np.select([over, unusual, new], [spent - budget, spent - expected, spent], default=0.0)
+
+    # Leave out a section total when one of its categories is flagged
+    member_flagged = np.zeros(len(spent), dtype=bool)
+    member_flagged[section_of[(kind >= 0) & (section_of >= 0)]] = True
+    kind[member_flagged] = -1
+
+    return {
+        "kind": kind,
+        "excess": excess,
+        "expected": expected,
+        "seasonal": use_seasonal,
+        "n": np.where(use_seasonal, n_same, n_past),
+    }
 
 
-# ---------------------------------------------------------------------------
-# Anomaly detection
-# ---------------------------------------------------------------------------
-
 def detect_anomalies(
-    current_sections: list[tuple],       # (name, spent, budget, balance)
-    history_map: dict[str, list[float]], # section_name → [spent_oldest, ..., spent_newest]
+    current: np.ndarray,   # (rows, 3) cube column of the reported month
+    history: CubeSlice,    # the months before it
+    dt: datetime,          # the reported month
 ) -> tuple[list[str], int]:
     """
     Return (anomaly_strings, months_available) where:
     - anomaly_strings: up to MAX_ANOMALIES formatted HTML bullet strings
     - months_available: how many months of history we actually found
     """
-    months_available = max((len(v) for v in history_map.values()), default=0)
-    scored: list[tuple[float, str]] = []
-
-    for name, spent, budget, balance in current_sections:
-        hist = history_map.get(name, [])
-
-        # -- Tier 1: over-budget (always, if budget > 0) --
-        if budget > 0 and spent > budget:
+    month_of_year = np.array([m.month for m in history.months], dtype=int)
+    scores = _score_anomalies(current, history.values, month_of_year, dt.month, _SECTION_OF)
+
+    flagged = np.flatnonzero(scores["kind"] >= 0)
+    # Largest excess first, then sheet order — stable across runs
+    ranked = flagged[np.lexsort((flagged, -scores["excess"][flagged]))][:MAX_ANOMALIES]
+
+    anomalies = []
+    for row in ranked:
+        name   = spend_cube.ROWS[row]
+        budget = float(current[row, spend_cube.BUDGET])
+        spent  = float(current[row, spend_cube.SPENT])
+        kind   = scores["kind"][row]
+        n      = int(scores["n"][row])
+
+        if kind == _OVER_BUDGET:
             pct = round((spent - budget) / budget * 100)
-            scored.append((
-                float(pct),
+            anomalies.append(
                 f"<b>{name}</b> {pct}% over budget "
-                f"({_fmt_amount(spent)} vs {_fmt_amount(budget)} budget)",
-            ))
-
-        # -- Tier 2: historical comparison --
-        if len(hist) < MIN_HISTORY_MONTHS:
-            continue
-
-        mean = sum(hist) / len(hist)
-
-        if mean > 0:
-            variance = sum((x - mean) ** 2 for x in hist) / len(hist)
-            std_dev  = math.sqrt(variance)
-            cov      = std_dev / mean
-
-            if cov >= HIGH_VARIANCE_COV:
-                continue  # too noisy
-
-            if spent > mean * ANOMALY_MULTIPLIER:
-                # Skip if already flagged as over-budget (avoid duplication)
-                already_flagged = budget > 0 and spent > budget
-                if not already_flagged:
-                    pct = round((spent - mean) / mean * 100)
-                    scored.append((
-                        float(pct),
-                        f"<b>{name}</b>: {_fmt_amount(spent)} vs "
-                        f"{_fmt_amount(mean)} avg last {len(hist)} months (+{pct}%)",
-                    ))
-
-        elif mean == 0 and spent > 0 and budget == 0:
-            # New/unplanned spending in a category that was historically zero
-            scored.append((
-                100.0,
+                f"({_fmt_amount(spent)} vs {_fmt_amount(budget)} budget)"
+            )
+        elif kind == _UNUSUAL:
+            expected = float(scores["expected"][row])
+            pct = round((spent - expected) / expected * 100)
+            basis = (
+                f"typical for {dt.strftime('%B')} ({n} years)" if scores["seasonal"][row]
+                else f"median of last {n} months"
+            )
+            anomalies.append(
+                f"<b>{name}</b>: {_fmt_amount(spent)} vs "
+                f"{_fmt_amount(expected)} {basis} (+{pct}%)"
+            )
+        else:
+            anomalies.append(
                 f"<b>{name}</b>: {_fmt_amount(spent)} — new unplanned spending "
-                f"(historically ₪0)",
-            ))
+                f"(historically ₪0)"
+            )
 
-    # Sort by severity (highest %) descending, cap at MAX_ANOMALIES
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [msg for _, msg in scored[:MAX_ANOMALIES]], months_available
+    return anomalies, int(history.present.sum())
 
 
 # ---------------------------------------------------------------------------
@@ -208,20 +235,20 @@ def format_monthly_report(prev_month_dt: datetime) -> tuple[str, object]:
     """
     Build the full (html_text, InlineKeyboardMarkup) for the monthly report.
 
-    API call budget:
-        1  — spreadsheet metadata (tab list)
-        1  — current month data
-      ≤12  — one per available historical month tab
+    All months come from the spend cube (spend_cube.py), which validates its
+    stored months with one checksum batchGet and reads only the tabs that
+    changed — usually just the reported month:
+        ≤1  — spreadsheet metadata (only for months it has never seen)
+        ≤1  — B:C checksums of every cached month
+        ≤1  — A:D of new / changed months
       ─────
-      ≤14  total  (well within the 60 req/min quota)
+       ≤3  total, whatever MAX_HISTORY_MONTHS is
     """
-    service = _build_service()
-
-    # ── 1. Fetch metadata once, resolve current-month tab ──────────────────
-    existing_tabs = get_spreadsheet_tabs(service)
-    tab_info = find_tab_in_tabs(existing_tabs, prev_month_dt)
+    # ── 1. Reported month + MAX_HISTORY_MONTHS before it, from the cube ────
+    cube    = spend_cube.load(_shift_months_back(prev_month_dt, MAX_HISTORY_MONTHS), prev_month_dt)
+    current = cube.month(prev_month_dt)
 
-    if not tab_info:
+    if current is None:
         keyboard = _summary_keyboard(prev_month_dt)
         return (
             f"📅 <b>Monthly Summary — {prev_month_dt.strftime('%B %Y')}</b>\n\n"
@@ -229,45 +256,20 @@ def format_monthly_report(prev_month_dt: datetime) -> tuple[str, object]:
             keyboard,
         )
 
-    tab_name, _ = tab_info
-
-    # ── 2. Read current month (1 API call) ─────────────────────────────────
-    resp = service.spreadsheets().values().get(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"'{tab_name}'!A1:D200",
-    ).execute()
-    rows = resp.get("values", [])
-
+    # ── 2. Section totals of the reported month ────────────────────────────
     sections: list[tuple] = []
-    grand_spent = grand_budget = grand_balance = 0.0
-
-    for section_name, subcats in BROAD_CATEGORIES.items():
-        header_idx = _find_row_index(rows, section_name)
-        if header_idx is None:
-            continue
-        total_idx = header_idx + len(subcats) + 1
-        if total_idx >= len(rows):
-            continue
-        total_row = rows[total_idx]
-        budget  = _parse_currency(total_row[1] if len(total_row) > 1 else "")
-        spent   = _parse_currency(total_row[2] if len(total_row) > 2 else "")
-        balance = _parse_currency(total_row[3] if len(total_row) > 3 else "")
-        sections.append((section_name, spent, budget, balance))
-        grand_spent   += spent
-        grand_budget  += budget
-        grand_balance += balance
-
-    # ── 3. Read historical months (1 API call per tab, reusing metadata) ───
-    history_tab_data = _build_history_tab_data(service, prev_month_dt, existing_tabs)
-
-    history_map: dict[str, list[float]] = {
-        section_name: get_historical_spending(section_name, subcats, history_tab_data)
-        for section_name, subcats in BROAD_CATEGORIES.items()
-    }
-    del history_tab_data  # free the raw rows — no longer needed
+    for section_name in BROAD_CATEGORIES:
+        budget, spent, balance = current[spend_cube.ROW_INDEX[section_name]]
+        if np.isnan(spent):
+            continue   # header or total row missing from the tab
+        sections.append((section_name, float(spent), float(budget), float(balance)))
+    grand_spent = sum(s for _, s, _, _ in sections)
+
+    # ── 3. History: the months before the reported one ─────────────────────
+    history = cube.before(prev_month_dt)
 
     # ── 4. Detect anomalies & format ───────────────────────────────────────
-    anomalies, months_available = detect_anomalies(sections, history_map)
+    anomalies, months_available = detect_anomalies(current, history, prev_month_dt)
 
     lines = [f"📅 <b>Monthly Summary — {prev_month_dt.strftime('%B %Y')}</b>\n"]
 
@@ -316,13 +318,175 @@ def format_monthly_report(prev_month_dt: datetime) -> tuple[str, object]:
 
 
 # ---------------------------------------------------------------------------
-# Job callback
+# Precomputed report
+#
+# prepare_monthly_report (08:45 on the 1st) builds the report ahead of
+# delivery into an artifact that also holds the month's rendered /summary and
+# section views, keyed by month and the tab's spend-cube checksum, and saved
+# to REPORT_ARTIFACT_FILE. Delivery and /report are served from it, and every
+# use seeds the summary render cache so the burst of button taps from all
+# subscribers is served from it too. It is rebuilt only when the checksum no
+# longer matches the tab.
+# ---------------------------------------------------------------------------
+
+# Months of artifacts kept (oldest dropped first).
+REPORT_ARTIFACT_MONTHS = 12
+
+
+@dataclass
+class _ReportArtifact:
+    month: str                                              # "YYYY-MM"
+    checksum: str                                           # the tab's spend_cube.checksum()
+    tab_name: str
+    built_at: float                                         # unix time
+    report: tuple[str, InlineKeyboardMarkup]
+    summary: tuple[str, InlineKeyboardMarkup]
+    sections: dict[str, tuple[str, InlineKeyboardMarkup]]
+
+
+_artifact_lock = threading.Lock()
+_artifacts: dict[str, _ReportArtifact] = {}
+_artifacts_loaded = False
+
+
+def _view_to_json(view: tuple[str, InlineKeyboardMarkup]) -> dict:
+    text, keyboard = view
+    return {"text": text, "keyboard": keyboard.to_dict()}
+
+
+def _view_from_json(data: dict) -> tuple[str, InlineKeyboardMarkup]:
+    return data["text"], InlineKeyboardMarkup.de_json(data["keyboard"], None)
+
+
+def _load_artifacts() -> None:
+    """Read REPORT_ARTIFACT_FILE (once, under _artifact_lock)."""
+    global _artifacts_loaded
+    _artifacts_loaded = True
+    try:
+        with open(REPORT_ARTIFACT_FILE, encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, json.JSONDecodeError) as exc:
+        logger.warning(f"Could not read report cache {REPORT_ARTIFACT_FILE}: {exc}")
+        return
+    for month, data in raw.items():
+        try:
+            _artifacts[month] = _ReportArtifact(
+                month=month,
+                checksum=data["checksum"],
+                tab_name=data["tab_name"],
+                built_at=data["built_at"],
+                report=_view_from_json(data["report"]),
+                summary=_view_from_json(data["summary"]),
+                sections={name: _view_from_json(v) for name, v in data["sections"].items()},
+            )
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning(f"Dropping cached report for {month}: {exc}")
+
+
+def _save_artifacts() -> None:
+    """Trim to REPORT_ARTIFACT_MONTHS and rewrite the file (under _artifact_lock)."""
+    for month in sorted(_artifacts)[:-REPORT_ARTIFACT_MONTHS]:
+        del _artifacts[month]
+    data = {
+        month: {
+            "checksum": a.checksum,
+            "tab_name": a.tab_name,
+            "built_at": a.built_at,
+            "report": _view_to_json(a.report),
+            "summary": _view_to_json(a.summary),
+            "sections": {name: _view_to_json(v) for name, v in a.sections.items()},
+        }
+        for month, a in _artifacts.items()
+    }
+    tmp_path = f"{REPORT_ARTIFACT_FILE}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, REPORT_ARTIFACT_FILE)
+    except OSError as exc:
+        # The in-memory artifacts still work; only restart persistence is lost.
+        logger.warning(f"Could not write report cache {REPORT_ARTIFACT_FILE}: {exc}")
+
+
+def _build_artifact(dt: datetime) -> Optional[_ReportArtifact]:
+    """Read the month's tab once and render every view. None if it has no tab."""
+    rendered = _render_month(dt)   # one A:D read; also fills the render cache and spend cube
+    if rendered is None:
+        return None
+    return _ReportArtifact(
+        month=dt.strftime("%Y-%m"),
+        checksum=spend_cube.checksum(dt) or "",
+        tab_name=rendered.tab_name,
+        built_at=time.time(),
+        report=format_monthly_report(dt),
+        summary=rendered.summary,
+        sections=rendered.sections,
+    )
+
+
+def report_artifact(dt: datetime) -> Optional[_ReportArtifact]:
+    """
+    The precomputed report for dt's month, rebuilt first if the tab changed
+    since it was built; None if the month has no tab. A hit costs at most
+    one checksum call. Seeds the summary render cache. Blocking.
+    """
+    dt  = dt.replace(day=1)
+    key = dt.strftime("%Y-%m")
+    with _artifact_lock:
+        if not _artifacts_loaded:
+            _load_artifacts()
+        artifact = _artifacts.get(key)
+        if artifact is not None:
+            spend_cube.load(dt, dt)   # re-validates the tab's checksum
+            if spend_cube.checksum(dt) == artifact.checksum:
+                metrics.incr("report_artifact", result="hit")
+                seed_rendered_month(dt, artifact.tab_name, artifact.summary, artifact.sections)
+                return artifact
+        metrics.incr("report_artifact", result="miss" if artifact is None else "stale")
+
+        started  = time.monotonic()
+        artifact = _build_artifact(dt)
+        if artifact is None:
+            return None
+        _artifacts[key] = artifact
+        _save_artifacts()
+        logger.info(
+            f"Monthly report for {dt.strftime('%B %Y')} built in "
+            f"{(time.monotonic() - started) * 1000:.0f}ms"
+        )
+        return artifact
+
+
+def monthly_report_view(dt: datetime) -> tuple[str, InlineKeyboardMarkup]:
+    """(html_text, keyboard) of the report, from the artifact when the month has a tab."""
+    artifact = report_artifact(dt)
+    if artifact is None:
+        return format_monthly_report(dt)   # the "no sheet tab" message
+    return artifact.report
+
+
+# ---------------------------------------------------------------------------
+# Job callbacks
 # ---------------------------------------------------------------------------
 
+async def prepare_monthly_report(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    JobQueue callback — runs on the 1st of each month at 08:45 Israel time.
+    Builds the previous month's report artifact so send_monthly_report only delivers.
+    """
+    prev_dt = _prev_month_dt(datetime.now())
+    try:
+        await asyncio.to_thread(report_artifact, prev_dt)
+    except Exception:
+        logger.exception("Monthly report precomputation failed")
+
+
 async def send_monthly_report(context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     JobQueue callback — runs on the 1st of each month at 09:00 Israel time.
-    Generates the report for the previous month and sends it to all subscribers.
+    Sends the previous month's report — precomputed at 08:45 — to all subscribers.
     """
     now      = datetime.now()
     prev_dt  = _prev_month_dt(now)
@@ -330,7 +494,7 @@ async def send_monthly_report(context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.info(f"Sending monthly report for {prev_dt.strftime('%B %Y')}...")
 
     try:
-        text, keyboard = format_monthly_report(prev_dt)
+        text, keyboard = await asyncio.to_thread(monthly_report_view, prev_dt)
     except Exception:
         logger.exception("Monthly report generation failed")
         return
@@ -394,7 +558,7 @@ async def tg_test_report(update, context) -> None:
     )
 
     try:
-        text, keyboard = format_monthly_report(target_dt)
+        text, keyboard = await asyncio.to_thread(monthly_report_view, target_dt)
     except Exception:
         logger.exception("Test report generation failed")
         await msg.edit_text("❌ Report generation failed — check the logs.")
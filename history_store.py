@@ -0,0 +1,141 @@
+"""
+history_store.py — Per-user store of recently logged expenses (for /delete).
+
+Replaces expense_history.json, which was one list shared by everyone and was
+rewritten in full on every logged expense: one parent's /delete could undo
+the other parent's expense, and an append racing a delete could lose either.
+
+Backed by SQLite (standard library) in HISTORY_DB:
+
+    append(user_id, entry)   one INSERT + a trim of that user's rows
+    recent(user_id, n)       that user's newest n entries, via the
+                             (user_id, id) index — newest first
+    remove(ids)              drop exactly the entries that were undone
+    find(txn_id)             one entry by transaction ID (for /edit)
+    set_amount(id, amount)   record an /edit so a later /delete undoes the new amount
+
+Every call is its own transaction, so a concurrent append and delete can no
+longer overwrite each other. HISTORY_LIMIT is a per-user retention policy:
+each user keeps their own newest HISTORY_LIMIT entries.
+
+WAL journal with synchronous=NORMAL: a commit appends to the WAL without an
+fsync, so append() is cheap enough to call from the event loop.
+
+Entry dicts have the same keys the JSON file used, plus "id" and the
+transaction ID / note-line offset written by log_expense():
+    {"id": 17, "category": "Groceries", "amount": 50.0, "tab_name": "0426",
+     "row": 45, "timestamp": "2026-04-01 15:04", "original_text": "super 50 milk",
+     "txn_id": "3fa9c21e", "line": 4}
+"""
+
+import logging
+import sqlite3
+import threading
+from typing import Iterable, Optional
+
+from config import HISTORY_DB, HISTORY_LIMIT
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id       INTEGER NOT NULL,
+    category      TEXT    NOT NULL,
+    amount        REAL    NOT NULL,
+    tab_name      TEXT    NOT NULL,
+    row           INTEGER NOT NULL,
+    timestamp     TEXT    NOT NULL,
+    original_text TEXT    NOT NULL,
+    txn_id        TEXT    NOT NULL DEFAULT '',
+    line          INTEGER NOT NULL DEFAULT -1
+);
+CREATE INDEX IF NOT EXISTS expenses_user_recent ON expenses (user_id, id);
+CREATE INDEX IF NOT EXISTS expenses_txn_id ON expenses (txn_id);
+"""
+
+_COLUMNS = ("id", "category", "amount", "tab_name", "row", "timestamp", "original_text", "txn_id", "line")
+
+# One connection shared by the event loop and worker threads; sqlite3
+# connections are not safe to use concurrently, so every call holds _lock.
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+def _connection() -> sqlite3.Connection:
+    """Open the database on first use (under _lock)."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(HISTORY_DB, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(_SCHEMA)
+        logger.info(f"Expense history store opened: {HISTORY_DB}")
+    return _conn
+
+
+def append(user_id: int, entry: dict) -> int:
+    """Record one logged expense for user_id; returns its id."""
+    with _lock:
+        conn = _connection()
+        with conn:  # one transaction: insert + trim
+            cur = conn.execute(
+                "INSERT INTO expenses "
+                "(user_id, category, amount, tab_name, row, timestamp, original_text, txn_id, line) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    user_id, entry["category"], entry["amount"], entry["tab_name"],
+                    entry["row"], entry["timestamp"], entry["original_text"],
+                    entry.get("txn_id", ""), entry.get("line", -1),
+                ),
+            )
+            conn.execute(
+                "DELETE FROM expenses WHERE user_id = ? AND id <= ("
+                "  SELECT id FROM expenses WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?"
+                ")",
+                (user_id, user_id, HISTORY_LIMIT),
+            )
+            return cur.lastrowid
+
+
+def recent(user_id: int, n: int = HISTORY_LIMIT) -> list[dict]:
+    """user_id's newest n entries, most recent first."""
+    with _lock:
+        rows = _connection().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM expenses "
+            "WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, n),
+        ).fetchall()
+    return [dict(zip(_COLUMNS, row)) for row in rows]
+
+
+def remove(ids: Iterable[int]) -> None:
+    """Forget the given entries (after they were undone in the sheet)."""
+    ids = list(ids)
+    if not ids:
+        return
+    with _lock:
+        conn = _connection()
+        with conn:
+            conn.execute(
+                f"DELETE FROM expenses WHERE id IN ({', '.join('?' * len(ids))})", ids
+            )
+
+
+def find(txn_id: str) -> Optional[dict]:
+    """The entry with this transaction ID, if it is still in someone's history."""
+    if not txn_id:
+        return None
+    with _lock:
+        row = _connection().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM expenses WHERE txn_id = ?", (txn_id,)
+        ).fetchone()
+    return dict(zip(_COLUMNS, row)) if row else None
+
+
+def set_amount(entry_id: int, amount: float) -> None:
+    """Update an entry's amount after /edit."""
+    with _lock:
+        conn = _connection()
+        with conn:
+            conn.execute("UPDATE expenses SET amount = ? WHERE id = ?", (amount, entry_id))
@@ -8,6 +8,8 @@ All actual logic lives in handlers/ — nothing here should need to change
 when business logic changes.
 """
 
+import asyncio
+import json
 import logging
 import os
 import threading
@@ -19,23 +21,32 @@ from telegram.ext import (
     CallbackQueryHandler,
     CommandHandler,
     ContextTypes,
+    InlineQueryHandler,
     MessageHandler,
     filters,
 )
 
+import metrics
 from config import ISRAEL_TZ, TELEGRAM_BOT_TOKEN
+from handlers import ai_history
 from handlers.callbacks import handle_callback
 from handlers.commands import (
     tg_balance,
     tg_categories,
     tg_category,
     tg_delete,
+    tg_edit,
+    tg_export,
     tg_help,
     tg_keywords,
+    tg_search,
     tg_summary,
 )
+from handlers.inline import tg_inline_query
 from handlers.message import tg_handle_message
-from handlers.monthly_report import send_monthly_report, tg_test_report
+from handlers.monthly_report import prepare_monthly_report, send_monthly_report, tg_test_report
+from sheets import provision_month_tab
+from update_processor import PerChatUpdateProcessor
 
 logging.basicConfig(
     format="%(asctime)s  %(levelname)s  %(name)s  %(message)s",
@@ -45,11 +56,19 @@ logger = logging.getLogger(__name__)
 
 
 # ---------------------------------------------------------------------------
-# Minimal HTTP server — keeps Render (Web Service) happy by binding to PORT
+# Minimal HTTP server — keeps Render (Web Service) happy by binding to PORT.
+# GET /metrics returns the in-process metrics snapshot (see metrics.py).
 # ---------------------------------------------------------------------------
 
 class _HealthHandler(BaseHTTPRequestHandler):
     def do_GET(self):
+        if self.path == "/metrics":
+            body = json.dumps(metrics.snapshot(), indent=2).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+            return
         self.send_response(200)
         self.end_headers()
         self.wfile.write(b"OK")
@@ -69,7 +88,7 @@ def _start_health_server() -> None:
 # Idle-user cleanup — safety net for the in-memory AI history
 # ---------------------------------------------------------------------------
 #
-# Even with a hard per-user cap on ai_history length, python-telegram-bot holds
+# Even with a token budget on each user's AI history, python-telegram-bot holds
 # every user's user_data dict in memory forever (one entry per chat_id). For
 # users who stop messaging entirely, that dict just sits there. This weekly job
 # drops the history of anyone idle for more than IDLE_THRESHOLD_DAYS.
@@ -78,26 +97,62 @@ IDLE_THRESHOLD_DAYS = 2
 
 
 async def _cleanup_idle_users(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Drop ai_history for users who haven't messaged in IDLE_THRESHOLD_DAYS."""
+    """Drop AI history for users who haven't messaged in IDLE_THRESHOLD_DAYS."""
     cutoff = (datetime.now() - timedelta(days=IDLE_THRESHOLD_DAYS)).timestamp()
     cleaned = 0
     for user_data in context.application.user_data.values():
         last_seen = user_data.get("last_seen", 0)
-        if last_seen < cutoff and user_data.get("ai_history"):
-            user_data.pop("ai_history", None)
+        if last_seen < cutoff and ai_history.clear(user_data):
             cleaned += 1
     if cleaned:
         logger.info(f"Idle-cleanup: dropped ai_history for {cleaned} idle user(s)")
 
 
+# ---------------------------------------------------------------------------
+# Month-tab provisioning — create next month's tab before anyone needs it
+# ---------------------------------------------------------------------------
+#
+# Without this, the first expense of every month fails until someone creates
+# the tab by hand (and each failure costs an AI explanation). The job runs
+# daily and provisions next month in the last PROVISION_DAYS_AHEAD days of the
+# month; provision_month_tab() is a no-op once the tab exists, so re-runs are
+# safe.
+
+PROVISION_DAYS_AHEAD = 3
+
+
+async def _provision_next_month_tab(context: ContextTypes.DEFAULT_TYPE) -> None:
+    today = datetime.now(ISRAEL_TZ).date()
+    this_month = today.replace(day=1)
+    next_month = (this_month + timedelta(days=32)).replace(day=1)
+    # The current month is always checked too — covers a bot that was down
+    # during last month's window.
+    targets = [this_month]
+    if (next_month - today).days <= PROVISION_DAYS_AHEAD:
+        targets.append(next_month)
+    for target in targets:
+        try:
+            await asyncio.to_thread(
+                provision_month_tab, datetime(target.year, target.month, 1)
+            )
+        except Exception:
+            logger.exception(f"Month-tab provisioning failed for {target:%B %Y}")
+
+
 async def _post_init(application: Application) -> None:
     """Register scheduled jobs after the Application is fully initialised."""
+    application.job_queue.run_monthly(
+        prepare_monthly_report,
+        when=dt_time(hour=8, minute=45, second=0, tzinfo=ISRAEL_TZ),
+        day=1,
+    )
     application.job_queue.run_monthly(
         send_monthly_report,
         when=dt_time(hour=9, minute=0, second=0, tzinfo=ISRAEL_TZ),
         day=1,
     )
-    logger.info("Monthly report job registered: 1st of each month at 09:00 IST")
+    logger.info("Monthly report jobs registered: 1st of each month, "
+                "precomputed at 08:45 IST, sent at 09:00 IST")
 
     application.job_queue.run_repeating(
         _cleanup_idle_users,
@@ -107,6 +162,13 @@ async def _post_init(application: Application) -> None:
     logger.info("Idle-user cleanup job registered: runs daily, "
                 f"drops history for users idle > {IDLE_THRESHOLD_DAYS} days")
 
+    application.job_queue.run_daily(
+        _provision_next_month_tab,
+        time=dt_time(hour=6, minute=0, second=0, tzinfo=ISRAEL_TZ),
+    )
+    logger.info("Month-tab provisioning job registered: daily at 06:00 IST, "
+                f"acts in the last {PROVISION_DAYS_AHEAD} days of each month")
+
 
 def create_app() -> Application:
     if not TELEGRAM_BOT_TOKEN:
@@ -115,6 +177,8 @@ def create_app() -> Application:
     app = (
         Application.builder()
         .token(TELEGRAM_BOT_TOKEN)
+        # Chats are handled concurrently, each chat's updates strictly in order.
+        .concurrent_updates(PerChatUpdateProcessor())
         .post_init(_post_init)
         .build()
     )
@@ -128,11 +192,17 @@ def create_app() -> Application:
     app.add_handler(CommandHandler("category",   tg_category))
     app.add_handler(CommandHandler("balance",    tg_balance))
     app.add_handler(CommandHandler("delete",      tg_delete))
+    app.add_handler(CommandHandler("edit",       tg_edit))
+    app.add_handler(CommandHandler("search",     tg_search))
+    app.add_handler(CommandHandler("export",     tg_export))
     app.add_handler(CommandHandler("report", tg_test_report))
 
     # Inline button callbacks (fuzzy confirm yes/no)
     app.add_handler(CallbackQueryHandler(handle_callback))
 
+    # "@bot groc 120" — category autocomplete and one-tap logging
+    app.add_handler(InlineQueryHandler(tg_inline_query))
+
     # Free-text messages — must be registered last
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, tg_handle_message))
 
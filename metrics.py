@@ -0,0 +1,59 @@
+"""
+metrics.py — Minimal in-process metrics registry.
+
+    incr(name, n=1, **labels)         counter
+    observe(name, value, **labels)    distribution — count / sum / max
+    set_gauge(name, value, **labels)  last value wins
+    snapshot() -> dict                everything, JSON-serialisable
+
+The health server in main.py serves snapshot() at GET /metrics. Values live
+in memory only and reset on restart — this is for eyeballing a running bot,
+not long-term storage. Thread-safe, since Sheets work runs in worker threads.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_counters: dict[str, float] = {}
+_gauges: dict[str, float] = {}
+_distributions: dict[str, dict[str, float]] = {}
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    inner = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
+
+
+def incr(name: str, n: float = 1, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def observe(name: str, value: float, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        dist = _distributions.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0})
+        dist["count"] += 1
+        dist["sum"]   += value
+        dist["max"]    = max(dist["max"], value)
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "distributions": {
+                key: {**dist, "avg": dist["sum"] / dist["count"] if dist["count"] else 0.0}
+                for key, dist in _distributions.items()
+            },
+        }
@@ -0,0 +1,162 @@
+"""
+category_index.py — Precomputed lookup index over category names and keywords.
+
+Built once at import from CATEGORY_MAP; every lookup is a dict access:
+
+    canonical_name("dining out")     → "Dining Out"     (case-insensitive name)
+    categories_for_keyword("tax")    → ["Property Tax"] (every owner, map order)
+    log_keyword("Groceries")         → a keyword parse() resolves to Groceries,
+                                       or None when no term of it does
+    suggest("groc")                  → ["Groceries", ...] ranked, for autocomplete
+
+suggest() ranking
+-----------------
+Every prefix of every category name and keyword — and of each word inside
+them, so "out" finds "Dining Out" — maps to a list of categories precomputed
+in rank order:
+    1. the query IS the whole name / keyword
+    2. the query starts the whole name / keyword (vs. a later word)
+    3. category names before keywords
+    4. shorter names / keywords first
+When prefixes give fewer than `limit` results, a trigram index fills the rest
+with typo-tolerant matches ("grocey" → Groceries).
+"""
+
+import re
+from typing import Optional
+
+from parsing.category_map import CATEGORY_MAP
+from parsing.parser import _exact_match, _extract_number
+
+# Minimum share of trigrams a term must have in common with the query to be
+# offered as a typo match (0–1).
+TRIGRAM_MIN_SIMILARITY = 0.3
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _SPACES_RE.sub(" ", text.strip().lower())
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# ---------------------------------------------------------------------------
+# Build
+# ---------------------------------------------------------------------------
+
+_BY_NAME: dict[str, str] = {}               # lowercase name → canonical name
+_BY_KEYWORD: dict[str, list[str]] = {}      # lowercase keyword → categories, map order
+_TERMS: list[tuple[str, str, bool]] = []    # (lowercase term, category, is_name)
+
+for _category, _keywords in CATEGORY_MAP.items():
+    _BY_NAME[_normalize(_category)] = _category
+    _TERMS.append((_normalize(_category), _category, True))
+    for _kw in _keywords:
+        _kw_lower = _normalize(_kw)
+        _owners = _BY_KEYWORD.setdefault(_kw_lower, [])
+        if _category not in _owners:
+            _owners.append(_category)
+        _TERMS.append((_kw_lower, _category, False))
+
+
+def _build_log_keywords() -> dict[str, str]:
+    """
+    category → the first of its name / keywords that parse() logs to it.
+
+    Checked with the parser's own lookup: a term another category also lists
+    (the parser keeps the last owner) or one containing a number (where
+    parse() splits off the amount) would log somewhere else.
+    """
+    result = {}
+    for category, keywords in CATEGORY_MAP.items():
+        for term in [category, *keywords]:
+            if _extract_number(term) is None and _exact_match(term) == category:
+                result[category] = term
+                break
+    return result
+
+
+_LOG_KEYWORDS = _build_log_keywords()
+
+
+def _build_prefix_index() -> dict[str, list[str]]:
+    best: dict[str, dict[str, tuple]] = {}   # prefix → category → best rank key
+    for term, category, is_name in _TERMS:
+        # Prefixes of the whole term, then of each later word in it
+        starts = [0] + [m.end() for m in re.finditer(" ", term)]
+        for start in starts:
+            tail = term[start:]
+            for end in range(1, len(tail) + 1):
+                prefix = tail[:end]
+                rank = (prefix != term, start != 0, not is_name, len(term))
+                current = best.setdefault(prefix, {}).get(category)
+                if current is None or rank < current:
+                    best[prefix][category] = rank
+    return {
+        prefix: sorted(ranks, key=lambda cat: (ranks[cat], cat))
+        for prefix, ranks in best.items()
+    }
+
+
+_PREFIXES = _build_prefix_index()
+
+_TERM_TRIGRAMS = [_trigrams(term) for term, _, _ in _TERMS]
+_TRIGRAM_POSTINGS: dict[str, list[int]] = {}
+for _term_id, _grams in enumerate(_TERM_TRIGRAMS):
+    for _gram in _grams:
+        _TRIGRAM_POSTINGS.setdefault(_gram, []).append(_term_id)
+
+
+# ---------------------------------------------------------------------------
+# Lookups
+# ---------------------------------------------------------------------------
+
+def canonical_name(name: str) -> Optional[str]:
+    """The category whose name matches `name` case-insensitively, or None."""
+    return _BY_NAME.get(_normalize(name))
+
+
+def categories_for_keyword(keyword: str) -> list[str]:
+    """Every category listing `keyword` (case-insensitive), in CATEGORY_MAP order."""
+    return list(_BY_KEYWORD.get(_normalize(keyword), ()))
+
+
+def log_keyword(category: str) -> Optional[str]:
+    """
+    A keyword that parse() matches exactly to `category`, for composing a
+    loggable message — or None if no term of the category maps back to it.
+    """
+    return _LOG_KEYWORDS.get(category)
+
+
+def suggest(query: str, limit: int = 10) -> list[str]:
+    """Up to `limit` categories for a partly typed name or keyword, best first."""
+    query = _normalize(query)
+    if not query:
+        return []
+
+    results = list(_PREFIXES.get(query, ())[:limit])
+    if len(results) >= limit:
+        return results
+
+    # Typo-tolerant fill-in: share of trigrams in common
+    query_grams = _trigrams(query)
+    shared: dict[int, int] = {}
+    for gram in query_grams:
+        for term_id in _TRIGRAM_POSTINGS.get(gram, ()):
+            shared[term_id] = shared.get(term_id, 0) + 1
+    scored = []
+    for term_id, count in shared.items():
+        similarity = count / max(len(query_grams), len(_TERM_TRIGRAMS[term_id]))
+        if similarity >= TRIGRAM_MIN_SIMILARITY:
+            scored.append((-similarity, _TERMS[term_id][1]))
+    for _, category in sorted(scored):
+        if category not in results:
+            results.append(category)
+            if len(results) >= limit:
+                break
+    return results
@@ -86,6 +86,15 @@ def _extract_number(text: str) -> Optional[re.Match]:
     return re.search(r'(-?\d+(?:\.\d+)?)', text)
 
 
+def format_amount(amount: float) -> str:
+    """
+    An amount written the way _extract_number reads it back: fixed-point with
+    trailing zeros trimmed (50, 12345.67, 1500000) — never %g's 6-digit
+    rounding or exponent form ("1.5e+06" would parse as 1.5).
+    """
+    return f"{amount:f}".rstrip("0").rstrip(".")
+
+
 # ---------------------------------------------------------------------------
 # Main parse function
 # ---------------------------------------------------------------------------
@@ -8,22 +8,28 @@ Responsibilities:
   - Read the current amount from column C.
   - Write the new cumulative amount to column C.
   - Append a timestamped entry to the cell note on column C.
+  - Provision next month's tab ahead of time from the latest month tab.
 
 Note format per entry (appended, never overwritten):
-  YYYY-MM-DD HH:MM  <full message as typed by user>
+  YYYY-MM-DD HH:MM  <full message as typed by user>  #<txn_id> ₪<amount>
 """
 
 import json
 import logging
+import random
 import re
+import secrets
+import threading
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
 
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 
 from config import SPREADSHEET_ID, GOOGLE_CREDENTIALS_JSON
+from parsing.category_map import CATEGORY_MAP
+from parsing.parser import format_amount
 
 logger = logging.getLogger(__name__)
 
@@ -105,24 +111,55 @@ class LogResult:
     timestamp: str        # the timestamp written into the note (used by /delete)
     message: str          # human-readable summary
     failure: Optional[TabLookupFailure] = None  # set when the failure was a missing tab
+    txn_id: str = ""      # transaction ID tagged onto the note line (/delete, /edit)
+    line: int = -1        # offset of that line in the cell note when it was written
 
 
 # ---------------------------------------------------------------------------
-# API connection — cached singleton to avoid per-request memory growth
+# API connection — cached per thread to avoid per-request memory growth
+#
+# The underlying httplib2 transport is not thread-safe, and read tools now run
+# concurrently through asyncio.to_thread. Each worker thread therefore gets its
+# own service object; the thread pool is bounded, so memory stays bounded too.
 # ---------------------------------------------------------------------------
 
-_service_cache = None
+_service_local = threading.local()
 
 def _build_service():
-    global _service_cache
-    if _service_cache is not None:
-        return _service_cache
+    service = getattr(_service_local, "service", None)
+    if service is not None:
+        return service
     if not GOOGLE_CREDENTIALS_JSON:
         raise EnvironmentError("GOOGLE_CREDENTIALS environment variable is not set.")
     creds_info = json.loads(GOOGLE_CREDENTIALS_JSON)
     creds = service_account.Credentials.from_service_account_info(creds_info, scopes=SCOPES)
-    _service_cache = build("sheets", "v4", credentials=creds)
-    return _service_cache
+    _service_local.service = build("sheets", "v4", credentials=creds)
+    return _service_local.service
+
+
+# ---------------------------------------------------------------------------
+# Write notifications
+#
+# Caches built on top of the sheet (e.g. the transaction search index) register
+# a listener here and are told the tab name after every write this bot makes,
+# so they can refresh just that tab instead of guessing with a TTL.
+# ---------------------------------------------------------------------------
+
+_write_listeners: list[Callable[[str], None]] = []
+
+
+def add_write_listener(listener: Callable[[str], None]) -> None:
+    """Register listener(tab_name) to be called after every sheet write."""
+    _write_listeners.append(listener)
+
+
+def notify_write(tab_name: str) -> None:
+    """Tell every registered listener that `tab_name` just changed."""
+    for listener in _write_listeners:
+        try:
+            listener(tab_name)
+        except Exception:
+            logger.exception(f"Write listener {listener!r} failed for '{tab_name}'")
 
 
 # ---------------------------------------------------------------------------
@@ -256,6 +293,22 @@ def find_category_row(service, tab_name: str, category: str) -> Optional[int]:
 # Amount read / write
 # ---------------------------------------------------------------------------
 
+def _parse_currency(value: str) -> float:
+    try:
+        return float(str(value).replace("₪", "").replace(",", "").strip() or 0)
+    except ValueError:
+        return 0.0
+
+
+def _row_amounts(row: list) -> tuple[float, float, float]:
+    """(budget, spent, balance) from columns B, C, D of one A:D row."""
+    return (
+        _parse_currency(row[1] if len(row) > 1 else ""),
+        _parse_currency(row[2] if len(row) > 2 else ""),
+        _parse_currency(row[3] if len(row) > 3 else ""),
+    )
+
+
 def _read_current_amount(service, tab_name: str, row: int) -> float:
     """Read the current numeric value from column C of the given row."""
     cell = f"'{tab_name}'!C{row}"
@@ -288,6 +341,20 @@ def _write_amount(service, tab_name: str, row: int, new_amount: float) -> None:
     logger.info(f"Amount written to {cell}: {new_amount}")
 
 
+# ---------------------------------------------------------------------------
+# Write lock
+#
+# Amounts and notes are updated read-modify-write (read C, add, write C; read
+# note, append, write note). Updates from different chats are handled
+# concurrently, so two parents logging to the same category at once could
+# both read the old total and one expense would be lost. Every writer —
+# log_expense() here and commands.delete() — holds this lock across its
+# read-modify-write. Writes are rare; a single lock is plenty.
+# ---------------------------------------------------------------------------
+
+_write_lock = threading.Lock()
+
+
 # ---------------------------------------------------------------------------
 # Note read / write
 #
@@ -354,13 +421,150 @@ def _write_note(service, tab_name: str, row: int, sheet_id: int, full_note: str)
     logger.info(f"Note written to '{tab_name}'!C{row}")
 
 
-def _build_note_line(original_text: str, timestamp: str) -> str:
+# ---------------------------------------------------------------------------
+# Batched cell read / write — for callers touching many rows at once (/delete)
+#
+# One spreadsheets.get returns column C's value, note and the tab's sheetId
+# for every requested cell; one batchUpdate writes amount + note for all of
+# them. Replaces 4 round trips per row with 2 in total.
+# ---------------------------------------------------------------------------
+
+def _cell_amount(cell: dict) -> float:
+    number = cell.get("effectiveValue", {}).get("numberValue")
+    if number is not None:
+        return float(number)
+    return _parse_currency(cell.get("formattedValue", ""))
+
+
+def _read_cells(service, cells: list[tuple[str, int]]) -> dict[tuple[str, int], tuple[float, str, int]]:
+    """
+    Read column C of many (tab_name, row) cells in one request.
+    Returns (tab_name, row) -> (amount, note, sheet_id). Cells on tabs that no
+    longer exist are left out.
+    """
+    if not cells:
+        return {}
+    try:
+        result = service.spreadsheets().get(
+            spreadsheetId=SPREADSHEET_ID,
+            ranges=[f"'{tab}'!C{row}" for tab, row in cells],
+            fields="sheets(properties(sheetId,title),"
+                   "data(startRow,rowData(values(effectiveValue,formattedValue,note))))",
+        ).execute()
+    except Exception:
+        # One unknown tab fails the whole request — drop deleted tabs and retry.
+        existing = {title for title, _ in get_spreadsheet_tabs(service).values()}
+        kept = [cell for cell in cells if cell[0] in existing]
+        if len(kept) == len(cells):
+            raise
+        logger.warning(f"Skipping cells on missing tabs: {sorted({t for t, _ in cells} - existing)}")
+        return _read_cells(service, kept)
+
+    found: dict[tuple[str, int], tuple[float, str, int]] = {}
+    for sheet in result.get("sheets", []):
+        props = sheet.get("properties", {})
+        title, sheet_id = props.get("title"), props.get("sheetId")
+        for data in sheet.get("data", []):
+            row = data.get("startRow", 0) + 1
+            row_data = data.get("rowData") or [{}]
+            cell = (row_data[0].get("values") or [{}])[0]
+            found[(title, row)] = (
+                _cell_amount(cell),
+                cell.get("note", "") or "",
+                sheet_id,
+            )
+    return found
+
+
+def _write_cells(service, updates: list[tuple[int, int, float, str]]) -> None:
+    """
+    Write amount + note to column C for many cells in one batchUpdate.
+    updates: [(sheet_id, row, new_amount, new_note)].
+    """
+    if not updates:
+        return
+    service.spreadsheets().batchUpdate(
+        spreadsheetId=SPREADSHEET_ID,
+        body={
+            "requests": [
+                {
+                    "updateCells": {
+                        "range": {
+                            "sheetId": sheet_id,
+                            "startRowIndex": row - 1,
+                            "endRowIndex":   row,
+                            "startColumnIndex": 2,
+                            "endColumnIndex":   3,
+                        },
+                        "rows": [{"values": [{
+                            "userEnteredValue": {"numberValue": amount},
+                            "note": note,
+                        }]}],
+                        "fields": "userEnteredValue,note",
+                    }
+                }
+                for sheet_id, row, amount, note in updates
+            ]
+        },
+    ).execute()
+    logger.info(f"Batch-wrote amount + note to {len(updates)} cell(s)")
+
+
+# ---------------------------------------------------------------------------
+# Note lines and transaction IDs
+#
+# Every line the bot writes ends in a tag with a short unique transaction ID
+# and the amount it added:
+#
+#     2026-04-01 15:04  super 50 milk  #3fa9c21e ₪50
+#
+# /delete and /edit find their line by ID (checking the remembered line offset
+# first), so two expenses logged in the same minute are never confused. Lines
+# written before IDs existed, or typed by hand, simply have no tag.
+# ---------------------------------------------------------------------------
+
+# The exponent is only for tags written in %g form, which turned ₪1000000
+# into "₪1e+06" — current tags always spell the amount out.
+_TXN_TAG_RE = re.compile(r"\s+#([0-9a-f]{8}) ₪(-?[0-9.]+(?:e[+-]?[0-9]+)?)$")
+
+
+def new_txn_id() -> str:
+    """8 hex chars — short enough to type after /edit."""
+    return secrets.token_hex(4)
+
+
+def _txn_tag(txn_id: str, amount: float) -> str:
+    # The exact amount (₪12345.67, not %g's ₪12345.7) so /edit and /delete
+    # subtract what was added.
+    return f"  #{txn_id} ₪{format_amount(amount)}"
+
+
+def split_txn_tag(text: str) -> tuple[str, str, Optional[float]]:
+    """'<text>  #id ₪amount' → (text, txn_id, amount); (text, '', None) when untagged."""
+    match = _TXN_TAG_RE.search(text)
+    if not match:
+        return text, "", None
+    return text[:match.start()], match.group(1), float(match.group(2))
+
+
+def _find_note_line(lines: list[str], txn_id: str, hint: int = -1) -> Optional[int]:
+    """Index of the line tagged txn_id — the remembered offset if still right."""
+    if 0 <= hint < len(lines) and split_txn_tag(lines[hint])[1] == txn_id:
+        return hint
+    for idx, line in enumerate(lines):
+        if split_txn_tag(line)[1] == txn_id:
+            return idx
+    return None
+
+
+def _build_note_line(original_text: str, timestamp: str, txn_id: str = "", amount: float = 0.0) -> str:
     """
     Build a single note entry line.
-    Format:  YYYY-MM-DD HH:MM  <full message as typed by user>
-    Timestamp is passed in so the caller can store it for /delete matching.
+    Format:  YYYY-MM-DD HH:MM  <full message as typed by user>  #<txn_id> ₪<amount>
+    Timestamp and ID are passed in so the caller can store them for /delete and /edit.
     """
-    return f"{timestamp}  {original_text}"
+    line = f"{timestamp}  {original_text}"
+    return line + _txn_tag(txn_id, amount) if txn_id else line
 
 
 # ---------------------------------------------------------------------------
@@ -426,17 +630,20 @@ def log_expense(
             message=f"Category '{category}' not found in tab '{tab_name}'.",
         )
 
-    # 3. Read current amount, compute new total, write it back
-    current_amount = _read_current_amount(service, tab_name, row)
-    new_total = current_amount + amount
-    _write_amount(service, tab_name, row, new_total)
-
-    # 4. Build the note line with a shared timestamp, then append it
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-    existing_note = _read_existing_note(service, tab_name, row)
-    new_line = _build_note_line(original_text, timestamp)
-    full_note = (existing_note + "\n" + new_line).strip()
-    _write_note(service, tab_name, row, sheet_id, full_note)
+    with _write_lock:
+        # 3. Read current amount, compute new total, write it back
+        current_amount = _read_current_amount(service, tab_name, row)
+        new_total = current_amount + amount
+        _write_amount(service, tab_name, row, new_total)
+
+        # 4. Build the note line with a shared timestamp, then append it
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
+        txn_id = new_txn_id()
+        existing_note = _read_existing_note(service, tab_name, row)
+        new_line = _build_note_line(original_text, timestamp, txn_id, amount)
+        full_note = (existing_note + "\n" + new_line).strip()
+        _write_note(service, tab_name, row, sheet_id, full_note)
+    notify_write(tab_name)
 
     return LogResult(
         success=True,
@@ -447,4 +654,123 @@ def log_expense(
         row=row,
         timestamp=timestamp,
         message=f"✅ Added ₪{amount:g} to '{category}'. New total: ₪{new_total:g}",
+        txn_id=txn_id,
+        line=full_note.count("\n"),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Month-tab provisioning
+#
+# Most TabLookupFailures are simply "the new month's tab doesn't exist yet".
+# A scheduled job in main.py calls provision_month_tab() for next month a few
+# days ahead: if no tab matches (find_tab_in_tabs), the most recent month tab
+# is duplicated under the canonical MMYY name and every category row's
+# column C is cleared — amount and note — so the new month starts at zero.
+# Budgets (B), balance formulas (D) and any formula in column C (section
+# totals) are carried over untouched.
+# ---------------------------------------------------------------------------
+
+# How many months back to look for a tab to use as the template.
+PROVISION_LOOKBACK_MONTHS = 12
+
+
+def _month_before(dt: datetime) -> datetime:
+    if dt.month == 1:
+        return dt.replace(year=dt.year - 1, month=12, day=1)
+    return dt.replace(month=dt.month - 1, day=1)
+
+
+def provision_month_tab(dt: datetime) -> Optional[str]:
+    """
+    Make sure a tab exists for `dt`'s month. Returns the new tab's name if
+    one was created, None if it already existed or no template was found.
+
+    Three API calls: tab metadata, the template's A:C cells, and a single
+    batchUpdate that both duplicates the template (with a pre-chosen
+    sheetId) and clears its category rows — the new tab is never visible
+    half-prepared.
+    """
+    dt = dt.replace(day=1)
+    service = _build_service()
+    existing_tabs = get_spreadsheet_tabs(service)
+    if find_tab_in_tabs(existing_tabs, dt):
+        logger.info(f"Provisioning: tab for {dt.strftime('%B %Y')} already exists")
+        return None
+
+    template = None
+    source_dt = _month_before(dt)
+    for _ in range(PROVISION_LOOKBACK_MONTHS):
+        template = find_tab_in_tabs(existing_tabs, source_dt)
+        if template:
+            break
+        source_dt = _month_before(source_dt)
+    if template is None:
+        logger.warning(
+            f"Provisioning: no month tab in the last {PROVISION_LOOKBACK_MONTHS} "
+            f"months to copy for {dt.strftime('%B %Y')}"
+        )
+        return None
+    template_name, template_id = template
+
+    resp = service.spreadsheets().get(
+        spreadsheetId=SPREADSHEET_ID,
+        ranges=[f"'{template_name}'!A1:C200"],
+        fields="sheets(properties(index),data(rowData(values(formattedValue,userEnteredValue))))",
+    ).execute()
+    sheet = resp.get("sheets", [{}])[0]
+    template_index = sheet.get("properties", {}).get("index", 0)
+    row_data = sheet.get("data", [{}])[0].get("rowData", [])
+
+    category_labels = {cat.lower() for cat in CATEGORY_MAP}
+    rows_to_clear = []
+    for i, row in enumerate(row_data):
+        cells = row.get("values", [])
+        label = (cells[0].get("formattedValue") or "").strip().lower() if cells else ""
+        if label not in category_labels:
+            continue
+        entered = cells[2].get("userEnteredValue", {}) if len(cells) > 2 else {}
+        if "formulaValue" in entered:
+            continue  # computed cell — keep it
+        rows_to_clear.append(i)  # 0-indexed
+
+    used_ids = {sheet_id for (_title, sheet_id) in existing_tabs.values()}
+    new_id = random.randint(1, 2**31 - 1)
+    while new_id in used_ids:
+        new_id = random.randint(1, 2**31 - 1)
+
+    new_name = dt.strftime("%m%y")
+    requests = [{
+        "duplicateSheet": {
+            "sourceSheetId": template_id,
+            "newSheetId": new_id,
+            "newSheetName": new_name,
+            # Right before the template — tabs are kept newest first
+            "insertSheetIndex": template_index,
+        }
+    }]
+    for row in rows_to_clear:
+        requests.append({
+            "updateCells": {
+                "range": {
+                    "sheetId": new_id,
+                    "startRowIndex": row,
+                    "endRowIndex": row + 1,
+                    "startColumnIndex": 2,   # column C
+                    "endColumnIndex": 3,
+                },
+                "rows": [{"values": [{}]}],
+                "fields": "userEnteredValue,note",
+            }
+        })
+
+    service.spreadsheets().batchUpdate(
+        spreadsheetId=SPREADSHEET_ID,
+        body={"requests": requests},
+    ).execute()
+    notify_write(new_name)
+    logger.info(
+        f"Provisioning: created tab '{new_name}' from '{template_name}' "
+        f"({len(rows_to_clear)} category rows cleared)"
     )
+    return new_name
@@ -0,0 +1,463 @@
+"""
+spend_cube.py — NumPy cube of every month's budget / spent / balance figures.
+
+The monthly report, month comparisons and anomaly detection all need the same
+numbers: each month tab's budget, spent and balance per broad section and per
+category. Rebuilding them from raw A1:D200 row lists on every request means
+one Sheets read per month and a Python loop over every cell. Instead each
+month tab is parsed ONCE into one column of a float64 array
+
+    values[month, row, measure]     measure = BUDGET | SPENT | BALANCE
+
+where the rows are every BROAD_CATEGORIES section (its total row) followed by
+its categories, then the remaining CATEGORY_MAP categories — see ROWS. A row
+missing from a tab is NaN, so "not in the sheet" and "₪0" stay
+distinguishable. Averages, variances, trends and comparisons over any month
+range are then array operations on a CubeSlice:
+
+    cube = spend_cube.load(start, end)          # reads only missing/stale tabs
+    cube.series("Groceries")                    # spent per month, oldest first
+    cube.mean(), cube.std(), cube.trend()       # per row, NaN-aware
+
+Freshness
+---------
+The cube is saved to SPEND_CUBE_FILE (.npz) whenever a fill changes a month,
+so a restart reads nothing for months it already has. Each month keeps a
+checksum of its B:C cells (budget and spent — balances and section totals are
+formulas over them). Once a month's column is older than CUBE_TTL, one values.batchGet of
+B1:C200 for all such tabs re-checksums them, and only the tabs whose checksum
+changed — in practice the current month, or a hand-edited old one — are read
+in full, again in one batchGet. Tabs the bot wrote to (sheets.notify_write)
+skip the checksum and are re-read directly. Months already read by the
+/summary renderer are recorded for free via record().
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from config import SPEND_CUBE_FILE, SPREADSHEET_ID
+from parsing.category_map import BROAD_CATEGORIES, CATEGORY_MAP
+from sheets import (
+    _build_service,
+    _row_amounts,
+    add_write_listener,
+    find_tab_in_tabs,
+    get_spreadsheet_tabs,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds a month's column is trusted before its checksum is checked again
+# (also how long a month without a tab is remembered as such).
+CUBE_TTL = 300
+
+# Measure axis
+BUDGET, SPENT, BALANCE = 0, 1, 2
+
+# Row axis: each section's total row, then its categories, in map order;
+# then the CATEGORY_MAP categories that belong to no section.
+ROWS: list[str] = [
+    name
+    for section, subcats in BROAD_CATEGORIES.items()
+    for name in (section, *subcats)
+]
+ROWS += [cat for cat in CATEGORY_MAP if cat not in ROWS]
+ROW_INDEX: dict[str, int] = {name: i for i, name in enumerate(ROWS)}
+SECTION_ROWS = np.array([ROW_INDEX[section] for section in BROAD_CATEGORIES])
+CATEGORY_ROWS = np.array([i for i, name in enumerate(ROWS) if name not in BROAD_CATEGORIES])
+
+
+def _ordinal(dt: datetime) -> int:
+    return dt.year * 12 + dt.month - 1
+
+
+def _month_of(ordinal: int) -> datetime:
+    return datetime(ordinal // 12, ordinal % 12 + 1, 1)
+
+
+def parse_column(rows: list) -> np.ndarray:
+    """(len(ROWS), 3) array of one month tab's A:D rows; NaN where a row is missing."""
+    first: dict[str, int] = {}
+    for i, row in enumerate(rows):
+        if row:
+            first.setdefault(row[0].strip().lower(), i)
+
+    column = np.full((len(ROWS), 3), np.nan)
+    for section, subcats in BROAD_CATEGORIES.items():
+        header_idx = first.get(section.lower())
+        if header_idx is not None:
+            # The section's total row sits x+1 rows below its header (x = subcategories)
+            total_idx = header_idx + len(subcats) + 1
+            if total_idx < len(rows):
+                column[ROW_INDEX[section]] = _row_amounts(rows[total_idx])
+    for row in CATEGORY_ROWS:
+        idx = first.get(ROWS[row].lower())
+        if idx is not None:
+            column[row] = _row_amounts(rows[idx])
+    return column
+
+
+def _checksum(rows: list, first_column: int = 1) -> str:
+    """
+    Fingerprint of a tab's budget / spent cells: columns B:C of A:D rows, or
+    the rows of a B:C read with first_column=0. The A:D slice is trimmed the
+    way the API trims a B:C read (trailing empty cells and rows) so both match.
+    """
+    lines = []
+    for row in rows:
+        cells = [str(c) for c in row[first_column:first_column + 2]]
+        while cells and cells[-1] == "":
+            cells.pop()
+        lines.append("\x1f".join(cells))
+    while lines and not lines[-1]:
+        lines.pop()
+    return hashlib.blake2b("\x1e".join(lines).encode(), digest_size=8).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Query results
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class CubeSlice:
+    """A contiguous month range: values[i] is months[i]'s column (all NaN if no tab)."""
+    months: list[datetime]
+    values: np.ndarray          # (len(months), len(ROWS), 3)
+    present: np.ndarray         # (len(months),) bool — the month has a tab
+
+    def month(self, dt: datetime) -> Optional[np.ndarray]:
+        """(len(ROWS), 3) column for dt, or None if dt has no tab / is out of range."""
+        key = (dt.year, dt.month)
+        for i, month in enumerate(self.months):
+            if (month.year, month.month) == key:
+                return self.values[i] if self.present[i] else None
+        return None
+
+    def before(self, dt: datetime) -> "CubeSlice":
+        """The months strictly before dt."""
+        n = sum(1 for month in self.months if (month.year, month.month) < (dt.year, dt.month))
+        return CubeSlice(self.months[:n], self.values[:n], self.present[:n])
+
+    def series(self, name: str, measure: int = SPENT) -> np.ndarray:
+        """One row's values per month, oldest first (NaN where missing)."""
+        return self.values[:, ROW_INDEX[name], measure]
+
+    def count(self, measure: int = SPENT) -> np.ndarray:
+        """Months with a value, per row."""
+        return (~np.isnan(self.values[:, :, measure])).sum(axis=0)
+
+    def total(self, measure: int = SPENT) -> np.ndarray:
+        """Sum over the months, per row (missing months count as 0)."""
+        return np.nansum(self.values[:, :, measure], axis=0)
+
+    def mean(self, measure: int = SPENT) -> np.ndarray:
+        """Mean over the months that have a value, per row (NaN if none)."""
+        n = self.count(measure)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, self.total(measure) / n, np.nan)
+
+    def std(self, measure: int = SPENT) -> np.ndarray:
+        """Population standard deviation over the months with a value, per row."""
+        data = self.values[:, :, measure]
+        n = self.count(measure)
+        deviations = np.where(np.isnan(data), 0.0, data - self.mean(measure))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, np.sqrt((deviations ** 2).sum(axis=0) / n), np.nan)
+
+    def trend(self, measure: int = SPENT) -> np.ndarray:
+        """Least-squares change per month, per row (NaN with fewer than 2 months)."""
+        data = self.values[:, :, measure]
+        present = ~np.isnan(data)
+        x = np.arange(len(self.months), dtype=float)[:, None]
+        n = present.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x_mean = np.where(present, x, 0.0).sum(axis=0) / n
+            y_mean = np.where(present, data, 0.0).sum(axis=0) / n
+            dx = np.where(present, x - x_mean, 0.0)
+            dy = np.where(present, data - y_mean, 0.0)
+            slope = (dx * dy).sum(axis=0) / (dx ** 2).sum(axis=0)
+        return np.where(n >= 2, slope, np.nan)
+
+
+# ---------------------------------------------------------------------------
+# The cube
+# ---------------------------------------------------------------------------
+
+class _Cube:
+    def __init__(self):
+        # fill_lock serialises fills and is held across the Sheets reads; lock
+        # only guards the arrays and dicts below, so mark_dirty(), record()
+        # and slice() never wait on the network.
+        self.fill_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.months = np.empty(0, dtype=np.int64)           # sorted month ordinals
+        self.values = np.empty((0, len(ROWS), 3))
+        self.checked_at = np.empty(0)                        # unix time of last read / checksum match
+        self.checksums: dict[int, str] = {}                  # ordinal → _checksum of its B:C
+        self.tabs: dict[int, str] = {}                       # ordinal → tab title
+        self.absent: dict[int, float] = {}                   # ordinal → when it had no tab
+        self.dirty_tabs: set[str] = set()
+        self.loaded = False
+
+    # -- persistence (under lock) --
+
+    def _load_file(self) -> None:
+        self.loaded = True
+        try:
+            with np.load(SPEND_CUBE_FILE, allow_pickle=False) as data:
+                if list(data["rows"]) != ROWS:
+                    logger.info("Spend cube rows changed since it was saved — rebuilding")
+                    return
+                months = data["months"].tolist()
+                self.months     = data["months"]
+                self.values     = data["values"]
+                self.checked_at = data["checked_at"]
+                self.checksums  = dict(zip(months, data["checksums"].tolist()))
+                self.tabs       = dict(zip(months, data["tabs"].tolist()))
+        except FileNotFoundError:
+            return
+        except (OSError, KeyError, ValueError) as exc:
+            logger.warning(f"Could not read spend cube {SPEND_CUBE_FILE}: {exc}")
+            return
+        logger.info(f"Spend cube loaded: {len(self.months)} month(s)")
+
+    def _save(self) -> None:
+        tmp_path = f"{SPEND_CUBE_FILE}.tmp.npz"
+        months = self.months.tolist()
+        try:
+            np.savez(
+                tmp_path,
+                rows=np.array(ROWS),
+                months=self.months,
+                values=self.values,
+                checked_at=self.checked_at,
+                checksums=np.array([self.checksums[m] for m in months], dtype=str),
+                tabs=np.array([self.tabs[m] for m in months], dtype=str),
+            )
+            os.replace(tmp_path, SPEND_CUBE_FILE)
+        except OSError as exc:
+            # The in-memory cube still works; only restart persistence is lost.
+            logger.warning(f"Could not write spend cube {SPEND_CUBE_FILE}: {exc}")
+
+    # -- columns (under lock) --
+
+    def _position(self, ordinal: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.months, ordinal))
+        if pos < len(self.months) and self.months[pos] == ordinal:
+            return pos
+        return None
+
+    def _store(self, ordinal: int, tab_name: str, rows: list, checked_at: float) -> bool:
+        """Store one month's column; True if it differs from what was stored."""
+        column = parse_column(rows)
+        checksum = _checksum(rows)
+        pos = self._position(ordinal)
+        changed = (
+            pos is None
+            or self.tabs.get(ordinal) != tab_name
+            or self.checksums.get(ordinal) != checksum
+            or not np.array_equal(self.values[pos], column, equal_nan=True)
+        )
+        if pos is not None:
+            self.values[pos] = column
+            self.checked_at[pos] = checked_at
+        else:
+            pos = int(np.searchsorted(self.months, ordinal))
+            self.months     = np.insert(self.months, pos, ordinal)
+            self.values     = np.insert(self.values, pos, column, axis=0)
+            self.checked_at = np.insert(self.checked_at, pos, checked_at)
+        self.checksums[ordinal] = checksum
+        self.tabs[ordinal] = tab_name
+        self.absent.pop(ordinal, None)
+        self.dirty_tabs.discard(tab_name)
+        return changed
+
+    def _drop(self, ordinal: int) -> bool:
+        pos = self._position(ordinal)
+        if pos is None:
+            return False
+        self.months     = np.delete(self.months, pos)
+        self.values     = np.delete(self.values, pos, axis=0)
+        self.checked_at = np.delete(self.checked_at, pos)
+        self.checksums.pop(ordinal, None)
+        self.tabs.pop(ordinal, None)
+        return True
+
+    # -- reads (without lock) --
+
+    def _batch_get(self, service, tabs: dict[int, str], a1: str) -> dict[int, list]:
+        """
+        {ordinal: values} of range `a1` in every tab — one values.batchGet.
+        A renamed or deleted tab fails the whole call: the tab list is then
+        re-read, vanished months are dropped, and the call is retried once.
+        """
+        for attempt in range(2):
+            ordinals = list(tabs)
+            if not ordinals:
+                return {}
+            try:
+                resp = service.spreadsheets().values().batchGet(
+                    spreadsheetId=SPREADSHEET_ID,
+                    ranges=[f"'{tabs[o]}'!{a1}" for o in ordinals],
+                ).execute()
+                return {
+                    o: value_range.get("values", [])
+                    for o, value_range in zip(ordinals, resp.get("valueRanges", []))
+                }
+            except Exception as exc:
+                if attempt:
+                    logger.warning(f"Spend cube read failed: {exc}")
+                    return {}
+                logger.info(f"Spend cube read failed ({exc}) — re-resolving tabs")
+                existing_tabs = get_spreadsheet_tabs(service)
+                dropped = False
+                with self.lock:
+                    for o in ordinals:
+                        tab_info = find_tab_in_tabs(existing_tabs, _month_of(o))
+                        if tab_info:
+                            tabs[o] = tab_info[0]
+                        else:
+                            del tabs[o]
+                            dropped |= self._drop(o)
+                            self.absent[o] = time.time()
+                    if dropped:
+                        self._save()
+        return {}
+
+    def fill(self, service, start: int, end: int, existing_tabs: Optional[dict]) -> None:
+        """
+        Bring every month in [start, end] up to date in at most three calls:
+        the tab list (only for months never seen), one batchGet of B:C to
+        checksum the cached months, one batchGet of A:D for the rest. The
+        reads run outside self.lock; results are stored under it afterwards.
+        """
+        with self.fill_lock:
+            with self.lock:
+                if not self.loaded:
+                    self._load_file()
+                now_ts = time.time()
+                to_read: dict[int, str] = {}     # ordinal → tab, full A:D read
+                to_check: dict[int, str] = {}    # ordinal → tab, checksum only
+                unseen: list[int] = []
+
+                for ordinal in range(start, end + 1):
+                    pos = self._position(ordinal)
+                    if pos is None:
+                        if now_ts - self.absent.get(ordinal, 0.0) > CUBE_TTL:
+                            unseen.append(ordinal)
+                    elif self.tabs[ordinal] in self.dirty_tabs:
+                        to_read[ordinal] = self.tabs[ordinal]
+                    elif now_ts - self.checked_at[pos] > CUBE_TTL:
+                        to_check[ordinal] = self.tabs[ordinal]
+                if not (to_read or to_check or unseen):
+                    return
+                # Taken now: a write during the reads below marks its tab again.
+                self.dirty_tabs -= set(to_read.values())
+
+            started = time.monotonic()
+            if unseen:
+                if existing_tabs is None:
+                    existing_tabs = get_spreadsheet_tabs(service)
+                for ordinal in unseen:
+                    tab_info = find_tab_in_tabs(existing_tabs, _month_of(ordinal))
+                    if tab_info:
+                        to_read[ordinal] = tab_info[0]
+                    else:
+                        with self.lock:
+                            self.absent[ordinal] = now_ts
+
+            checked = self._batch_get(service, to_check, "B1:C200")
+            changed = 0
+            with self.lock:
+                for ordinal, rows in checked.items():
+                    pos = self._position(ordinal)
+                    if pos is not None and _checksum(rows, first_column=0) == self.checksums.get(ordinal):
+                        self.checked_at[pos] = now_ts
+                    else:
+                        to_read[ordinal] = to_check[ordinal]
+                        changed += 1
+
+            read = self._batch_get(service, to_read, "A1:D200")
+            with self.lock:
+                marked = set(self.dirty_tabs)    # _store() clears its tab's mark
+                stored = False
+                for ordinal, rows in read.items():
+                    stored |= self._store(ordinal, to_read[ordinal], rows, now_ts)
+                self.dirty_tabs |= marked
+                if stored:
+                    self._save()
+                cached = len(self.months)
+            logger.info(
+                f"Spend cube filled: {len(to_check)} checksum(s), {changed} changed, "
+                f"{len(read)} tab(s) read, {cached} month(s) cached, "
+                f"{(time.monotonic() - started) * 1000:.0f}ms"
+            )
+
+    def slice(self, start: int, end: int) -> CubeSlice:
+        ordinals = np.arange(start, end + 1)
+        values = np.full((len(ordinals), len(ROWS), 3), np.nan)
+        with self.lock:
+            pos = np.searchsorted(self.months, ordinals)
+            found = pos < len(self.months)
+            found[found] = self.months[pos[found]] == ordinals[found]
+            values[found] = self.values[pos[found]]
+        return CubeSlice(
+            months=[_month_of(int(o)) for o in ordinals],
+            values=values,
+            present=found,
+        )
+
+    def mark_dirty(self, tab_name: str) -> None:
+        with self.lock:
+            self.dirty_tabs.add(tab_name)
+
+
+_cube = _Cube()
+add_write_listener(_cube.mark_dirty)
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def load(
+    start: datetime,
+    end: datetime,
+    service=None,
+    existing_tabs: Optional[dict] = None,
+) -> CubeSlice:
+    """
+    The cube for every month in [start, end], oldest first. Reads only the
+    tabs that are missing or stale — none at all when the range is cached, in
+    which case not even the tab list is fetched. Blocking.
+    """
+    start_ordinal, end_ordinal = _ordinal(start), _ordinal(end)
+    _cube.fill(service or _build_service(), start_ordinal, end_ordinal, existing_tabs)
+    return _cube.slice(start_ordinal, end_ordinal)
+
+
+def record(dt: datetime, tab_name: str, rows: list) -> None:
+    """
+    Store a month tab's A:D rows that were read for another purpose. The file
+    is only rewritten when the month's column actually changed — re-rendering
+    an unchanged month just refreshes its in-memory check time.
+    """
+    with _cube.lock:
+        if not _cube.loaded:
+            _cube._load_file()
+        if _cube._store(_ordinal(dt), tab_name, rows, time.time()):
+            _cube._save()
+
+
+def checksum(dt: datetime) -> Optional[str]:
+    """The stored B:C checksum of dt's tab — as of the last load() — or None."""
+    with _cube.lock:
+        return _cube.checksums.get(_ordinal(dt))
@@ -0,0 +1,38 @@
+"""
+tests/test_inline.py — Inline results must send a message the parser logs as shown.
+"""
+
+import pytest
+
+from handlers.inline import inline_results
+from parsing.category_index import log_keyword
+from parsing.category_map import CATEGORY_MAP
+from parsing.parser import parse
+
+# Typed amounts, including ones %g would round (7+ significant digits) or
+# write in exponent form (≥ 1e6).
+AMOUNTS = ["50", "0.5", "120.75", "10523.45", "1500000", "1234567.89", "98765432.1"]
+
+LOGGABLE = [category for category in CATEGORY_MAP if log_keyword(category)]
+
+
+@pytest.mark.parametrize("amount", AMOUNTS)
+@pytest.mark.parametrize("category", LOGGABLE)
+def test_logged_amount_round_trips(category, amount):
+    results = inline_results(f"{category} {amount} note")
+    assert results, category
+    text = results[0].input_message_content.message_text
+
+    parsed = parse(text)
+    assert parsed.status == "matched", text
+    assert parsed.category == category, text
+    assert parsed.amount == float(amount), text
+    assert parsed.note == "note", text
+    assert results[0].title == f"{category} ₪{amount}"
+
+
+def test_category_without_log_keyword_offers_balance():
+    for category in CATEGORY_MAP:
+        if log_keyword(category) is None:
+            titles = {result.title for result in inline_results(f"{category} 120")}
+            assert f"{category} ₪120" not in titles
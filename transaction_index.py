@@ -0,0 +1,382 @@
+"""
+transaction_index.py — Searchable in-memory index of every logged transaction.
+
+Each logged expense is one line of a column-C cell note in its month tab:
+    YYYY-MM-DD HH:MM  <full message as typed by user>  #<txn_id> ₪<amount>
+
+Reading those notes month by month and scanning them as text is slow and
+token-heavy for the AI. This module reads the notes of ALL month tabs in a
+few batched spreadsheets.get calls, parses every line into a Transaction, and
+keeps an inverted index (token → transaction ids) plus a month index so that
+search() only touches matching rows.
+
+Public API:
+    search(...)              → (matches, total) filtered by month range,
+                               category, keywords, emoji and amount
+    locate(txn_id)           → the Transaction with that ID (tab, row, line)
+    format_compact(...)      → terse one-line-per-row text for the LLM
+    iter_month_transactions  → batched reader shared with other features
+
+Freshness
+---------
+The first search builds the full index (closed months never change). After
+that, only dirty tabs are re-read: the current month once INDEX_TTL expires,
+and any tab this bot wrote to (sheets.notify_write marks it dirty). A full
+rebuild happens every INDEX_FULL_REBUILD seconds to pick up manual edits.
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, Optional
+
+from config import SPREADSHEET_ID
+from parsing.category_map import CATEGORY_MAP
+from sheets import (
+    _build_service,
+    add_write_listener,
+    find_tab_in_tabs,
+    get_spreadsheet_tabs,
+    split_txn_tag,
+)
+
+logger = logging.getLogger(__name__)
+
+# How many months back (from the current month) the index covers.
+INDEX_MAX_MONTHS = 60
+
+# Tabs fetched per spreadsheets.get call — bounds the response size.
+FETCH_CHUNK_TABS = 12
+
+# Seconds before the current month is re-read even without a bot write.
+INDEX_TTL = 300
+
+# Seconds between full rebuilds (picks up hand edits to closed months).
+INDEX_FULL_REBUILD = 6 * 3600
+
+_NOTE_LINE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2})\s+(.*)$")
+_AMOUNT_RE    = re.compile(r"(-?\d+(?:\.\d+)?)")
+_WORD_RE      = re.compile(r"\w+")
+_EMOJI_RE     = re.compile(
+    "[\U0001F000-\U0001FAFF☀-➿⬀-⯿〰〽㊗㊙]"
+)
+
+_CATEGORY_BY_LOWER = {cat.lower(): cat for cat in CATEGORY_MAP}
+
+
+@dataclass(frozen=True)
+class Transaction:
+    month: datetime          # first day of the tab's month
+    category: str
+    timestamp: str           # "YYYY-MM-DD HH:MM", or "" for hand-written lines
+    amount: Optional[float]  # tagged amount, else the first number in the text
+    text: str                # the message as the user typed it
+    emojis: str              # every emoji in the text, concatenated
+    txn_id: str = ""         # "" for lines written before IDs / by hand
+    tab: str = ""            # where the line lives: tab title,
+    row: int = 0             #   1-based row,
+    line: int = -1           #   offset within the cell note
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+def parse_note_line(
+    line: str,
+    month: datetime,
+    category: str,
+    tab: str = "",
+    row: int = 0,
+    offset: int = -1,
+) -> Optional[Transaction]:
+    line = line.strip()
+    if not line:
+        return None
+    match = _NOTE_LINE_RE.match(line)
+    timestamp, text = (match.group(1), match.group(2)) if match else ("", line)
+    text, txn_id, amount = split_txn_tag(text)
+    if amount is None:
+        amount_match = _AMOUNT_RE.search(text)
+        amount = float(amount_match.group(1)) if amount_match else None
+    return Transaction(
+        month=month,
+        category=category,
+        timestamp=timestamp,
+        amount=amount,
+        text=text,
+        emojis="".join(_EMOJI_RE.findall(text)),
+        txn_id=txn_id,
+        tab=tab,
+        row=row,
+        line=offset,
+    )
+
+
+def _tokens(txn: Transaction) -> set[str]:
+    tokens = {w.lower() for w in _WORD_RE.findall(txn.text)}
+    tokens.update(txn.emojis)
+    return tokens
+
+
+# ---------------------------------------------------------------------------
+# Batched reads
+# ---------------------------------------------------------------------------
+
+def resolve_month_tabs(
+    existing_tabs: dict,
+    start: datetime,
+    end: datetime,
+) -> list[tuple[datetime, str]]:
+    """(month, tab_name) for every month in [start, end] that has a tab, oldest first."""
+    result = []
+    dt = start.replace(day=1)
+    end = end.replace(day=1)
+    while dt <= end:
+        tab_info = find_tab_in_tabs(existing_tabs, dt)
+        if tab_info:
+            result.append((dt, tab_info[0]))
+        dt = dt.replace(year=dt.year + 1, month=1) if dt.month == 12 else dt.replace(month=dt.month + 1)
+    return result
+
+
+def iter_month_transactions(
+    service,
+    month_tabs: list[tuple[datetime, str]],
+    chunk_size: int = FETCH_CHUNK_TABS,
+) -> Iterator[tuple[datetime, str, list[Transaction]]]:
+    """
+    Yield (month, tab_name, transactions) for each tab, reading column A labels
+    and column C notes for `chunk_size` tabs per spreadsheets.get call. Only
+    one chunk's raw response is held in memory at a time.
+    """
+    for i in range(0, len(month_tabs), chunk_size):
+        chunk = month_tabs[i:i + chunk_size]
+        month_by_title = {tab: dt for dt, tab in chunk}
+        resp = service.spreadsheets().get(
+            spreadsheetId=SPREADSHEET_ID,
+            ranges=[f"'{tab}'!A1:C200" for _, tab in chunk],
+            fields="sheets(properties(title),data(rowData(values(formattedValue,note))))",
+        ).execute()
+
+        for sheet in resp.get("sheets", []):
+            title = sheet.get("properties", {}).get("title", "")
+            month = month_by_title.get(title)
+            if month is None:
+                continue
+            txns: list[Transaction] = []
+            for grid in sheet.get("data", []):
+                for row_idx, row in enumerate(grid.get("rowData", []), start=grid.get("startRow", 0) + 1):
+                    cells = row.get("values", [])
+                    if len(cells) < 3:
+                        continue
+                    label    = (cells[0].get("formattedValue") or "").strip()
+                    category = _CATEGORY_BY_LOWER.get(label.lower())
+                    note     = cells[2].get("note") or ""
+                    if not category or not note:
+                        continue
+                    for offset, line in enumerate(note.split("\n")):
+                        txn = parse_note_line(line, month, category, title, row_idx, offset)
+                        if txn:
+                            txns.append(txn)
+            yield month, title, txns
+
+
+# ---------------------------------------------------------------------------
+# The index
+# ---------------------------------------------------------------------------
+
+class _Index:
+    def __init__(self):
+        # build_lock serialises refreshes and is held across the Sheets reads;
+        # lock only guards swapping in the derived structures, so search() and
+        # locate() never wait on the network for a rebuild another thread runs.
+        self.build_lock = threading.Lock()
+        self.lock = threading.Lock()
+        # dirty_tabs has its own lock so write listeners never block on either.
+        self.dirty_lock = threading.Lock()
+        self.dirty_tabs: set[str] = set()
+        # Raw per-month rows — only touched under build_lock
+        self.by_month: dict[datetime, list[Transaction]] = {}
+        self.tab_month: dict[str, datetime] = {}     # tab title → month
+        self.built_at = 0.0
+        self.refreshed_at = 0.0
+        # Derived from by_month by _reindex(), swapped in under lock
+        self.rows: list[Transaction] = []
+        self.postings: dict[str, set[int]] = {}
+        self.tokens: list[str] = []                   # sorted postings keys
+        self.month_rows: dict[datetime, range] = {}
+        self.by_id: dict[str, Transaction] = {}
+
+    def _reindex(self) -> None:
+        rows: list[Transaction] = []
+        postings: dict[str, set[int]] = {}
+        month_rows: dict[datetime, range] = {}
+        by_id: dict[str, Transaction] = {}
+        for month in sorted(self.by_month):
+            start = len(rows)
+            for txn in self.by_month[month]:
+                idx = len(rows)
+                rows.append(txn)
+                for token in _tokens(txn):
+                    postings.setdefault(token, set()).add(idx)
+                if txn.txn_id:
+                    by_id[txn.txn_id] = txn
+            month_rows[month] = range(start, len(rows))
+        tokens = sorted(postings)
+        with self.lock:
+            self.rows, self.postings, self.tokens = rows, postings, tokens
+            self.month_rows, self.by_id = month_rows, by_id
+
+    def _load(self, service, month_tabs: list[tuple[datetime, str]]) -> None:
+        for month, title, txns in iter_month_transactions(service, month_tabs):
+            self.by_month[month] = txns
+            self.tab_month[title] = month
+
+    def ensure_fresh(self, service) -> None:
+        with self.build_lock:
+            now_ts = time.monotonic()
+            now    = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            full   = not self.built_at or now_ts - self.built_at > INDEX_FULL_REBUILD
+            stale  = now_ts - self.refreshed_at > INDEX_TTL
+            # Take the dirty set as it stands; tabs written during the reads
+            # below land in a fresh set and are picked up next time.
+            with self.dirty_lock:
+                dirty, self.dirty_tabs = self.dirty_tabs, set()
+            if not (full or stale or dirty):
+                return
+
+            try:
+                existing_tabs = get_spreadsheet_tabs(service)
+                start = now.replace(year=now.year - INDEX_MAX_MONTHS // 12)
+                month_tabs = resolve_month_tabs(existing_tabs, start, now)
+
+                if full:
+                    self.by_month.clear()
+                    self.tab_month.clear()
+                    to_load = month_tabs
+                else:
+                    # New tabs, dirty tabs, and the current month when the TTL lapsed
+                    to_load = [
+                        (dt, tab) for dt, tab in month_tabs
+                        if dt not in self.by_month
+                        or tab in dirty
+                        or (stale and dt == now)
+                    ]
+
+                started = time.monotonic()
+                self._load(service, to_load)
+            except Exception:
+                with self.dirty_lock:
+                    self.dirty_tabs |= dirty
+                if full:
+                    self.built_at = 0.0
+                raise
+
+            self._reindex()
+            self.refreshed_at = now_ts
+            if full:
+                self.built_at = now_ts
+            logger.info(
+                f"Transaction index {'built' if full else 'refreshed'}: "
+                f"{len(to_load)} tab(s) read, {len(self.rows)} transactions, "
+                f"{(time.monotonic() - started) * 1000:.0f}ms"
+            )
+
+    def mark_dirty(self, tab_name: str) -> None:
+        with self.dirty_lock:
+            self.dirty_tabs.add(tab_name)
+
+
+_index = _Index()
+add_write_listener(_index.mark_dirty)
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def search(
+    query: str = "",
+    category: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    has_emoji: bool = False,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    limit: int = 50,
+) -> tuple[list[Transaction], int]:
+    """
+    Return (matches, total_matches), newest first, capped at `limit`.
+
+    Every query word must match (prefix match, case-insensitive — "super"
+    finds "superpharm"); emoji in the query must appear in the line. start /
+    end bound the month range (inclusive). Blocking — call via asyncio.to_thread.
+    """
+    _index.ensure_fresh(_build_service())
+
+    with _index.lock:
+        rows, postings, tokens = _index.rows, _index.postings, _index.tokens
+
+        candidates: Optional[set[int]] = None
+        if start or end:
+            lo = start.replace(day=1) if start else datetime.min
+            hi = end.replace(day=1) if end else datetime.max
+            candidates = set()
+            for month, ids in _index.month_rows.items():
+                if lo <= month <= hi:
+                    candidates.update(ids)
+
+        terms = [w.lower() for w in _WORD_RE.findall(query)] + _EMOJI_RE.findall(query)
+        for term in terms:
+            if _EMOJI_RE.fullmatch(term):
+                ids = set(postings.get(term, ()))
+            else:
+                # Every token with this prefix sits in one run of the sorted list
+                ids = set()
+                i = bisect.bisect_left(tokens, term)
+                while i < len(tokens) and tokens[i].startswith(term):
+                    ids |= postings[tokens[i]]
+                    i += 1
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return [], 0
+
+        if candidates is None:
+            candidates = set(range(len(rows)))
+
+        cat_lower = category.strip().lower() if category else None
+        matches = [
+            rows[i] for i in candidates
+            if (cat_lower is None or rows[i].category.lower() == cat_lower)
+            and (not has_emoji or rows[i].emojis)
+            and (min_amount is None or (rows[i].amount is not None and rows[i].amount >= min_amount))
+            and (max_amount is None or (rows[i].amount is not None and rows[i].amount <= max_amount))
+        ]
+
+    matches.sort(key=lambda t: (t.month, t.timestamp), reverse=True)
+    return matches[:limit], len(matches)
+
+
+def locate(txn_id: str) -> Optional[Transaction]:
+    """The transaction tagged `txn_id` (with its tab, row and line), or None. Blocking."""
+    _index.ensure_fresh(_build_service())
+    with _index.lock:
+        return _index.by_id.get(txn_id.lower().lstrip("#"))
+
+
+def format_compact(matches: list[Transaction], total: int) -> str:
+    """date|category|amount|text — one row per match, for the LLM."""
+    if not matches:
+        return "No matching transactions."
+    header = f"{total} match(es)" + (f", newest {len(matches)} shown" if total > len(matches) else "")
+    lines = [header, "date|category|amount|text"]
+    for t in matches:
+        date   = t.timestamp or t.month.strftime("%Y-%m")
+        amount = f"{t.amount:g}" if t.amount is not None else ""
+        lines.append(f"{date}|{t.category}|{amount}|{t.text}")
+    return "\n".join(lines)
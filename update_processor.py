@@ -0,0 +1,109 @@
+"""
+update_processor.py — Concurrent update handling with per-chat ordering.
+
+By default python-telegram-bot handles one update at a time, so one parent's
+slow Sheets write or LLM call delays every other chat's messages and button
+taps. PerChatUpdateProcessor lets up to UPDATE_CONCURRENCY updates run at
+once while keeping each chat strictly sequential — pending state, AI history
+and /delete all assume a chat's updates are handled in the order they arrive.
+
+    Application.builder().concurrent_updates(PerChatUpdateProcessor()) ...
+
+Ordering: each chat has an asyncio.Lock. Updates are dispatched as tasks in
+arrival order and asyncio.Lock wakes waiters first-in first-out, so a chat's
+updates run one after another in order. The chat lock is taken BEFORE a
+global concurrency slot — a chat with a backlog waits without holding slots
+that other chats could use.
+
+Metrics (see metrics.py):
+    updates_queued            gauge — received, not yet started
+    updates_in_flight         gauge — currently being handled
+    update_wait_seconds       distribution — arrival → start, per update
+    update_chat_wait_seconds  distribution — time spent behind the same chat
+"""
+
+import asyncio
+import time
+from typing import Awaitable
+
+from telegram.ext import BaseUpdateProcessor
+
+import metrics
+
+# Updates handled at the same time across all chats.
+UPDATE_CONCURRENCY = 8
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = UPDATE_CONCURRENCY):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks: dict[int, asyncio.Lock] = {}
+        self._chat_users: dict[int, int] = {}   # chat id → updates holding/awaiting its lock
+        self._queued = 0
+        self._in_flight = 0
+
+    @staticmethod
+    def _chat_key(update: object) -> int | None:
+        # Updates without a chat (inline queries) change no chat state, so they
+        # are not ordered — falling back to the user id would queue an inline
+        # query behind that user's slow message in their private chat.
+        chat = getattr(update, "effective_chat", None)
+        return chat.id if chat is not None else None
+
+    async def process_update(self, update: object, coroutine: Awaitable) -> None:
+        received = time.monotonic()
+        state = {"started": False}
+        self._queued += 1
+        metrics.set_gauge("updates_queued", self._queued)
+        tracked = self._tracked(coroutine, received, state)
+
+        key = self._chat_key(update)
+        try:
+            if key is None:
+                # Nothing to order against (inline query, poll) — just bound it.
+                await super().process_update(update, tracked)
+                return
+
+            lock = self._chat_locks.setdefault(key, asyncio.Lock())
+            self._chat_users[key] = self._chat_users.get(key, 0) + 1
+            try:
+                async with lock:
+                    metrics.observe("update_chat_wait_seconds", time.monotonic() - received)
+                    await super().process_update(update, tracked)
+            finally:
+                self._chat_users[key] -= 1
+                if not self._chat_users[key]:
+                    # Nobody else is waiting on this chat — don't keep a
+                    # lock per chat forever.
+                    del self._chat_users[key]
+                    del self._chat_locks[key]
+        finally:
+            if not state["started"]:   # cancelled while still queued
+                self._queued -= 1
+                metrics.set_gauge("updates_queued", self._queued)
+                tracked.close()
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def _tracked(self, coroutine: Awaitable, received: float, state: dict) -> None:
+        """Wrap the handler coroutine to keep the gauges and wait times current."""
+        state["started"] = True
+        self._queued -= 1
+        self._in_flight += 1
+        metrics.set_gauge("updates_queued", self._queued)
+        metrics.set_gauge("updates_in_flight", self._in_flight)
+        metrics.observe("update_wait_seconds", time.monotonic() - received)
+        try:
+            await coroutine
+        finally:
+            self._in_flight -= 1
+            metrics.set_gauge("updates_in_flight", self._in_flight)